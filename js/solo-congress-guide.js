@@ -85,7 +85,7 @@ const canvas = document.querySelector("#connection-canvas");
 // load it lazily once the page is idle so it never delays interactivity.
 if (canvas && !reduceMotion) {
   const startScene = () => {
-    import("/vendor/three/three.module.min.js")
+    import("/vendor/three/three.module.solo-congress-guide.min.js")
       .then(initConnectionScene)
       .catch(() => { canvas.hidden = true; });
   };
@@ -1,23 +1,47 @@
 #!/usr/bin/env python3
 """Inject srcset/sizes into <img> tags for images that have responsive variants.
 
-The `sizes` values below are NOT guesses: they were measured in a real browser
-(offsetWidth at 375/768/1440px viewports) per page context, following the
-"sizes truth rule". Re-measure before changing them.
+`sizes` comes from the browser-measured CONTEXT_RULES below where a rule
+covers the image (offsetWidth at 375/768/1440px viewports, following the
+"sizes truth rule" - re-measure before changing them), and otherwise from
+the layout estimate of layout_sizes.py, which resolves the Tailwind width
+classes on the <img> and its ancestors. A new page therefore gets a srcset
+without a new rule; `python3 scripts/layout_sizes.py` lists where the
+estimate and the measurements disagree.
 
 Also fixes width/height to the intrinsic dimensions of the referenced file
 (wrong ratios cause CLS) and applies the eager/lazy loading policy.
 
-Run from the repo root: python3 scripts/apply_responsive_images.py
+Lazy images from the artist and hotel galleries get a blur-up placeholder
+(a tiny WebP data: URI over their dominant colour, see
+image_placeholders.py) as an inline background, so the reserved box shows
+a preview instead of nothing while the image loads.
+
+When every srcset candidate has an AVIF twin (generate_responsive_images.py
+--avif), the <img> is wrapped in a <picture> whose AVIF <source> carries the
+same widths and sizes; the <img> stays as the WebP fallback.
+
+Runs as the responsive-images step of rewrite_pipeline.py, or alone (from
+the repo root): python3 scripts/apply_responsive_images.py [--dry-run]
 """
-import glob
 import os
 import re
-import subprocess
+import sys
+
+import image_meta
+import layout_sizes
+import lcp_preload
+import rewrite_pipeline
+from image_meta import dims
+
+try:
+    import image_placeholders
+except ImportError:  # NumPy missing: no blur-up placeholders
+    image_placeholders = None
 
 VARIANT_WIDTHS = [480, 800, 1200]
 
-# (page glob, src substring, sizes) — first match wins.
+# (page glob, src substring, sizes) — first match wins over the estimate.
 # Measured: 375px / 768px / 1440px viewports, real rendered widths.
 CONTEXT_RULES = [
     ('index.html', 'images/artists/', '(max-width: 640px) 50vw, 220px'),
@@ -45,18 +69,6 @@ CONTEXT_RULES = [
 # Full-bleed background/hero <img>s that are the LCP of their page: load eager.
 EAGER_MARKERS = ('object-cover', 'absolute')
 
-_dims_cache = {}
-
-
-def dims(path):
-    if path not in _dims_cache:
-        out = subprocess.check_output(
-            ['ffprobe', '-v', 'error', '-show_entries', 'stream=width,height',
-             '-of', 'csv=p=0', path], stderr=subprocess.DEVNULL)
-        w, h = out.decode().strip().splitlines()[0].split(',')
-        _dims_cache[path] = (int(w), int(h))
-    return _dims_cache[path]
-
 
 def variants_for(fs_path):
     """Return [(width, variant_fs_path)] for existing ladder rungs of a file."""
@@ -69,7 +81,8 @@ def variants_for(fs_path):
     return out
 
 
-def sizes_for(page, src, tag):
+def measured_sizes(page, src, tag):
+    """(sizes from CONTEXT_RULES or None, is_hero) for an <img>."""
     is_hero = all(m in tag for m in EAGER_MARKERS) or (
         'w-full' in tag and 'h-full' in tag and 'absolute' in tag)
     for page_glob, needle, sizes in CONTEXT_RULES:
@@ -84,62 +97,138 @@ def sizes_for(page, src, tag):
     return None, is_hero
 
 
-def process_page(page):
-    html = orig = open(page).read()
-    prefix = '../' if page.startswith(('it/', 'news/')) or page.startswith('it/news/') else ''
-
-    def rewrite(m):
-        tag = m.group(0)
-        src_m = re.search(r'src="([^"]+)"', tag)
-        if not src_m:
-            return tag
-        src = src_m.group(1)
-        # Normalize absolute production URLs to local relative paths
-        local_src = re.sub(r'https://milanosensualcongress\.com/', prefix, src)
-        fs_path = local_src[len(prefix):] if prefix and local_src.startswith(prefix) else local_src
-        if not fs_path.endswith('.webp') or not os.path.exists(fs_path):
-            return tag
-        if src != local_src:
-            tag = tag.replace(f'src="{src}"', f'src="{local_src}"')
-            src = local_src
-
-        w, h = dims(fs_path)
-        # Fix intrinsic dimensions (wrong ratio = layout shift)
-        tag = re.sub(r'\swidth="\d+"', '', tag)
-        tag = re.sub(r'\sheight="\d+"', '', tag)
-        tag = tag.replace('<img', f'<img width="{w}" height="{h}"', 1)
-
-        rungs = variants_for(fs_path)
-        sizes, is_hero = sizes_for(page, src, tag)
-        if rungs and sizes and 'srcset=' not in tag:
-            srcset = ', '.join(
-                [f'{prefix}{os.path.splitext(fs_path)[0]}_{rw}w.webp {rw}w' for rw, _ in rungs]
-                + [f'{src} {w}w'])
-            tag = tag.replace(f'src="{src}"', f'src="{src}" srcset="{srcset}" sizes="{sizes}"', 1)
-
-        # Loading policy: heroes eager+high priority, everything else lazy
-        if is_hero:
-            tag = re.sub(r'\sloading="\w+"', '', tag)
-            if 'fetchpriority=' not in tag:
-                tag = tag.replace('<img', '<img loading="eager" fetchpriority="high"', 1)
-        elif 'loading=' not in tag:
-            tag = tag.replace('<img', '<img loading="lazy"', 1)
-        if 'decoding=' not in tag:
-            tag = tag.replace('<img', '<img decoding="async"', 1)
+def avif_srcset(srcset, prefix):
+    """The srcset with every candidate swapped for its AVIF twin, or None
+    unless all twins exist (a partial ladder could pick a larger file)."""
+    out = []
+    for candidate in srcset.split(','):
+        url, _, descriptor = candidate.strip().partition(' ')
+        fs_path = url[len(prefix):] if prefix and url.startswith(prefix) else url
+        twin = os.path.splitext(fs_path)[0] + '.avif'
+        if not os.path.exists(twin):
+            return None
+        out.append(f'{os.path.splitext(url)[0]}.avif {descriptor}'.strip())
+    return ', '.join(out)
+
+
+def add_placeholder(tag, fs_path):
+    """The <img> with its LQIP as an inline background (appended to the
+    tag, or prepended to its own style), if one can be made."""
+    lqip = image_placeholders.placeholder(fs_path)
+    if lqip is None:
+        return tag
+    background = image_placeholders.style(*lqip)
+    if re.search(r'\sstyle="', tag):
+        return re.sub(r'(\sstyle=")', lambda m: f'{m.group(1)}{background};', tag, count=1)
+    end = re.search(r'\s*/?>$', tag).start()
+    return f'{tag[:end]} style="{background}"{tag[end:]}'
+
+
+def rewrite_img(page, tag, ancestors=(), is_lcp=False):
+    """The <img> tag with local src, intrinsic size, srcset/sizes and loading
+    policy applied (page: root-relative path of the page it is on;
+    ancestors: start tags of the elements enclosing it, outermost first).
+
+    The LCP image (is_lcp, or any <img> already at fetchpriority="high")
+    keeps its loading as written: lcp_preload.py owns it."""
+    prefix = '../' if page.startswith(('it/', 'news/')) else ''
+    src_m = re.search(r'src="([^"]+)"', tag)
+    if not src_m:
         return tag
+    src = src_m.group(1)
+    # Normalize absolute production URLs to local relative paths
+    local_src = re.sub(r'https://milanosensualcongress\.com/', prefix, src)
+    fs_path = local_src[len(prefix):] if prefix and local_src.startswith(prefix) else local_src
+    if not fs_path.endswith('.webp') or not os.path.exists(fs_path):
+        return tag
+    if src != local_src:
+        tag = tag.replace(f'src="{src}"', f'src="{local_src}"')
+        src = local_src
+
+    w, h = dims(fs_path)
+    # Fix intrinsic dimensions (wrong ratio = layout shift), in place so
+    # the attribute order of the tag is kept
+    for name, value in (('height', h), ('width', w)):
+        tag, n = re.subn(rf'(\s{name}=")\d*(")', rf'\g<1>{value}\2', tag, count=1)
+        if not n:
+            tag = tag.replace('<img', f'<img {name}="{value}"', 1)
+
+    rungs = variants_for(fs_path)
+    sizes, is_hero = measured_sizes(page, src, tag)
+    if rungs and 'srcset=' not in tag and sizes is None:
+        sizes = layout_sizes.sizes_attr(list(ancestors) + [tag])
+    if rungs and sizes and 'srcset=' not in tag:
+        srcset = ', '.join(
+            [f'{prefix}{os.path.splitext(fs_path)[0]}_{rw}w.webp {rw}w' for rw, _ in rungs]
+            + [f'{src} {w}w'])
+        tag = tag.replace(f'src="{src}"', f'src="{src}" srcset="{srcset}" sizes="{sizes}"', 1)
+
+    # Loading policy: heroes eager+high priority, everything else lazy
+    if is_lcp or 'fetchpriority="high"' in tag:
+        pass
+    elif is_hero:
+        tag = re.sub(r'\sloading="\w+"', '', tag)
+        if 'fetchpriority=' not in tag:
+            tag = tag.replace('<img', '<img loading="eager" fetchpriority="high"', 1)
+    elif 'loading=' not in tag:
+        tag = tag.replace('<img', '<img loading="lazy"', 1)
+    if 'decoding=' not in tag:
+        tag = tag.replace('<img', '<img decoding="async"', 1)
+    if (not is_hero and not is_lcp and image_placeholders is not None and 'url(data:' not in tag
+            and image_placeholders.wants_placeholder(fs_path)):
+        tag = add_placeholder(tag, fs_path)
+    return tag
+
+
+def rewrite_tag(ctx, tag):
+    """Pipeline hook: rewrite one <img>, wrapping it in an AVIF <picture>
+    unless it is already served through one."""
+    if 'lcp' not in ctx.state:
+        lcp = lcp_preload.find_lcp(ctx.page, ctx.html)
+        ctx.state['lcp'] = lcp.tag if lcp is not None and lcp.kind == 'img' else None
+    tag = rewrite_img(ctx.path, tag, ctx.open_tags, is_lcp=tag == ctx.state['lcp'])
+    if ctx.inside('picture'):
+        return tag
+    srcset_m = re.search(r'\ssrcset="([^"]+)"', tag)
+    sizes_m = re.search(r'\ssizes="([^"]+)"', tag)
+    if srcset_m and sizes_m:
+        prefix = '../' if ctx.path.startswith(('it/', 'news/')) else ''
+        avif = avif_srcset(srcset_m.group(1), prefix)
+        if avif:
+            return (f'<picture><source type="image/avif" srcset="{avif}" '
+                    f'sizes="{sizes_m.group(1)}">{tag}</picture>')
+    return tag
+
+
+TRANSFORM = rewrite_pipeline.Transform('responsive-images', tags=('img',), tag=rewrite_tag)
+
 
-    html = re.sub(r'<img[^>]*>', rewrite, html)
-    if html != orig:
-        open(page, 'w').write(html)
-        return True
-    return False
+def before_run():
+    image_meta.warm(image_meta.image_files('images'))
+    if image_placeholders is not None:
+        image_placeholders.warm(image_placeholders.gallery_images())
+
+
+def after_run():
+    image_meta.save()
+    if image_placeholders is not None:
+        image_placeholders.save()
+
+
+def process_page(page):
+    """Rewrite one corpus Page in place; True if it changed."""
+    changed, _notes = rewrite_pipeline.run([TRANSFORM], pages=[page])
+    if image_placeholders is not None:
+        image_placeholders.save()
+    return bool(changed)
 
 
 def main():
-    pages = (glob.glob('*.html') + glob.glob('it/*.html')
-             + glob.glob('news/*.html') + glob.glob('it/news/*.html'))
-    changed = [p for p in pages if process_page(p)]
-    print(f'{len(changed)} pages updated')
+    before_run()
+    changed, _notes = rewrite_pipeline.run([TRANSFORM], dry_run='--dry-run' in sys.argv)
+    after_run()
+    verb = 'would change' if '--dry-run' in sys.argv else 'updated'
+    print(f'{len(changed)} pages {verb}')
 
 
 if __name__ == '__main__':
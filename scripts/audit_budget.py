@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+"""Page-weight budgets: what each page costs before first render and in total.
+
+For every page the files it makes the browser fetch are resolved on disk
+(through the link graph, so clean URLs and relative paths resolve as they
+do for the link checker) and split in two sets:
+
+- critical path: what the first render waits for - the HTML itself,
+  render-blocking stylesheets (<link rel="stylesheet"> not loaded async via
+  media="print" and their @imports), preloaded fonts, and synchronous
+  classic <script src>s;
+- total: everything the page eventually loads - the critical path plus
+  preloaded images (an imagesrcset preload as the candidate its imagesizes
+  picks on a VIEWPORT px wide, DENSITY x screen), async stylesheets, every
+  url() in the stylesheets it loads and in its inline <style> blocks,
+  images (the heaviest candidate of each srcset or <picture>, the way a
+  large retina screen would pick), video posters and sources, icons, SVG
+  sprites, and the whole JS import graph of its <script src>s and inline
+  scripts, lazy import()s included.
+
+The LCP image preload is fetched at high priority, but the page paints
+without it, so it counts towards total, not the critical path. The
+media-queried rungs of a background hero (lcp_preload.py) are alternatives
+to the full-size file its rule names, and the -supplement fonts of
+subset_text_fonts.py carry only characters no page renders; neither is
+counted.
+
+Markup inside <noscript> is skipped (the page is measured with scripting on).
+Sizes are raw and gzip -9 (what GitHub Pages serves) for text files; images,
+fonts and video are counted as stored.
+
+Budgets live in scripts/budgets.json: templates matched in order by page
+glob, the first match wins. A template limits any of: critical (the
+critical path), total, or the eventual bytes of one file type (script,
+stylesheet, font, image, media), raw as <scope>_kb or gzipped as
+<scope>_gz_kb, in KiB:
+
+    {"name": "news-article", "pages": ["news/*.html"],
+     "critical_gz_kb": 80, "total_gz_kb": 320, "script_gz_kb": 10}
+
+run_all_checks.py fails on any page over a limit of its template or
+matched by no template.
+
+    python3 scripts/audit_budget.py                 # every page vs its budget
+    python3 scripts/audit_budget.py news/foo.html   # per-file breakdown
+"""
+import fnmatch
+import gzip
+import json
+import os
+import re
+import sys
+
+import rewrite_pipeline
+from rewrite_pipeline import attributes
+from fingerprint_assets import CSS_URL_RE
+from lcp_preload import BACKGROUND_STYLE
+from link_graph import get_link_graph
+from page_corpus import ROOT_DIR, get_corpus
+from precompress import TEXT_EXTS
+from subset_text_fonts import SUPPLEMENT_SUFFIX
+from js_modules import Module
+from tree_shake_vendor import ScriptGraph, loading, module
+
+BUDGETS_PATH = os.path.join(ROOT_DIR, 'scripts', 'budgets.json')
+# Budget scopes besides critical and total: eventual bytes of one file type
+TYPES = {
+    'script': ('.js', '.mjs'),
+    'stylesheet': ('.css',),
+    'font': ('.woff2', '.woff', '.ttf', '.otf'),
+    'image': ('.webp', '.avif', '.jpg', '.jpeg', '.png', '.gif', '.svg', '.ico'),
+    'media': ('.mp4', '.webm', '.mp3'),
+}
+CSS_IMPORT_RE = re.compile(r'''@import\s+(?:url\(\s*)?(['"]?)([^'")\s;]+)\1''')
+STYLE_BLOCK_RE = re.compile(r'<style\b[^>]*>(.*?)</style\s*>', re.S | re.I)
+INLINE_SCRIPT_RE = re.compile(r'<script\b([^>]*)>(.*?)</script\s*>', re.S | re.I)
+JS_TYPES = ('', 'module', 'text/javascript', 'application/javascript')
+# <link rel> values whose href the browser fetches for this page
+FETCHED_RELS = {'stylesheet', 'preload', 'modulepreload', 'icon', 'manifest'}
+# Elements whose <source>s and src are alternatives: only one is loaded
+MEDIA_GROUPS = ('picture', 'video', 'audio')
+# The large retina screen an image preload is measured on: its imagesizes
+# slot at this viewport width, times this density, picks the candidate
+VIEWPORT = 1440
+DENSITY = 2
+
+_sizes = {}
+_css = {}
+_script_graphs = {}
+
+
+def file_size(root, path):
+    """(raw bytes, gzip bytes) of a root-relative file (memoized)."""
+    key = (root, path)
+    if key not in _sizes:
+        with open(os.path.join(root, path), 'rb') as f:
+            data = f.read()
+        gz = len(data)
+        if path.lower().endswith(TEXT_EXTS):
+            gz = min(gz, len(gzip.compress(data, compresslevel=9, mtime=0)))
+        _sizes[key] = (len(data), gz)
+    return _sizes[key]
+
+
+def script_graph(root):
+    if root not in _script_graphs:
+        _script_graphs[root] = ScriptGraph(get_link_graph(root))
+    return _script_graphs[root]
+
+
+class PageWeight:
+    """The files one page fetches: {path: why} for the critical path and in total."""
+
+    def __init__(self, page):
+        self.page = page
+        self.graph = get_link_graph(page.root)
+        self.critical = {}
+        self.total = {}
+        self._scripts = []
+
+    def resolve(self, source, url):
+        path = url and self.graph.target_path(source, url.strip())
+        return path and self.graph.resolve(path)
+
+    def add(self, path, why, critical=False):
+        if path is None or os.path.splitext(path)[0].endswith(SUPPLEMENT_SUFFIX):
+            return
+        self.total.setdefault(path, why)
+        if critical:
+            self.critical.setdefault(path, why)
+
+    def heaviest(self, paths):
+        """The largest of alternative candidates, or None."""
+        paths = [p for p in paths if p]
+        return max(paths, key=lambda p: file_size(self.page.root, p)[0]) if paths else None
+
+    def preloaded(self, attrs):
+        """The file an image preload fetches on the VIEWPORT x DENSITY screen:
+        the narrowest imagesrcset candidate covering its imagesizes slot
+        (the widest if none does), else its href."""
+        widths = []
+        for candidate in attrs.get('imagesrcset', '').split(','):
+            url, _, descriptor = candidate.strip().partition(' ')
+            m = re.fullmatch(r'(\d+)w', descriptor.strip())
+            if url and m:
+                widths.append((int(m.group(1)), self.resolve(self.page.path, url)))
+        if not widths:
+            return self.heaviest(self.candidates(attrs, 'imagesrcset', 'href'))
+        slot = attrs.get('imagesizes', '100vw').split(',')[-1].strip()
+        m = re.fullmatch(r'(\d+(?:\.\d+)?)(px|vw)', slot)
+        css = (float(m.group(1)) * (VIEWPORT / 100 if m.group(2) == 'vw' else 1)) if m else VIEWPORT
+        covering = [(w, p) for w, p in widths if w >= css * DENSITY]
+        return min(covering)[1] if covering else max(widths)[1]
+
+    def candidates(self, attrs, *names):
+        """Files named by srcset-like and src-like attributes of one tag."""
+        out = []
+        for name in names:
+            value = attrs.get(name)
+            if not value:
+                continue
+            if name.endswith('srcset'):
+                out += [self.resolve(self.page.path, c.split()[0])
+                        for c in value.split(',') if c.strip()]
+            else:
+                out.append(self.resolve(self.page.path, value))
+        return out
+
+    def stylesheet(self, path, why, critical):
+        """A stylesheet, its @imports (blocking alike) and every url() in them."""
+        if path is None or (path in self.total and (not critical or path in self.critical)):
+            return
+        self.add(path, why, critical)
+        imports, urls = css_references(self.graph, path)
+        for dep in imports:
+            self.stylesheet(dep, f'@import in {path}', critical)
+        for dep in urls:
+            self.add(dep, f'url() in {path}')
+
+    def tag(self, ctx, tag):
+        """rewrite_pipeline tag hook: records what the tag loads, returns it as is."""
+        if ctx.inside('noscript'):
+            return tag
+        name = tag[1:].split(None, 1)[0].rstrip('/>').lower()
+        attrs = attributes(tag)
+        source = self.page.path
+
+        if name in MEDIA_GROUPS:
+            self._group = []
+            self._groups.append(self._group)
+            if attrs.get('poster'):
+                self.add(self.resolve(source, attrs['poster']), 'poster')
+            self._group += self.candidates(attrs, 'src', 'data-src')
+        elif name in ('img', 'source'):
+            found = self.candidates(attrs, 'srcset', 'data-srcset', 'src', 'data-src')
+            if any(ctx.inside(group) for group in MEDIA_GROUPS) and self._groups:
+                self._group += found
+            else:
+                self.add(self.heaviest(found), 'img')
+        elif name == 'link':
+            rels = set(attrs.get('rel', '').lower().split())
+            if not rels & FETCHED_RELS:
+                return tag
+            if 'stylesheet' in rels:
+                blocking = (attrs.get('media', 'all') != 'print'
+                            and 'alternate' not in rels and 'disabled' not in attrs)
+                self.stylesheet(self.resolve(source, attrs.get('href')),
+                                'stylesheet' if blocking else 'async stylesheet', blocking)
+            elif 'preload' in rels:
+                kind = attrs.get('as', '')
+                path = (self.preloaded(attrs) if kind == 'image'
+                        else self.heaviest(self.candidates(attrs, 'imagesrcset', 'href')))
+                self.add(path, f'preload as={kind}', critical=kind == 'font')
+            else:
+                self.add(self.resolve(source, attrs.get('href')), '/'.join(sorted(rels & FETCHED_RELS)))
+        elif name == 'script' and attrs.get('src'):
+            path = self.resolve(source, attrs['src'])
+            if path is not None and path.endswith(('.js', '.mjs')):
+                mode = loading(tag)
+                self.add(path, f'{mode} script', critical=mode == 'blocking')
+                self._scripts.append((path, True))
+        elif name in ('use', 'image'):
+            self.add(self.resolve(source, attrs.get('href') or attrs.get('xlink:href')), f'<{name}>')
+        if 'style' in attrs:
+            for m in CSS_URL_RE.finditer(attrs['style']):
+                self.add(self.resolve(source, m.group(2)), 'style=""')
+        return tag
+
+    def measure(self):
+        page = self.page
+        self._groups, self._group = [], []
+        self.add(page.path, 'page', critical=True)
+        rewrite_pipeline.Pipeline([rewrite_pipeline.Transform(
+            'page-weight', tags=('*',), tag=self.tag)]).rewrite(page)
+        for group in self._groups:
+            self.add(self.heaviest(group), 'media')
+        for block in STYLE_BLOCK_RE.finditer(page.html):
+            if block.group(0).startswith(f'<style {BACKGROUND_STYLE}>'):
+                continue
+            for m in CSS_URL_RE.finditer(block.group(1)):
+                self.add(self.resolve(page.path, m.group(2)), 'url() in <style>')
+        for attrs, body in INLINE_SCRIPT_RE.findall(page.html):
+            attrs = attributes(f'<script{attrs}>')
+            if 'src' in attrs or attrs.get('type', '').lower() not in JS_TYPES:
+                continue
+            mod = Module(body)
+            for specifiers, eager in ((mod.static_imports, True), (mod.dynamic_imports, False)):
+                self._scripts += [(path, eager) for path in
+                                  (self.resolve(page.path, spec) for spec in specifiers) if path]
+        eager, lazy = script_closure(script_graph(page.root), self._scripts)
+        for path in sorted(eager):
+            self.add(path, 'JS import')
+        for path in sorted(lazy):
+            self.add(path, 'JS import()')
+        return self
+
+    def files(self, scope):
+        """{path: why} of a budget scope: critical, total or a TYPES key."""
+        if scope == 'critical':
+            return self.critical
+        if scope == 'total':
+            return self.total
+        return {p: why for p, why in self.total.items() if p.lower().endswith(TYPES[scope])}
+
+    def size(self, files):
+        """(raw, gzip) bytes of a file set."""
+        pairs = [file_size(self.page.root, p) for p in files]
+        return sum(p[0] for p in pairs), sum(p[1] for p in pairs)
+
+
+def script_closure(sgraph, roots):
+    """(eager files, lazy files) loaded from [(script, loaded up front?)]:
+    static imports with their importer, import()s later. Unlike
+    ScriptGraph.closure this follows the files actually named (shaken
+    bundles, not their vendor originals)."""
+    eager, lazy = set(), set()
+    stack = list(roots)
+    while stack:
+        path, is_eager = stack.pop()
+        target = eager if is_eager else lazy
+        if path in target or path in eager:
+            continue
+        target.add(path)
+        mod = module(path)
+        for specifiers, up_front in ((mod.static_imports, is_eager), (mod.dynamic_imports, False)):
+            stack += [(dep, up_front) for dep in
+                      (sgraph.resolve(path, spec) for spec in specifiers) if dep]
+    return eager, lazy - eager
+
+
+def css_references(graph, path):
+    """([@imported stylesheets], [url() files]) of a stylesheet (memoized)."""
+    if path not in _css:
+        with open(os.path.join(graph.corpus.root, path), encoding='utf-8') as f:
+            text = f.read()
+
+        def resolve(url):
+            target = graph.target_path(path, url)
+            return target and graph.resolve(target)
+        imports = [resolve(m.group(2)) for m in CSS_IMPORT_RE.finditer(text)]
+        urls = [resolve(m.group(2)) for m in CSS_URL_RE.finditer(text)]
+        _css[path] = ([p for p in imports if p], [p for p in urls if p and p not in imports])
+    return _css[path]
+
+
+def page_weight(page):
+    return PageWeight(page).measure()
+
+
+def load_budgets(path=BUDGETS_PATH):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)['templates']
+
+
+def parse_limit(key):
+    """'script_gz_kb' -> ('script', True); None for name, pages and unknown keys."""
+    for suffix, gz in (('_gz_kb', True), ('_kb', False)):
+        if key.endswith(suffix) and key[:-len(suffix)] in ('critical', 'total', *TYPES):
+            return key[:-len(suffix)], gz
+    return None
+
+
+def template_for(path, templates):
+    """The first template whose page globs match a page path, or None."""
+    path = path.replace(os.sep, '/')
+    for template in templates:
+        if any(fnmatch.fnmatch(path, glob) for glob in template['pages']):
+            return template
+    return None
+
+
+def largest(weight, files, gz):
+    """'a.js 120.3 KB, b.css 20.1 KB' for the three heaviest files of a set."""
+    ranked = sorted(files, key=lambda p: -file_size(weight.page.root, p)[gz])
+    return ', '.join(f'{p} {file_size(weight.page.root, p)[gz] / 1024:.1f} KB' for p in ranked[:3])
+
+
+def page_budget_issues(page, templates=None):
+    """Return [(page, message)] for each budget limit one page exceeds."""
+    templates = load_budgets() if templates is None else templates
+    template = template_for(page.path, templates)
+    if template is None:
+        return [(page.path, f'no budget template matches (add one to {os.path.relpath(BUDGETS_PATH, ROOT_DIR)})')]
+    weight = page_weight(page)
+    issues = []
+    for key, limit in template.items():
+        if key in ('name', 'pages'):
+            continue
+        if parse_limit(key) is None:
+            issues.append((page.path, f'unknown budget "{key}" in template "{template["name"]}"'))
+            continue
+        scope, gz = parse_limit(key)
+        files = weight.files(scope)
+        actual = weight.size(files)[gz] / 1024
+        if actual > limit:
+            kind = {'critical': 'critical path', 'total': 'total'}.get(scope, scope)
+            issues.append((page.path, f'{kind} {actual:.1f} KB{" gzip" if gz else ""} over the '
+                                      f'"{template["name"]}" budget of {limit} KB; '
+                                      f'heaviest: {largest(weight, files, gz)}'))
+    return issues
+
+
+def kb(pair):
+    raw, gz = pair
+    return f'{raw / 1024:7.1f} KB ({gz / 1024:6.1f} gz)'
+
+
+def breakdown(page):
+    weight = page_weight(page)
+    print(f'## {page.path}')
+    for title, files in (('critical path', weight.critical), ('total', weight.total)):
+        print(f'{title}: {kb(weight.size(files))}')
+        for path in sorted(files, key=lambda p: -file_size(page.root, p)[1]):
+            print(f'  {kb(file_size(page.root, path))}  {path}  [{files[path]}]')
+
+
+def main():
+    corpus = get_corpus(ROOT_DIR)
+    if len(sys.argv) > 1:
+        for arg in sys.argv[1:]:
+            page = corpus.page(os.path.normpath(arg))
+            if page is None:
+                print(f'ERROR: {arg} is not a page')
+                sys.exit(1)
+            breakdown(page)
+        return
+
+    templates = load_budgets()
+    issues = []
+    print(f'{"page":<78} {"template":<14} {"critical path":>26} {"total":>26}')
+    for page in corpus:
+        template = template_for(page.path, templates)
+        weight = page_weight(page)
+        print(f'{page.path:<78} {template["name"] if template else "-":<14} '
+              f'{kb(weight.size(weight.critical)):>26} {kb(weight.size(weight.total)):>26}')
+        issues += page_budget_issues(page, templates)
+    if issues:
+        print(f'\n{len(issues)} budget violation(s):')
+        for path, message in issues:
+            print(f'  {path}: {message}')
+        sys.exit(1)
+    print('\nAll pages within budget.')
+
+
+if __name__ == '__main__':
+    main()
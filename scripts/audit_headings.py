@@ -1,33 +1,12 @@
 import os
-import re
-import sys
-from html.parser import HTMLParser
 
-class HeadingAuditor(HTMLParser):
-    def __init__(self, filename):
-        super().__init__()
+from page_corpus import get_corpus
+
+class HeadingAuditor:
+    def __init__(self, filename, headings):
         self.filename = filename
-        self.headings = []
+        self.headings = headings  # [(level, text)] from the shared page parse
         self.errors = []
-        self.in_heading = False
-        self.current_heading_level = 0
-        self.current_heading_text = ""
-
-    def handle_starttag(self, tag, attrs):
-        if tag in ['h1', 'h2', 'h3', 'h4', 'h5', 'h6']:
-            self.in_heading = True
-            self.current_heading_level = int(tag[1])
-            self.current_heading_text = ""
-
-    def handle_endtag(self, tag):
-        if tag in ['h1', 'h2', 'h3', 'h4', 'h5', 'h6']:
-            if self.in_heading: # ensure we were tracking this
-                self.headings.append((self.current_heading_level, self.current_heading_text.strip()))
-                self.in_heading = False
-
-    def handle_data(self, data):
-        if self.in_heading:
-            self.current_heading_text += data
 
     def audit(self):
         if not self.headings:
@@ -59,22 +38,11 @@ class HeadingAuditor(HTMLParser):
             previous_level = level
 
 def check_files(directory):
-    html_files = []
-    for root, dirs, files in os.walk(directory):
-        if 'node_modules' in dirs:
-            dirs.remove('node_modules')
-        for file in files:
-            if file.endswith(".html"):
-                html_files.append(os.path.join(root, file))
-
     has_errors = False
-    for file_path in html_files:
+    for page in get_corpus(directory):
+        file_path = os.path.join(directory, page.path)
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            auditor = HeadingAuditor(file_path)
-            auditor.feed(content)
+            auditor = HeadingAuditor(file_path, page.headings)
             auditor.audit()
             
             if auditor.errors:
@@ -1,111 +1,63 @@
 import os
 import sys
-from html.parser import HTMLParser
-from urllib.parse import urlparse
+
+from link_graph import IMPLICIT_FRAGMENTS, get_link_graph
 
 ROOT_DIR = "."
 
-class LinkAuditor(HTMLParser):
-    def __init__(self, filepath, root_dir):
-        super().__init__()
-        self.filepath = filepath
-        self.root_dir = root_dir
-        self.broken_links = []
+def page_broken_links(page):
+    """Return [(source, message)] for the broken relative <a href>s of one page."""
+    graph = get_link_graph(page.root)
+    return [(page.path, f"{edge.url} (missing {edge.path})")
+            for edge in graph.broken(page, tags=('a',))]
+
+def find_broken_links(root_dir=ROOT_DIR):
+    """Return [(source, message)] for every broken relative <a href>."""
+    return [(edge.source, f"{edge.url} (missing {edge.path})")
+            for edge in get_link_graph(root_dir).broken(tags=('a',))]
+
+def fragment_message(url, target, fragment):
+    return f'{url} (no id "{fragment}" in {target})'
+
+def page_fragment_links(page):
+    """[[url, path, fragment]] for the <a href>s of one page that name a
+    fragment, unresolved so they stay valid while other pages change."""
+    graph = get_link_graph(page.root)
+    return [[edge.url, edge.path, edge.fragment] for edge in graph.edges_from(page)
+            if edge.tag == 'a' and edge.path is not None
+            and edge.fragment not in IMPLICIT_FRAGMENTS]
 
-    def handle_starttag(self, tag, attrs):
-        if tag == 'a':
-            attrs_dict = dict(attrs)
-            href = attrs_dict.get('href')
-            
-            if not href:
-                return
-                
-            # Skip externals, anchors, mailto, tel, javascript
-            if href.startswith(('http', '//', '#', 'mailto:', 'tel:', 'javascript:')):
-                return
-                
-            # Handle in-page anchors with path e.g. "index.html#contact"
-            href_clean = href.split('#')[0]
-            if not href_clean: # Was just "#" or "#something"
-                return
-            
-            # Resolve path
-            source_dir = os.path.dirname(self.filepath)
-            
-            # Handle root-relative paths
-            if href_clean.startswith('/'):
-                 target_path = os.path.join(self.root_dir, href_clean.lstrip('/'))
-            else:
-                 target_path = os.path.join(source_dir, href_clean)
-            
-            # Normalize (resolve ../)
-            target_path = os.path.normpath(target_path)
-            
-            # Check existence
-            # We assume it links to a file. If it links to a dir, we might check for index.html?
-            # Standard static sites usually link to .html explicitly or a dir with index.html
-            
-            exists = False
-            if os.path.exists(target_path):
-                if os.path.isdir(target_path):
-                     if os.path.exists(os.path.join(target_path, 'index.html')):
-                         exists = True
-                else:
-                    exists = True
-            
-            # Check for clean URLs (path -> path.html)
-            if not exists and not target_path.endswith('.html'):
-                if os.path.exists(target_path + '.html'):
-                    exists = True
-            
-            if not exists:
-                self.broken_links.append({
-                    'link': href,
-                    'resolved_to': os.path.relpath(target_path, self.root_dir)
-                })
+def check_fragments(fragment_links, ids, resolve):
+    """Return [(source, message)] for fragments that match no id.
+
+    fragment_links maps each page to its page_fragment_links(); ids maps
+    each page to the set of its ids; resolve maps a link path to the file it
+    is served from (LinkGraph.resolve). Every link is one set lookup.
+    """
+    issues = []
+    for source, links in fragment_links.items():
+        for url, path, fragment in links:
+            target = resolve(path)
+            if target in ids and fragment not in ids[target]:
+                issues.append((source, fragment_message(url, target, fragment)))
+    return issues
+
+def find_broken_fragments(root_dir=ROOT_DIR):
+    """Return [(source, message)] for every <a href> to a missing #fragment."""
+    return [(edge.source, fragment_message(edge.url, edge.target, edge.fragment))
+            for edge in get_link_graph(root_dir).broken_fragments()]
 
 def audit_relative_links():
     print(f"Starting Relative Link Audit in {os.path.abspath(ROOT_DIR)}...\n")
     
-    all_broken = []
-    
-    for root, dirs, files in os.walk(ROOT_DIR):
-        if 'node_modules' in dirs: dirs.remove('node_modules')
-        if '.git' in dirs: dirs.remove('.git')
-        if 'scripts' in dirs: dirs.remove('scripts')
-            
-        for file in files:
-            if not file.endswith('.html'):
-                continue
-                
-            source_path = os.path.join(root, file)
-            
-            try:
-                with open(source_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                
-                auditor = LinkAuditor(source_path, ROOT_DIR)
-                auditor.feed(content)
-                
-                if auditor.broken_links:
-                    relative_source = os.path.relpath(source_path, ROOT_DIR)
-                    for issue in auditor.broken_links:
-                        all_broken.append({
-                            'source': relative_source,
-                            'link': issue['link'],
-                            'missing': issue['resolved_to']
-                        })
-                        
-            except Exception as e:
-                print(f"Error parsing {source_path}: {e}")
+    all_broken = find_broken_links() + find_broken_fragments()
 
     # Report
     if all_broken:
         print(f"FOUND {len(all_broken)} BROKEN INTERNAL LINKS:\n")
-        for issue in all_broken:
-            print(f"FILE: {issue['source']}")
-            print(f"  LINK:   {issue['link']}")
-            print(f"  MISSING: {issue['missing']}")
+        for source, message in all_broken:
+            print(f"FILE: {source}")
+            print(f"  LINK:   {message}")
             print("-" * 40)
         sys.exit(1)
     else:
@@ -1,39 +1,32 @@
 import os
-import re
+
+from page_corpus import get_corpus
 
 ROOT_DIR = "."
 IT_DIR = "it"
 
-def check_file(filepath, expected_locale):
+def check_page(page, expected_locale):
     issues = []
-    rel_path = os.path.relpath(filepath, ROOT_DIR)
-    
-    with open(filepath, 'r', encoding='utf-8') as f:
-        content = f.read()
-        
-    # Extract standard tags
-    title_match = re.search(r'<title>(.*?)</title>', content, re.IGNORECASE | re.S)
-    meta_desc_match = re.search(r'<meta name="description"\s+content=["\'](.*?)["\']', content, re.IGNORECASE)
-    
-    # Extract OG tags
-    og_title_match = re.search(r'<meta property="og:title"\s+content=["\'](.*?)["\']', content, re.IGNORECASE)
-    og_desc_match = re.search(r'<meta property="og:description"\s+content=["\'](.*?)["\']', content, re.IGNORECASE)
-    og_locale_match = re.search(r'<meta property="og:locale"\s+content=["\'](.*?)["\']', content, re.IGNORECASE)
+
+    # Title, description and OG tags come from the shared page model
+    title = page.title
+    meta_desc = page.meta('description')
+    og_title = page.meta('og:title')
+    og_desc = page.meta('og:description')
+    og_locale = page.meta('og:locale')
     
     # 1. Check Locale
-    if not og_locale_match:
+    if og_locale is None:
         issues.append(f"Missing og:locale")
-    else:
-        found_locale = og_locale_match.group(1)
-        if found_locale != expected_locale:
-            issues.append(f"Invalid og:locale: '{found_locale}'. Expected '{expected_locale}'")
+    elif og_locale != expected_locale:
+        issues.append(f"Invalid og:locale: '{og_locale}'. Expected '{expected_locale}'")
 
     # 2. Check Title Presence & Parity
-    if not og_title_match:
+    if og_title is None:
         issues.append("Missing og:title")
-    elif title_match:
-        t = title_match.group(1).strip()
-        ot = og_title_match.group(1).strip()
+    elif title is not None:
+        t = title
+        ot = og_title.strip()
         # Loose check: OG title should be contained in or equal to Title, or vice versa
         # Often Title has branding suffix "| Milano Sensual..."
         if t != ot and ot not in t:
@@ -41,58 +34,56 @@ def check_file(filepath, expected_locale):
              issues.append(f"Title vs OG Title mismatch.\n      Title: {t}\n      OG:    {ot}")
 
     # 3. Check Description Presence & Parity
-    if not og_desc_match:
+    if og_desc is None:
         # It's okay if meta desc is missing too? simpler to just flag missing OG.
         issues.append("Missing og:description")
-    elif meta_desc_match:
-        d = meta_desc_match.group(1).strip()
-        od = og_desc_match.group(1).strip()
+    elif meta_desc is not None:
+        d = meta_desc.strip()
+        od = og_desc.strip()
         if d != od:
              issues.append(f"Description vs OG Description mismatch.\n      Meta: {d[:50]}...\n      OG:   {od[:50]}...")
 
     return issues
 
+def page_og_issues(page):
+    """Return [(relpath, issue)] for one page, checked against its language's locale."""
+    parts = page.path.split(os.sep)
+    if parts[0] == IT_DIR:
+        # 2. Italian (it/)
+        expected_locale = "it_IT"
+    elif "spring" in parts or parts[-1] == '404.html':
+        return []
+    else:
+        # 1. English (root and non-lang subfolders)
+        expected_locale = "en_US"
+    return [(page.path, i) for i in check_page(page, expected_locale)]
+
+def find_og_issues():
+    """Return [(relpath, issue)] for every Open Graph problem."""
+    issues = []
+    for page in get_corpus(ROOT_DIR):
+        issues.extend(page_og_issues(page))
+    return issues
+
 def audit_og_tags():
     print("## Open Graph Audit")
     print(f"{'File':<40} | {'Issues'}")
     print("-" * 100)
     
-    total_issues = 0
-    
-    # 1. Check English (Root)
-    for root, dirs, files in os.walk(ROOT_DIR):
-        if ".git" in root or "node_modules" in root or "scripts" in root or "it" in root.split(os.sep) or "spring" in root.split(os.sep):
-            continue
-        # Only direct root children or non-lang subfolders if any
-        # Assuming EN is root.
-        
-        for file in files:
-            if file.endswith('.html') and file != '404.html':
-                 path = os.path.join(root, file)
-                 file_issues = check_file(path, "en_US")
-                 if file_issues:
-                     print(f"{os.path.relpath(path, ROOT_DIR):<40} | Found {len(file_issues)} issues:")
-                     for i in file_issues:
-                         print(f"{'':<40} | - {i}")
-                     total_issues += len(file_issues)
+    issues = find_og_issues()
 
-    # 2. Check Italian (it/)
-    if os.path.exists(IT_DIR):
-        for root, dirs, files in os.walk(IT_DIR):
-            for file in files:
-                if file.endswith('.html'):
-                    path = os.path.join(root, file)
-                    file_issues = check_file(path, "it_IT")
-                    if file_issues:
-                        print(f"{os.path.relpath(path, ROOT_DIR):<40} | Found {len(file_issues)} issues:")
-                        for i in file_issues:
-                            print(f"{'':<40} | - {i}")
-                        total_issues += len(file_issues)
+    by_file = {}
+    for path, issue in issues:
+        by_file.setdefault(path, []).append(issue)
+    for path, file_issues in by_file.items():
+        print(f"{path:<40} | Found {len(file_issues)} issues:")
+        for i in file_issues:
+            print(f"{'':<40} | - {i}")
 
-    if total_issues == 0:
+    if not issues:
         print("\n✅ All Open Graph tags are consistent and valid.")
     else:
-        print(f"\n⚠️ Found {total_issues} total OG issues.")
+        print(f"\n⚠️ Found {len(issues)} total OG issues.")
 
 if __name__ == "__main__":
     audit_og_tags()
@@ -9,19 +9,64 @@ vendor/fontawesome/fa-subset.min.css.
 Run from the repo root after adding any new Font Awesome icon:
     python3 scripts/build_fontawesome_subset.py
 
+Per-page mode (--per-page) instead gives each group of pages only the
+glyphs it shows:
+- pages with at most SPRITE_MAX_ICONS icons get an inline SVG sprite built
+  from the pinned .ttf outlines, and load no icon font or stylesheet;
+- the other pages are clustered by icon set. Starting from one cluster per
+  distinct set, the pair whose merge saves the most expected bytes is
+  merged until no merge helps. Expected bytes are measured over a typical
+  visit: NAV_STEPS page views starting from a page drawn by internal
+  PageRank and following a random internal link each step, counting every
+  stylesheet / font the visit fetches once (the browser caches the rest)
+  and the inline sprites on every view.
+Each cluster gets vendor/fontawesome/fa-subset-<id>.min.css and
+webfonts/<font>-subset-<id>.woff2; pages are rewritten to load their
+cluster's stylesheet (their critical CSS is regenerated to match). Running
+without --per-page switches every page back to the site-wide subset.
+
+    python3 scripts/build_fontawesome_subset.py --per-page
+
+Sprite mode (--sprite) drops the icon font altogether: the used glyph
+outlines are extracted from the pinned .ttf files into one SVG symbol
+sprite (icons with identical outlines share a symbol), and every
+<i class="fa-..."></i> becomes <svg ...><use href="...#fa-solid-star"></svg>.
+No stylesheet, no woff2 requests and no font-display:block invisible-icon
+period on the critical path. The sprite is either a cached file,
+vendor/fontawesome/fa-sprite.svg, or inlined in each page with just the
+symbols that page uses:
+
+    python3 scripts/build_fontawesome_subset.py --sprite
+    python3 scripts/build_fontawesome_subset.py --sprite=inline
+
 Requires: fonttools, brotli  (pip3 install --user fonttools brotli)
 """
 import glob
+import gzip
+import hashlib
+import io
+import os
 import re
-import subprocess
 import sys
+from collections import namedtuple
+
+try:
+    from fontTools import subset as ft_subset
+    from fontTools.pens.svgPathPen import SVGPathPen
+    from fontTools.pens.transformPen import TransformPen
+    from fontTools.ttLib import TTFont
+except ImportError:
+    ft_subset = None
 
-PAGES = (
-    glob.glob('*.html')
-    + glob.glob('it/*.html')
-    + glob.glob('news/*.html')
-    + glob.glob('it/news/*.html')
-)
+from inline_critical_css import inline_critical
+from link_graph import get_link_graph
+
+FA_DIR = 'vendor/fontawesome'
+SITE_CSS = f'{FA_DIR}/fa-subset.min.css'
+SITE_HREF = f'/{SITE_CSS}?v=1'
+CLUSTER_CSS = FA_DIR + '/fa-subset-{id}.min.css'
+FA_HREF_RE = re.compile(r'/vendor/fontawesome/fa-subset(?:-[0-9a-f]+)?\.min\.css')
+SPRITE_FILE = f'{FA_DIR}/fa-sprite.svg'
 
 FAMILY_FONTS = {
     'solid': ('fa-solid-900', 'Font Awesome 6 Free', 900),
@@ -29,28 +74,57 @@ FAMILY_FONTS = {
     'brands': ('fa-brands-400', 'Font Awesome 6 Brands', 400),
 }
 
+SPRITE_MAX_ICONS = 3   # pages with this many distinct icons or fewer get a sprite
+NAV_STEPS = 4          # page views in a typical visit
+
+# <i class="fa-solid fa-star ..."></i> and the <svg> it becomes in sprite mode
+ICON_I_RE = re.compile(r'<i(\s+)class="([^"]*\bfa-[^"]*)"></i>')
+ICON_SVG_RE = re.compile(r'<svg(\s+)class="([^"]*\bfa-[^"]*)" viewBox="[^"]*" data-fa-svg '
+                         r'aria-hidden="true"><use href="[^"]*"></use></svg>')
+# The inline sprite (after <body>), or the style an external sprite needs (in <head>)
+SPRITE_RE = re.compile(r'\n?[ \t]*<svg data-fa-sprite[^>]*>.*?</svg>', re.S)
+SPRITE_STYLE_RE = re.compile(r'\n?[ \t]*<style data-fa-sprite>.*?</style>', re.S)
+SPRITE_STYLE = ('svg[data-fa-svg]{display:inline-block;height:1em;overflow:visible;'
+                'vertical-align:-.125em;fill:currentColor}')
+
+# How a page gets its icons: a stylesheet + font, or SVG symbols (ids maps
+# (family, name) to a symbol id) from an inline sprite or a sprite file.
+Delivery = namedtuple('Delivery', 'css_href sprite ids sprite_url',
+                      defaults=(None, None, None, ''))
+
+
+def family_of(classes):
+    if 'fa-brands' in classes:
+        return 'brands'
+    if 'fa-regular' in classes:
+        return 'regular'
+    return 'solid'
 
-def collect_icons():
+
+def page_icons(html):
+    """{(family, icon-name)} for every fa-* class on a page."""
+    icons = set()
+    for m in re.finditer(r'class="([^"]*\bfa-[^"]*)"', html):
+        classes = m.group(1).split()
+        fam = family_of(classes)
+        for c in classes:
+            if c.startswith('fa-') and c not in ('fa-solid', 'fa-regular', 'fa-brands'):
+                icons.add((fam, c[3:]))
+    return icons
+
+
+def collect_icons(pages):
     """Return {family: {icon-name}} for every fa-* class used in the pages."""
     icons_by_family = {'solid': set(), 'regular': set(), 'brands': set()}
-    cls_re = re.compile(r'class="([^"]*\bfa-[^"]*)"')
-    for path in PAGES:
-        for m in cls_re.finditer(open(path).read()):
-            classes = m.group(1).split()
-            fam = 'solid'
-            if 'fa-brands' in classes:
-                fam = 'brands'
-            elif 'fa-regular' in classes:
-                fam = 'regular'
-            for c in classes:
-                if c.startswith('fa-') and c not in ('fa-solid', 'fa-regular', 'fa-brands'):
-                    icons_by_family[fam].add(c[3:])
+    for page in pages:
+        for fam, name in page_icons(page.html):
+            icons_by_family[fam].add(name)
     return icons_by_family
 
 
 def codepoint_map():
     """Map icon name -> hex codepoint from the pinned full FA stylesheet."""
-    css = open('vendor/fontawesome/all.min.css').read()
+    css = open(f'{FA_DIR}/all.min.css').read()
     cp = {}
     for m in re.finditer(r'((?:\.fa-[a-z0-9-]+:before,?)+)\{content:"\\([0-9a-f]+)"\}', css):
         for name in re.findall(r'\.fa-([a-z0-9-]+):before', m.group(1)):
@@ -58,37 +132,38 @@ def codepoint_map():
     return cp
 
 
-def main():
-    icons_by_family = collect_icons()
-    cp = codepoint_map()
+def subset_font(fname, codes, output=None):
+    """woff2 bytes of a font subset to the given hex codepoints (also written
+    to output, if given)."""
+    options = ft_subset.Options()
+    options.flavor = 'woff2'
+    font = ft_subset.load_font(f'{FA_DIR}/webfonts/{fname}.ttf', options)
+    subsetter = ft_subset.Subsetter(options)
+    subsetter.populate(unicodes=[int(c, 16) for c in codes])
+    subsetter.subset(font)
+    buf = io.BytesIO()
+    ft_subset.save_font(font, buf, options)
+    if output:
+        with open(output, 'wb') as f:
+            f.write(buf.getvalue())
+    return buf.getvalue()
 
-    missing = [(f, i) for f, icons in icons_by_family.items() for i in icons if i not in cp]
-    if missing:
-        print(f'WARNING: icons not found in all.min.css (skipped): {missing}')
 
-    faces, all_used = [], {}
-    for fam, icons in icons_by_family.items():
-        icons = {i for i in icons if i in cp}
+def stylesheet(icons_by_family, cp, suffix='subset'):
+    """(css text, {family: codepoints}) for a set of icons whose fonts are
+    named <font>-<suffix>.woff2."""
+    faces, all_used, codes_by_family = [], {}, {}
+    for fam in FAMILY_FONTS:
+        icons = {i for i in icons_by_family.get(fam, ()) if i in cp}
         if not icons:
             continue
-        codes = sorted({cp[i] for i in icons})
+        codes_by_family[fam] = sorted({cp[i] for i in icons})
         all_used.update({i: cp[i] for i in icons})
         fname, family, weight = FAMILY_FONTS[fam]
-        subprocess.run(
-            [
-                sys.executable, '-m', 'fontTools.subset',
-                f'vendor/fontawesome/webfonts/{fname}.ttf',
-                '--unicodes=' + ','.join('U+' + c for c in codes),
-                '--flavor=woff2',
-                f'--output-file=vendor/fontawesome/webfonts/{fname}-subset.woff2',
-            ],
-            check=True,
-        )
         faces.append(
             f'@font-face{{font-family:"{family}";font-style:normal;font-weight:{weight};'
-            f'font-display:block;src:url(/vendor/fontawesome/webfonts/{fname}-subset.woff2) format("woff2")}}'
+            f'font-display:block;src:url(/{FA_DIR}/webfonts/{fname}-{suffix}.woff2) format("woff2")}}'
         )
-
     rules = ''.join(
         f'.fa-{name}:before{{content:"\\{code}"}}' for name, code in sorted(all_used.items())
     )
@@ -105,8 +180,330 @@ def main():
         'Regenerate with scripts/build_fontawesome_subset.py */\n'
         + ''.join(faces) + base + rules
     )
-    open('vendor/fontawesome/fa-subset.min.css', 'w').write(out)
-    print(f'OK: {len(all_used)} icons subset into vendor/fontawesome/fa-subset.min.css')
+    return out, codes_by_family
+
+
+# ---------------------------------------------------------------------------
+# SVG glyphs
+
+_fonts = {}
+
+
+def glyph(fam, name, cp):
+    """(viewBox, SVG path data) of an icon's outline in the pinned .ttf."""
+    fname = FAMILY_FONTS[fam][0]
+    if fname not in _fonts:
+        _fonts[fname] = TTFont(f'{FA_DIR}/webfonts/{fname}.ttf')
+    font = _fonts[fname]
+    glyph_name = font.getBestCmap()[int(cp[name], 16)]
+    glyph_set = font.getGlyphSet()
+    pen = SVGPathPen(glyph_set)
+    # Font units are y-up from the baseline; SVG is y-down from the top.
+    glyph_set[glyph_name].draw(TransformPen(pen, (1, 0, 0, -1, 0, font['hhea'].ascent)))
+    width = font['hmtx'][glyph_name][0]
+    return f'0 0 {width} {font["head"].unitsPerEm}', pen.getCommands()
+
+
+def symbols(icons, cp):
+    """({(family, name): symbol id}, [<symbol> markup]); icons whose
+    outlines are identical share one symbol."""
+    ids, by_outline, out = {}, {}, []
+    for fam, name in sorted(icons):
+        view_box, path = glyph(fam, name, cp)
+        sid = by_outline.get((view_box, path))
+        if sid is None:
+            sid = by_outline[(view_box, path)] = f'fa-{fam}-{name}'
+            out.append(f'<symbol id="{sid}" viewBox="{view_box}"><path d="{path}"></path></symbol>')
+        ids[(fam, name)] = sid
+    return ids, out
+
+
+def sprite(icons, cp):
+    """(hidden inline SVG sprite holding the given (family, name) icons, ids)."""
+    ids, markup = symbols(icons, cp)
+    return (f'<svg data-fa-sprite aria-hidden="true" style="display:none">'
+            f'<style>{SPRITE_STYLE}</style>{"".join(markup)}</svg>'), ids
+
+
+def icons_to_svg(html, cp, ids, url=''):
+    """Each <i class="fa-..."></i> as an <svg> using its symbol in the
+    sprite at url ('' for one inlined in the page). The viewBox is
+    repeated on the <svg> so it sizes to the glyph's width."""
+    def sub(m):
+        classes = m.group(2).split()
+        fam = family_of(classes)
+        name = next(c[3:] for c in classes
+                    if c.startswith('fa-') and c not in ('fa-solid', 'fa-regular', 'fa-brands'))
+        view_box = glyph(fam, name, cp)[0]
+        return (f'<svg{m.group(1)}class="{m.group(2)}" viewBox="{view_box}" data-fa-svg '
+                f'aria-hidden="true"><use href="{url}#{ids[(fam, name)]}"></use></svg>')
+    return ICON_I_RE.sub(sub, html)
+
+
+def icons_to_font(html):
+    """Undo icons_to_svg and drop the page's sprite or sprite style."""
+    html = SPRITE_STYLE_RE.sub('', SPRITE_RE.sub('', html))
+    return ICON_SVG_RE.sub(lambda m: f'<i{m.group(1)}class="{m.group(2)}"></i>', html)
+
+
+def deliver(page, cp, delivery):
+    """Page HTML loading its icons as the given Delivery says."""
+    html = icons_to_font(page.html)
+    if delivery.ids:
+        html = icons_to_svg(html, cp, delivery.ids, delivery.sprite_url)
+    if delivery.sprite:
+        html = re.sub(r'(<body\b[^>]*>)', lambda m: f'{m.group(1)}\n  {delivery.sprite}', html, 1)
+    elif delivery.sprite_url:
+        html = html.replace('</head>', f'  <style data-fa-sprite>{SPRITE_STYLE}</style>\n</head>', 1)
+
+    def swap(hrefs):
+        out = [h for h in hrefs if not FA_HREF_RE.match(h)]
+        if delivery.css_href:
+            index = next((i for i, h in enumerate(hrefs) if FA_HREF_RE.match(h)), len(out))
+            out.insert(index, delivery.css_href)
+        return out
+    return inline_critical(html, swap)[0]
+
+
+def write_pages(corpus, cp, delivery):
+    """Apply {page path: Delivery} to every page; returns #changed."""
+    changed = 0
+    for page in corpus:
+        if not page_icons(page.html) and not FA_HREF_RE.search(page.html):
+            continue
+        html = deliver(page, cp, delivery.get(page.path, Delivery()))
+        if html != page.html:
+            changed += 1
+            with open(page.abspath, 'w', encoding='utf-8') as f:
+                f.write(html)
+    return changed
+
+
+# ---------------------------------------------------------------------------
+# Navigation cost model
+
+class VisitModel:
+    """Typical visit: NAV_STEPS views from a PageRank-drawn first page,
+    each next view a uniformly random internal link (a page without
+    links ends the visit)."""
+
+    def __init__(self, graph, steps=NAV_STEPS):
+        self.links = {p: sorted(out) for p, out in graph.page_links().items()}
+        self.start = graph.pagerank()
+        self.steps = steps
+        self._fetch = {}
+        self.views = dict.fromkeys(self.links, 0.0)
+        dist = dict(self.start)
+        for _ in range(steps):
+            for p, mass in dist.items():
+                self.views[p] += mass
+            dist = self._step(dist)
+
+    def _step(self, dist, avoid=frozenset()):
+        new = {}
+        for p, mass in dist.items():
+            out = self.links[p]
+            for q in out:
+                if q not in avoid:
+                    new[q] = new.get(q, 0.0) + mass / len(out)
+        return new
+
+    def fetch_probability(self, pages):
+        """P(a visit views at least one of pages)."""
+        pages = frozenset(pages)
+        if pages not in self._fetch:
+            dist = {p: m for p, m in self.start.items() if p not in pages}
+            ended = 0.0
+            for _ in range(self.steps - 1):
+                ended += sum(m for p, m in dist.items() if not self.links[p])
+                dist = self._step(dist, pages)
+            self._fetch[pages] = 1.0 - ended - sum(dist.values())
+        return self._fetch[pages]
+
+
+def gzip_size(text):
+    return len(gzip.compress(text.encode('utf-8'), mtime=0))
+
+
+class ClusterCost:
+    """Expected bytes per visit of a page cluster's stylesheet and fonts.
+    Font sizes are estimated as the empty-subset size per family plus the
+    measured size of each glyph alone (woff2 compresses glyphs nearly
+    independently), so candidate merges need no subsetting."""
+
+    def __init__(self, model, cp, page_sets):
+        self.model = model
+        self.cp = cp
+        self.page_sets = page_sets  # page -> {(family, name)}
+        self.empty, self.glyph = {}, {}
+        icons = set().union(*page_sets.values()) if page_sets else set()
+        for fam in {f for f, _ in icons}:
+            fname = FAMILY_FONTS[fam][0]
+            self.empty[fam] = len(subset_font(fname, []))
+            for f, name in icons:
+                if f == fam:
+                    self.glyph[(f, name)] = max(
+                        len(subset_font(fname, [cp[name]])) - self.empty[fam], 0)
+        self._cost = {}
+
+    def cost(self, icons, pages):
+        key = (frozenset(icons), frozenset(pages))
+        if key not in self._cost:
+            by_family = {}
+            for fam, name in icons:
+                by_family.setdefault(fam, set()).add(name)
+            css, _ = stylesheet(by_family, self.cp)
+            total = gzip_size(css) * self.model.fetch_probability(pages)
+            for fam, names in by_family.items():
+                font = self.empty[fam] + sum(self.glyph[(fam, n)] for n in names)
+                users = [p for p in pages if any(f == fam for f, _ in self.page_sets[p])]
+                total += font * self.model.fetch_probability(users)
+            self._cost[key] = total
+        return self._cost[key]
+
+
+def cluster_pages(page_sets, costs):
+    """[(icons, pages)] minimizing expected bytes by greedy pairwise merging."""
+    clusters = {}
+    for page, icons in page_sets.items():
+        clusters.setdefault(frozenset(icons), set()).add(page)
+    clusters = [(set(icons), pages) for icons, pages in clusters.items()]
+    while len(clusters) > 1:
+        best, best_saving = None, 0.0
+        for i in range(len(clusters)):
+            for j in range(i + 1, len(clusters)):
+                (ia, pa), (ib, pb) = clusters[i], clusters[j]
+                saving = (costs.cost(ia, pa) + costs.cost(ib, pb)
+                          - costs.cost(ia | ib, pa | pb))
+                if saving > best_saving:
+                    best, best_saving = (i, j), saving
+        if best is None:
+            break
+        i, j = best
+        merged = (clusters[i][0] | clusters[j][0], clusters[i][1] | clusters[j][1])
+        clusters = [c for k, c in enumerate(clusters) if k not in best] + [merged]
+    return sorted(clusters, key=lambda c: sorted(c[1]))
+
+
+def remove_stale(keep=()):
+    """Delete per-page and sprite build outputs not in keep."""
+    for path in (glob.glob(CLUSTER_CSS.format(id='*'))
+                 + glob.glob(f'{FA_DIR}/webfonts/*-subset-*.woff2')
+                 + glob.glob(SPRITE_FILE)):
+        if path not in keep:
+            os.remove(path)
+
+
+def cluster_id(icons):
+    return hashlib.sha256(','.join(sorted(f'{f}:{n}' for f, n in icons)).encode()).hexdigest()[:8]
+
+
+def build_per_page(corpus, cp):
+    graph = get_link_graph()
+    model = VisitModel(graph)
+    page_sets = {}
+    for page in corpus:
+        icons = {(f, n) for f, n in page_icons(page.html) if n in cp}
+        if icons:
+            page_sets[page.path] = icons
+    sprite_pages = {p for p, icons in page_sets.items() if len(icons) <= SPRITE_MAX_ICONS}
+    font_sets = {p: icons for p, icons in page_sets.items() if p not in sprite_pages}
+    costs = ClusterCost(model, cp, page_sets)
+    clusters = cluster_pages(font_sets, costs)
+
+    delivery, written = {}, set()
+    for icons, pages in clusters:
+        cid = cluster_id(icons)
+        by_family = {}
+        for fam, name in icons:
+            by_family.setdefault(fam, set()).add(name)
+        css, codes_by_family = stylesheet(by_family, cp, f'subset-{cid}')
+        for fam, codes in codes_by_family.items():
+            fname = FAMILY_FONTS[fam][0]
+            path = f'{FA_DIR}/webfonts/{fname}-subset-{cid}.woff2'
+            subset_font(fname, codes, path)
+            written.add(path)
+        css_path = CLUSTER_CSS.format(id=cid)
+        open(css_path, 'w').write(css)
+        written.add(css_path)
+        for page in pages:
+            delivery[page] = Delivery(css_href=f'/{css_path}')
+    sprite_bytes = 0.0
+    for page in sprite_pages:
+        svg, ids = sprite(page_sets[page], cp)
+        delivery[page] = Delivery(sprite=svg, ids=ids)
+        sprite_bytes += gzip_size(svg) * model.views[page]
+
+    remove_stale(written)
+    changed = write_pages(corpus, cp, delivery)
+
+    cluster_bytes = sum(costs.cost(icons, pages) for icons, pages in clusters)
+    site_bytes = costs.cost(set().union(*page_sets.values()), set(page_sets))
+    for icons, pages in clusters:
+        print(f'  fa-subset-{cluster_id(icons)}: {len(icons):>2} icons, {len(pages):>2} pages')
+    print(f'  inline sprite: {len(sprite_pages)} pages (<= {SPRITE_MAX_ICONS} icons)')
+    print(f'Expected icon bytes per visit: {cluster_bytes + sprite_bytes:,.0f} '
+          f'(site-wide subset: {site_bytes:,.0f})')
+    print(f'OK: {len(clusters)} cluster subsets, {changed} pages updated')
+
+
+def build_sprite(corpus, cp, inline=False):
+    page_sets = {}
+    for page in corpus:
+        icons = {(f, n) for f, n in page_icons(page.html) if n in cp}
+        if icons:
+            page_sets[page.path] = icons
+    all_icons = set().union(*page_sets.values())
+    ids, markup = symbols(all_icons, cp)
+    svg = ('<svg xmlns="http://www.w3.org/2000/svg">'
+           + ''.join(markup) + '</svg>\n')
+    if inline:
+        remove_stale()
+        delivery = {}
+        for page, icons in page_sets.items():
+            page_svg, page_ids = sprite(icons, cp)
+            delivery[page] = Delivery(sprite=page_svg, ids=page_ids)
+    else:
+        with open(SPRITE_FILE, 'w') as f:
+            f.write(svg)
+        remove_stale({SPRITE_FILE})
+        delivery = {page: Delivery(ids=ids, sprite_url=f'/{SPRITE_FILE}') for page in page_sets}
+    changed = write_pages(corpus, cp, delivery)
+    where = 'inlined per page' if inline else SPRITE_FILE
+    print(f'OK: {len(all_icons)} icons as {len(markup)} symbols '
+          f'({len(svg):,} B, {gzip_size(svg):,} B gzipped) {where}, {changed} pages updated')
+
+
+def main():
+    if ft_subset is None:
+        print('ERROR: fontTools is not installed (pip3 install --user fonttools brotli)')
+        sys.exit(1)
+    corpus = get_link_graph().corpus
+    cp = codepoint_map()
+    icons_by_family = collect_icons(corpus)
+
+    missing = [(f, i) for f, icons in icons_by_family.items() for i in icons if i not in cp]
+    if missing:
+        print(f'WARNING: icons not found in all.min.css (skipped): {missing}')
+
+    if '--per-page' in sys.argv:
+        build_per_page(corpus, cp)
+        return
+    if '--sprite' in sys.argv or '--sprite=inline' in sys.argv:
+        build_sprite(corpus, cp, inline='--sprite=inline' in sys.argv)
+        return
+
+    out, codes_by_family = stylesheet(icons_by_family, cp)
+    for fam, codes in codes_by_family.items():
+        fname = FAMILY_FONTS[fam][0]
+        subset_font(fname, codes, f'{FA_DIR}/webfonts/{fname}-subset.woff2')
+    open(SITE_CSS, 'w').write(out)
+    remove_stale()
+    changed = write_pages(corpus, cp, {page.path: Delivery(css_href=SITE_HREF)
+                                       for page in corpus if page_icons(page.html)})
+    used = {i for icons in icons_by_family.values() for i in icons if i in cp}
+    print(f'OK: {len(used)} icons subset into {SITE_CSS}'
+          + (f', {changed} pages switched back to it' if changed else ''))
 
 
 if __name__ == '__main__':
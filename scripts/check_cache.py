@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""On-disk cache of per-page check results for run_all_checks.py --incremental.
+
+Each page entry is keyed by the SHA-256 of the page, and the whole cache by a
+fingerprint of the checker source code, so editing any checker invalidates
+every verdict. Entries hold the page's own verdicts plus the small "facts"
+(title, noindex, hreflangs, ids, fragment links) that cross-page checks need, which lets those
+checks run without re-parsing unchanged pages. Hreflang edges are cached by
+the hashes of both endpoints and re-run only when either side changes.
+
+The cache lives in .cache/site-checks.json (gitignored) and is written
+atomically, so an interrupted run never leaves a truncated file behind.
+"""
+import ast
+import hashlib
+import json
+import os
+
+from file_io import write_json
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(SCRIPTS_DIR)
+CACHE_PATH = os.path.join(ROOT_DIR, '.cache', 'site-checks.json')
+
+
+def sha256_text(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def local_imports(path):
+    """Source files of the scripts/ modules a file imports, at top level or
+    inside functions and try/except ImportError blocks alike."""
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), path)
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.add(node.module)
+    paths = (os.path.join(SCRIPTS_DIR, name.split('.')[0] + '.py') for name in names)
+    return [p for p in paths if os.path.exists(p)]
+
+
+def source_files(modules):
+    """The modules' source files plus every scripts/ module they import,
+    directly or not."""
+    seen = set()
+    todo = [os.path.abspath(m.__file__) for m in modules]
+    while todo:
+        path = todo.pop()
+        if path not in seen:
+            seen.add(path)
+            todo += local_imports(path)
+    return sorted(seen)
+
+
+def code_fingerprint(modules):
+    """SHA-256 over the source files of the given modules and of the local
+    modules they depend on, so editing a helper invalidates the cache too."""
+    h = hashlib.sha256()
+    for path in source_files(modules):
+        h.update(os.path.basename(path).encode())
+        with open(path, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def files_fingerprint(files):
+    """SHA-256 over a set of relative paths (link targets that may exist)."""
+    return sha256_text('\n'.join(sorted(files)))
+
+
+class CheckCache:
+    def __init__(self, fingerprint, path=CACHE_PATH):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.pages = {}
+        self.edges = {}
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get('fingerprint') == fingerprint:
+            self.pages = data.get('pages', {})
+            self.edges = data.get('edges', {})
+
+    def page(self, path, sha):
+        """The cached entry for a page if its content is unchanged, else None."""
+        entry = self.pages.get(path)
+        if entry and entry.get('sha256') == sha:
+            return entry
+        return None
+
+    def edge(self, name, key):
+        entry = self.edges.get(name)
+        if entry and entry.get('key') == key:
+            return entry['issues']
+        return None
+
+    def save(self, pages, edges):
+        """Replace the cache with the given entries (drops deleted pages)."""
+        data = {'fingerprint': self.fingerprint, 'pages': pages, 'edges': edges}
+        write_json(self.path, data)
@@ -1,13 +1,14 @@
 import os
-import sys
-from html.parser import HTMLParser
+
+from page_corpus import get_corpus
 
 ROOT_DIR = "."
 
-class SyntaxChecker(HTMLParser):
-    def __init__(self, filename):
-        super().__init__()
-        self.filename = filename
+class SyntaxChecker:
+    """Replays a page's start/end tag stream against an open-element stack."""
+
+    def __init__(self, page):
+        self.page = page
         self.stack = []
         self.errors = []
         self.void_elements = {
@@ -15,19 +16,19 @@ class SyntaxChecker(HTMLParser):
             'link', 'meta', 'param', 'source', 'track', 'wbr'
         }
 
-    def handle_starttag(self, tag, attrs):
+    def handle_starttag(self, tag, line):
         if tag not in self.void_elements:
-            self.stack.append((tag, self.getpos()))
+            self.stack.append((tag, line))
 
-    def handle_endtag(self, tag):
+    def handle_endtag(self, tag, line):
         if tag in self.void_elements:
             return
 
         if not self.stack:
-            self.errors.append(f"Line {self.getpos()[0]}: Stray closing tag </{tag}> found (no matching opening tag).")
+            self.errors.append(f"Line {line}: Stray closing tag </{tag}> found (no matching opening tag).")
             return
 
-        top_tag, top_pos = self.stack[-1]
+        top_tag, top_line = self.stack[-1]
         
         if top_tag == tag:
             self.stack.pop()
@@ -40,50 +41,60 @@ class SyntaxChecker(HTMLParser):
                         break
                 
                 for i in range(len(self.stack) - 1, found_index, -1):
-                    unclosed_tag, unclosed_pos = self.stack[i]
-                    self.errors.append(f"Line {unclosed_pos[0]}: Unclosed tag <{unclosed_tag}> (closed by </{tag}> on line {self.getpos()[0]}).")
+                    unclosed_tag, unclosed_line = self.stack[i]
+                    self.errors.append(f"Line {unclosed_line}: Unclosed tag <{unclosed_tag}> (closed by </{tag}> on line {line}).")
                 
                 self.stack = self.stack[:found_index]
             else:
-                self.errors.append(f"Line {self.getpos()[0]}: Stray closing tag </{tag}> (expected </{top_tag}>).")
+                self.errors.append(f"Line {line}: Stray closing tag </{tag}> (expected </{top_tag}>).")
 
     def check(self):
         try:
-            with open(self.filename, 'r', encoding='utf-8') as f:
-                content = f.read()
-            self.feed(content)
+            model = self.page.model
+            for kind, tag, line in model.tags:
+                if kind == 'start':
+                    self.handle_starttag(tag, line)
+                else:
+                    self.handle_endtag(tag, line)
+            if model.parse_error:
+                self.errors.append(f"Error parsing file: {model.parse_error}")
             
             if self.stack:
-                for tag, pos in self.stack:
-                    self.errors.append(f"Line {pos[0]}: Unclosed tag <{tag}> at end of file.")
+                for tag, line in self.stack:
+                    self.errors.append(f"Line {line}: Unclosed tag <{tag}> at end of file.")
                     
         except Exception as e:
             self.errors.append(f"Error parsing file: {str(e)}")
             
         return self.errors
 
+def page_syntax_errors(page):
+    """Return [(relpath, error)] for one page."""
+    return [(page.path, error) for error in SyntaxChecker(page).check()]
+
+def find_syntax_errors(root_dir=ROOT_DIR):
+    """Return [(relpath, error)] for every HTML syntax problem under root_dir."""
+    issues = []
+    for page in get_corpus(root_dir):
+        issues.extend(page_syntax_errors(page))
+    return issues
+
 def check_structure(root_dir=ROOT_DIR):
     print(f"Starting Strict HTML Syntax Check in {os.path.abspath(root_dir)}...\n")
-    found_errors = False
-    
-    for root, _, files in os.walk(root_dir):
-        if "node_modules" in root or ".git" in root or "scripts" in root:
-            continue
-            
-        for file in files:
-            if file.endswith(".html"):
-                path = os.path.join(root, file)
-                checker = SyntaxChecker(path)
-                errors = checker.check()
-                
-                if errors:
-                    found_errors = True
-                    print(f"❌ {os.path.relpath(path, root_dir)}:")
-                    for error in errors:
-                        print(f"  - {error}")
-                    print("")
-    
-    if not found_errors:
+    issues = find_syntax_errors(root_dir)
+
+    current = None
+    for rel_path, error in issues:
+        if rel_path != current:
+            if current is not None:
+                print("")
+            print(f"❌ {rel_path}:")
+            current = rel_path
+        print(f"  - {error}")
+    if current is not None:
+        print("")
+
+    if not issues:
         print("✅ No syntax errors found in HTML files.")
 
 if __name__ == "__main__":
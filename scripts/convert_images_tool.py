@@ -1,38 +1,44 @@
 import os
 import subprocess
 import re
+import sys
 
-ROOT_DIR = "."
+import rewrite_pipeline
+from page_corpus import ROOT_DIR, get_corpus
+
+try:
+    import encode_quality
+except ImportError:  # NumPy missing: only fixed-quality encoding is available
+    encode_quality = None
 
 def convert_and_update():
+    # --ssim[=TARGET]: lowest quality reaching the SSIM target instead of -q 80
+    target = None
+    if any(arg.startswith('--ssim') for arg in sys.argv[1:]):
+        if encode_quality is None:
+            print("Error: --ssim needs NumPy (pip install numpy).")
+            return
+        target = encode_quality.target_from_argv(sys.argv[1:])
+
     print("Scanning for images to convert to WebP...")
     
     # 1. Gather all images referenced in HTML
     images_to_convert = set()
     
-    for root, dirs, files in os.walk(ROOT_DIR):
-        if ".git" in root or "node_modules" in root or "scripts" in root:
-            continue
-            
-        for file in files:
-            if not file.endswith(".html"):
-                continue
-                
-            filepath = os.path.join(root, file)
-            with open(filepath, 'r', encoding='utf-8') as f:
-                content = f.read()
-                
-            # Find img src
-            matches = re.findall(r'src=["\']([^"\']+\.(?:jpg|jpeg|png))["\']', content, re.IGNORECASE)
-            for m in matches:
-                # Resolve to absolute path
-                if m.startswith('/'):
-                    abs_path = os.path.join(os.path.abspath(ROOT_DIR), m.lstrip('/'))
-                else:
-                    abs_path = os.path.join(os.path.dirname(os.path.abspath(filepath)), m)
-                
-                if os.path.exists(abs_path):
-                    images_to_convert.add(abs_path)
+    for page in get_corpus():
+        content = page.html
+
+        # Find img src
+        matches = re.findall(r'src=["\']([^"\']+\.(?:jpg|jpeg|png))["\']', content, re.IGNORECASE)
+        for m in matches:
+            # Resolve to absolute path
+            if m.startswith('/'):
+                abs_path = os.path.join(os.path.abspath(ROOT_DIR), m.lstrip('/'))
+            else:
+                abs_path = os.path.join(os.path.dirname(page.abspath), m)
+
+            if os.path.exists(abs_path):
+                images_to_convert.add(abs_path)
 
     print(f"Found {len(images_to_convert)} unique images to convert.")
 
@@ -49,7 +55,8 @@ def convert_and_update():
             # Convert
             print(f"Converting: {os.path.relpath(src_path, ROOT_DIR)} -> .webp")
             try:
-                subprocess.check_call(['cwebp', '-q', '80', src_path, '-o', dst_path], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                quality = str(encode_quality.find_quality(src_path, target=target)) if target else '80'
+                subprocess.check_call(['cwebp', '-q', quality, src_path, '-o', dst_path], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
                 converted_count += 1
             except FileNotFoundError:
                 print("Error: cwebp not found. Please install webp tools.")
@@ -58,46 +65,27 @@ def convert_and_update():
                 print(f"Error converting {src_path}: {e}")
                 continue
 
+    if target:
+        encode_quality.save()
+
     # 2. Update HTML References
     print("Updating HTML references...")
-    
-    for root, dirs, files in os.walk(ROOT_DIR):
-        if ".git" in root or "node_modules" in root or "scripts" in root:
-            continue
-            
-        for file in files:
-            if not file.endswith(".html"):
-                continue
-                
-            filepath = os.path.join(root, file)
-            with open(filepath, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            original_content = content
-            
-            # Simple replace strategy: exact filename match to safe relative path issues?
-            # Or regex replace?
-            # Let's use regex to be safe we only replace inside src attributes or similar
-            # Actually, standard replace of basename might be risky if same filename in different dirs.
-            # But we generated the list from HTML references, so we know they are used.
-            
-            # Better: iterate over the images we found/converted.
-            
-            for src_path in images_to_convert:
-                filename_old = os.path.basename(src_path)
-                filename_new = os.path.splitext(filename_old)[0] + ".webp"
-                
-                # We need to replace references to this file.
-                # Regex: src=".../filename.jpg" -> src=".../filename.webp"
-                # Be careful not to replace partial matches.
-                
-                pattern = re.compile(re.escape(filename_old) + r'(?=["\'])', re.IGNORECASE)
-                content = pattern.sub(filename_new, content)
-                
-            if content != original_content:
-                with open(filepath, 'w', encoding='utf-8') as f:
-                    f.write(content)
-                print(f"Updated {file}")
+
+    # We generated the list from HTML references, so we know they are used.
+    # Replace each converted file's name where it ends an attribute value:
+    # src=".../filename.jpg" -> src=".../filename.webp"
+    def update_references(ctx, content):
+        for src_path in images_to_convert:
+            filename_old = os.path.basename(src_path)
+            filename_new = os.path.splitext(filename_old)[0] + ".webp"
+            pattern = re.compile(re.escape(filename_old) + r'(?=["\'])', re.IGNORECASE)
+            content = pattern.sub(filename_new, content)
+        return content
+
+    changed, _notes = rewrite_pipeline.run(
+        [rewrite_pipeline.Transform('webp-references', document=update_references)])
+    for path in changed:
+        print(f"Updated {path}")
 
     print(f"Done. Converted {converted_count} images.")
 
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""Minimal CSS rule tree and selector-usage purge for the site's stylesheets.
+
+Parses plain or minified CSS (Tailwind's output included) into a list of
+nodes, keeps only the rules a page can use, and serializes the result back
+to minified CSS:
+
+    from css_rules import parse, purge, serialize, page_tokens
+    rules = parse(open('css/tailwind.min.css').read())
+    used = serialize(purge(rules, page_tokens(html)))
+
+A rule is kept when at least one selector in its list names only classes,
+ids and element types that appear on the page. Tokens are taken from the
+whole document, inline scripts included, so classes toggled from JavaScript
+(classList.add('hidden')) count as used - the same conservative rule
+PurgeCSS applies. Pseudo-classes, pseudo-elements, attribute selectors and
+the arguments of :not()/:is()/:where() never disqualify a rule.
+
+@media / @supports blocks are purged recursively and dropped when empty;
+@keyframes survive only when a kept rule names them; @font-face, @import
+and other at-rules are always kept.
+"""
+import re
+
+# At-rules whose block holds further rules rather than declarations
+GROUPING_AT_RULES = ('@media', '@supports', '@layer', '@container', '@document')
+# Words a page's markup, attributes and scripts are split into
+TOKEN_RE = re.compile(r'''[^\s"'`<>=]+''')
+TAG_RE = re.compile(r'<([a-zA-Z][a-zA-Z0-9-]*)')
+_ESCAPE_RE = re.compile(r'\\([0-9a-fA-F]{1,6}\s?|.)', re.S)
+_IDENT = r'(?:\\[0-9a-fA-F]{1,6}\s?|\\.|[\w-])+'
+_CLASS_RE = re.compile(r'\.(' + _IDENT + ')')
+_ID_RE = re.compile(r'#(' + _IDENT + ')')
+_TYPE_RE = re.compile(r'(?:^|[\s>+~(])([a-zA-Z][a-zA-Z0-9-]*)')
+
+
+class Rule:
+    """A style rule (prelude = selector list, body = declarations) or an
+    at-rule (prelude starts with '@'; children for grouping rules, body for
+    @font-face / @keyframes, neither for statements like @import)."""
+
+    __slots__ = ('prelude', 'body', 'children')
+
+    def __init__(self, prelude, body=None, children=None):
+        self.prelude = prelude
+        self.body = body
+        self.children = children
+
+    @property
+    def is_at_rule(self):
+        return self.prelude.startswith('@')
+
+    def __repr__(self):
+        return f'Rule({self.prelude!r})'
+
+
+def _skip_string(text, i):
+    """Index just past the string literal opening at text[i]."""
+    quote = text[i]
+    i += 1
+    while i < len(text) and text[i] != quote:
+        i += 2 if text[i] == '\\' else 1
+    return i + 1
+
+
+def _scan(text, i, stops):
+    """Index of the first character in `stops` at paren depth 0, skipping
+    strings, comments and escapes; len(text) when there is none."""
+    depth = 0
+    while i < len(text):
+        c = text[i]
+        if c in '"\'':
+            i = _skip_string(text, i)
+            continue
+        if c == '\\':
+            i += 2
+            continue
+        if text.startswith('/*', i):
+            end = text.find('*/', i + 2)
+            i = len(text) if end < 0 else end + 2
+            continue
+        if c in '([':
+            depth += 1
+        elif c in ')]':
+            depth -= 1
+        elif depth == 0 and c in stops:
+            return i
+        i += 1
+    return i
+
+
+def _block_end(text, i):
+    """Index of the '}' closing the block whose '{' is at text[i - 1]."""
+    depth = 1
+    while i < len(text):
+        i = _scan(text, i, '{}')
+        if i >= len(text):
+            break
+        depth += 1 if text[i] == '{' else -1
+        if depth == 0:
+            return i
+        i += 1
+    return i
+
+
+def _strip_comments(text):
+    out, i = [], 0
+    while i < len(text):
+        c = text[i]
+        if c in '"\'':
+            j = _skip_string(text, i)
+            out.append(text[i:j])
+            i = j
+        elif text.startswith('/*', i):
+            end = text.find('*/', i + 2)
+            i = len(text) if end < 0 else end + 2
+        else:
+            out.append(c)
+            i += 1
+    return ''.join(out)
+
+
+def _parse(text, i):
+    rules = []
+    while i < len(text):
+        while i < len(text) and text[i].isspace():
+            i += 1
+        if i >= len(text):
+            break
+        if text[i] == '}':
+            return rules, i + 1
+        end = _scan(text, i, '{;}')
+        prelude = ' '.join(text[i:end].split())
+        if end >= len(text) or text[end] in ';}':
+            if prelude:
+                rules.append(Rule(prelude))  # @import, @charset, stray tokens
+            i = end + 1 if end < len(text) and text[end] == ';' else end
+            continue
+        if prelude.lower().startswith(GROUPING_AT_RULES):
+            children, i = _parse(text, end + 1)
+            rules.append(Rule(prelude, children=children))
+        else:
+            close = _block_end(text, end + 1)
+            rules.append(Rule(prelude, body=text[end + 1:close].strip()))
+            i = close + 1
+    return rules, i
+
+
+def parse(text):
+    """[Rule] for a stylesheet's text (comments dropped)."""
+    return _parse(_strip_comments(text), 0)[0]
+
+
+def serialize(rules):
+    """Minified CSS for a list of rules."""
+    out = []
+    for rule in rules:
+        if rule.children is not None:
+            out.append(f'{rule.prelude}{{{serialize(rule.children)}}}')
+        elif rule.body is not None:
+            out.append(f'{rule.prelude}{{{rule.body}}}')
+        else:
+            out.append(f'{rule.prelude};')
+    return ''.join(out)
+
+
+def unescape(ident):
+    """CSS identifier with escapes resolved: md\\:flex -> md:flex, \\32 xl -> 2xl."""
+    def sub(m):
+        s = m.group(1)
+        if len(s.strip()) > 1 or s[0] in '0123456789abcdefABCDEF':
+            return chr(int(s.strip(), 16))
+        return s
+    return _ESCAPE_RE.sub(sub, ident)
+
+
+def split_selectors(prelude):
+    """Top-level comma-separated selectors of a selector list."""
+    parts, i = [], 0
+    while i <= len(prelude):
+        end = _scan(prelude, i, ',')
+        parts.append(prelude[i:end].strip())
+        i = end + 1
+    return [p for p in parts if p]
+
+
+def _drop_functional_pseudos(selector):
+    """The selector with :not(...)/:is(...)/::part(...) arguments and
+    [attribute] conditions removed."""
+    out, i = [], 0
+    while i < len(selector):
+        c = selector[i]
+        if c == '\\':
+            out.append(selector[i:i + 2])
+            i += 2
+        elif c in '"\'':
+            i = _skip_string(selector, i)
+        elif c in '([':
+            close = {'(': ')', '[': ']'}[c]
+            depth, j = 1, i + 1
+            while j < len(selector) and depth:
+                if selector[j] == '\\':
+                    j += 2
+                    continue
+                if selector[j] == c:
+                    depth += 1
+                elif selector[j] == close:
+                    depth -= 1
+                j += 1
+            i = j
+        else:
+            out.append(c)
+            i += 1
+    return ''.join(out)
+
+
+def selector_requirements(selector):
+    """(classes, ids, types) a single selector needs present on the page."""
+    bare = _drop_functional_pseudos(selector)
+    # Pseudo names (:hover, ::before) are not element types
+    bare_no_pseudo = re.sub(r'::?[\w-]+', ' ', bare)
+    classes = {unescape(c) for c in _CLASS_RE.findall(bare)}
+    ids = {unescape(i) for i in _ID_RE.findall(bare)}
+    types = {t.lower() for t in _TYPE_RE.findall(re.sub(r'[.#]' + _IDENT, ' ', bare_no_pseudo))}
+    return classes, ids, types
+
+
+class PageTokens:
+    """What a page could match: every word in its text, plus its tag names."""
+
+    def __init__(self, words, tags):
+        self.words = set(words)
+        self.tags = {t.lower() for t in tags}
+
+    def matches(self, selector):
+        classes, ids, types = selector_requirements(selector)
+        return (classes <= self.words and ids <= self.words
+                and all(t in self.tags for t in types))
+
+
+def page_tokens(*texts):
+    """PageTokens for one or more chunks of HTML / JavaScript."""
+    words, tags = set(), {'html', 'body'}
+    for text in texts:
+        words.update(TOKEN_RE.findall(text))
+        tags.update(TAG_RE.findall(text))
+    # Class attributes split on whitespace only; also split tokens that
+    # JavaScript glues together ("classList.toggle('open')") on ( ) , ;
+    for word in list(words):
+        words.update(w for w in re.split(r'[(),;]+', word) if w)
+    return PageTokens(words, tags)
+
+
+_KEYFRAMES_RE = re.compile(r'@(?:-\w+-)?keyframes\s+(\S+)', re.I)
+
+
+def _purge(rules, tokens):
+    kept = []
+    for rule in rules:
+        if rule.children is not None:
+            children = _purge(rule.children, tokens)
+            if children:
+                kept.append(Rule(rule.prelude, children=children))
+        elif rule.is_at_rule:
+            kept.append(rule)
+        else:
+            selectors = [s for s in split_selectors(rule.prelude) if tokens.matches(s)]
+            if selectors:
+                kept.append(Rule(','.join(selectors), body=rule.body))
+    return kept
+
+
+def _drop_unused_keyframes(rules, used_text):
+    out = []
+    for rule in rules:
+        m = _KEYFRAMES_RE.match(rule.prelude)
+        if m and not re.search(r'(?<![\w-])' + re.escape(m.group(1)) + r'(?![\w-])', used_text):
+            continue
+        if rule.children is not None:
+            rule = Rule(rule.prelude, children=_drop_unused_keyframes(rule.children, used_text))
+        out.append(rule)
+    return out
+
+
+def purge(rules, tokens):
+    """The rules a page with these PageTokens can use (see module docstring)."""
+    kept = _purge(rules, tokens)
+    style_text = serialize([r for r in _flatten(kept) if not _KEYFRAMES_RE.match(r.prelude)])
+    return _drop_unused_keyframes(kept, style_text)
+
+
+def _flatten(rules):
+    for rule in rules:
+        if rule.children is not None:
+            yield from _flatten(rule.children)
+        else:
+            yield rule
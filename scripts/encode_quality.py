@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""Pick the lowest WebP quality that still looks like the source.
+
+Instead of one fixed `cwebp -q` for every image, binary-search q until the
+encoded result reaches a target SSIM (structural similarity, on luma)
+against a lossless encode of the same resize. Busy photos of dancers settle
+low, flat logo art and text settle high. SSIM is computed here with NumPy;
+pixels come from `dwebp -ppm`, so the only tools needed are cwebp/dwebp.
+
+The chosen q is cached in .cache/encode-quality.json keyed by the source's
+SHA-256, the output width and the target, so each image is searched once:
+
+    import encode_quality
+    q = encode_quality.find_quality('images/hotel/pool.webp', width=800)
+    encode_quality.save()
+
+Run directly to print the chosen q for a few files:
+    python3 scripts/encode_quality.py images/artists/*.webp
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+from concurrent.futures import Future
+
+import numpy as np
+
+from file_io import file_sha256, write_json
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_PATH = os.path.join(ROOT_DIR, '.cache', 'encode-quality.json')
+
+DEFAULT_TARGET = 0.985  # mean luma SSIM; ~visually lossless at phone density
+Q_MIN, Q_MAX = 40, 95
+SSIM_WINDOW = 8         # square window, as in the original SSIM paper's 8x8 variant
+_C1 = (0.01 * 255) ** 2
+_C2 = (0.03 * 255) ** 2
+
+
+def read_ppm(data):
+    """(height, width, 3) uint8 array from binary PPM (P6) bytes."""
+    fields, pos = [], 0
+    while len(fields) < 4:
+        while data[pos:pos + 1].isspace():
+            pos += 1
+        if data[pos:pos + 1] == b'#':
+            pos = data.index(b'\n', pos)
+            continue
+        end = pos
+        while not data[end:end + 1].isspace():
+            end += 1
+        fields.append(data[pos:end])
+        pos = end
+    magic, w, h, maxval = fields[0], int(fields[1]), int(fields[2]), int(fields[3])
+    if magic != b'P6' or maxval != 255:
+        raise ValueError('expected an 8-bit binary PPM')
+    pixels = np.frombuffer(data, np.uint8, w * h * 3, pos + 1)
+    return pixels.reshape(h, w, 3)
+
+
+def luma(rgb):
+    """BT.601 luma as float64, the channel SSIM is conventionally run on."""
+    return rgb.astype(np.float64) @ np.array([0.299, 0.587, 0.114])
+
+
+def _window_means(x, n):
+    """Mean of every n x n window (valid positions only) via an integral image."""
+    s = np.pad(x, ((1, 0), (1, 0))).cumsum(0).cumsum(1)
+    return (s[n:, n:] - s[:-n, n:] - s[n:, :-n] + s[:-n, :-n]) / (n * n)
+
+
+def ssim(a, b, window=SSIM_WINDOW):
+    """Mean SSIM of two equally sized 2-D luma arrays."""
+    if a.shape != b.shape:
+        raise ValueError(f'shape mismatch {a.shape} vs {b.shape}')
+    n = min(window, *a.shape)
+    mu_a, mu_b = _window_means(a, n), _window_means(b, n)
+    var_a = _window_means(a * a, n) - mu_a ** 2
+    var_b = _window_means(b * b, n) - mu_b ** 2
+    cov = _window_means(a * b, n) - mu_a * mu_b
+    num = (2 * mu_a * mu_b + _C1) * (2 * cov + _C2)
+    den = (mu_a ** 2 + mu_b ** 2 + _C1) * (var_a + var_b + _C2)
+    return float((num / den).mean())
+
+
+def _encode_luma(src_path, width, args, tmp_dir):
+    """Encode with cwebp (resized to width, if given), decode, return luma."""
+    out = os.path.join(tmp_dir, 'probe.webp')
+    resize = ['-resize', str(width), '0'] if width else []
+    subprocess.check_call(['cwebp', *args, *resize, src_path, '-o', out],
+                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    ppm = subprocess.check_output(['dwebp', out, '-ppm', '-o', '-'],
+                                  stderr=subprocess.DEVNULL)
+    return luma(read_ppm(ppm))
+
+
+def search_quality(src_path, width=None, target=DEFAULT_TARGET):
+    """Lowest q in [Q_MIN, Q_MAX] whose encode reaches `target` SSIM.
+
+    SSIM rises with q (near enough for a search), so this binary-searches in
+    about six encodes. Images that miss the target even at Q_MAX get Q_MAX.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        reference = _encode_luma(src_path, width, ['-lossless', '-exact'], tmp_dir)
+        lo, hi = Q_MIN, Q_MAX
+        while lo < hi:
+            q = (lo + hi) // 2
+            score = ssim(reference, _encode_luma(src_path, width, ['-q', str(q)], tmp_dir))
+            if score >= target:
+                hi = q
+            else:
+                lo = q + 1
+        return lo
+
+
+class QualityCache:
+    """Chosen q per (source content, width, target).
+
+    Thread-safe: threads asking for the same key share one search, and each
+    source is hashed once per run (while its mtime and size hold)."""
+
+    def __init__(self, path=CACHE_PATH):
+        self.path = path
+        self.entries = {}
+        self.dirty = False
+        self._lock = threading.Lock()
+        self._hashes = {}    # (path, mtime, size) -> Future of the SHA-256
+        self._searches = {}  # cache key -> Future of q
+        try:
+            with open(path, encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def _once(self, pending, key, compute):
+        """compute() run by the first thread asking for key; the others wait
+        for its result. A failure is raised to all of them and retried on
+        the next call."""
+        with self._lock:
+            future = pending.get(key)
+            owner = future is None
+            if owner:
+                future = pending[key] = Future()
+        if owner:
+            try:
+                future.set_result(compute())
+            except BaseException as e:
+                with self._lock:
+                    del pending[key]
+                future.set_exception(e)
+        return future.result()
+
+    def _sha256(self, src_path):
+        st = os.stat(src_path)
+        key = (os.path.abspath(src_path), st.st_mtime_ns, st.st_size)
+        return self._once(self._hashes, key, lambda: file_sha256(src_path))
+
+    def _search(self, key, src_path, width, target):
+        q = search_quality(src_path, width, target)
+        with self._lock:
+            self.entries[key] = q
+            self.dirty = True
+        return q
+
+    def quality(self, src_path, width=None, target=DEFAULT_TARGET):
+        key = f'{self._sha256(src_path)}:{width or "full"}:{target}'
+        with self._lock:
+            if key in self.entries:
+                return self.entries[key]
+        return self._once(self._searches, key,
+                          lambda: self._search(key, src_path, width, target))
+
+    def save(self):
+        with self._lock:
+            if not self.dirty:
+                return
+            entries = dict(self.entries)
+            self.dirty = False
+        write_json(self.path, entries, sort_keys=True)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Process-wide shared QualityCache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = QualityCache()
+        return _cache
+
+
+def find_quality(src_path, width=None, target=DEFAULT_TARGET):
+    return get_cache().quality(src_path, width, target)
+
+
+def save():
+    get_cache().save()
+
+
+def target_from_argv(argv):
+    """SSIM target from a --ssim or --ssim=0.99 flag, else None (fixed q)."""
+    for arg in argv:
+        if arg == '--ssim':
+            return DEFAULT_TARGET
+        if arg.startswith('--ssim='):
+            return float(arg.split('=', 1)[1])
+    return None
+
+
+if __name__ == '__main__':
+    target = target_from_argv(sys.argv[1:]) or DEFAULT_TARGET
+    for path in sys.argv[1:]:
+        if path.startswith('--'):
+            continue
+        print(f'{path}: q={find_quality(path, target=target)} (SSIM >= {target})')
+    save()
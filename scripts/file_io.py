@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""File helpers shared by the build scripts and their caches.
+
+    from file_io import file_sha256, write_atomic, write_json
+
+write_atomic() replaces a file through a temp file in the same directory
+and a rename, so an interrupted run never leaves a half-written page, blob
+or cache behind. An existing file keeps its mode; a new one gets 0644
+(mkstemp alone would leave it 0600).
+"""
+import hashlib
+import json
+import os
+import tempfile
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def write_atomic(path, data):
+    """Replace path with data (str is written as UTF-8), creating its directory."""
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        try:
+            os.chmod(tmp, os.stat(path).st_mode & 0o777)
+        except FileNotFoundError:
+            os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def write_json(path, obj, **dump_args):
+    """write_atomic() of obj as JSON; dump_args go to json.dumps."""
+    write_atomic(path, json.dumps(obj, **dump_args))
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""Build a deployable copy of the site with content-hashed asset filenames.
+
+Every CSS, JS, font and image file is copied to a fingerprinted name
+(css/tailwind.min.css -> css/tailwind.3f9a1c2b.min.css) and every reference
+to it is rewritten: src, href, srcset/imagesrcset, data-* and poster
+attributes, preload links, url() in stylesheets and inline <style> blocks,
+and relative or root-absolute imports between ES modules. A file's hash
+covers its rewritten content, so a font change also renames the stylesheet
+that points at it.
+Hand-bumped ?v=N cache busters are dropped on rewritten references.
+
+Only files git tracks are copied, less SOURCE_ONLY build inputs and
+NEVER_DEPLOYED junk. The source tree is never modified. Output goes to
+_site/ (gitignored) with:
+- asset-manifest.json   original path -> fingerprinted path
+- _headers              Cache-Control: immutable for every fingerprinted file
+                        (Netlify / Cloudflare Pages syntax)
+Original asset names are kept alongside the hashed copies, so absolute URLs
+(og:image, JSON-LD, sitemap images, manifest.json icons) keep working.
+
+Run from the repo root: python3 scripts/fingerprint_assets.py [OUT_DIR]
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from link_graph import get_link_graph
+from page_corpus import ROOT_DIR
+
+OUT_DIR = os.path.join(ROOT_DIR, '_site')
+MANIFEST_NAME = 'asset-manifest.json'
+ASSET_DIRS = ('css', 'js', 'fonts', 'images', 'vendor')
+ASSET_EXTS = ('.css', '.js', '.woff2', '.woff', '.ttf', '.webp', '.avif',
+              '.jpg', '.jpeg', '.png', '.gif', '.svg', '.ico', '.mp4')
+HASH_LEN = 8
+IMMUTABLE = 'public, max-age=31536000, immutable'
+# Build inputs that are never deployed (the unsubsetted fonts), and
+# committed junk that should not be either
+SOURCE_ONLY = (os.path.join('fonts', 'src') + os.sep,)
+NEVER_DEPLOYED = ('.DS_Store',)
+
+CSS_URL_RE = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+# Relative and root-absolute ES module specifiers: from"./x.js",
+# import "../x.js", import("/vendor/x.js") (not protocol-relative //host/x.js)
+JS_IMPORT_RE = re.compile(r'''((?:\bfrom|\bimport)\s*\(?\s*)(['"])((?:\.{1,2}/|/(?!/))[^'"]+)\2''')
+# Attributes holding one URL, and the two holding candidate lists
+URL_ATTR_RE = re.compile(r'''(\s(?:src|href|poster|data-(?!inline\b)[\w-]+)=)(["'])([^"']*)\2''')
+SRCSET_ATTR_RE = re.compile(r'''(\s(?:srcset|imagesrcset)=)(["'])([^"']*)\2''')
+
+
+def is_deployed(path):
+    return (not path.startswith(SOURCE_ONLY)
+            and os.path.basename(path) not in NEVER_DEPLOYED)
+
+
+def is_asset(path):
+    return (path.split(os.sep, 1)[0] in ASSET_DIRS
+            and path.lower().endswith(ASSET_EXTS))
+
+
+def hashed_name(path, digest):
+    """css/tailwind.min.css -> css/tailwind.<digest>.min.css"""
+    directory, name = os.path.split(path)
+    stem, dot, rest = name.partition('.')
+    return os.path.join(directory, f'{stem}.{digest[:HASH_LEN]}{dot}{rest}')
+
+
+class Fingerprinter:
+    def __init__(self, graph, files=None):
+        self.graph = graph
+        self.root = graph.corpus.root
+        self.files = {p for p in (graph.corpus.files if files is None else files)
+                      if is_deployed(p)}
+        self.assets = {p for p in self.files if is_asset(p)}
+        self.manifest = {}   # original -> hashed path
+        self.content = {}    # original -> bytes written under the hashed name
+        self._visiting = set()
+
+    def rewrite_url(self, source, url):
+        """The fingerprinted form of url as written on file `source`, or url
+        itself when it does not point at an asset."""
+        path = self.graph.target_path(source, url)
+        if path is None or url.startswith('#'):
+            return url
+        path = self.graph.resolve(path)
+        if path not in self.assets:
+            return url
+        hashed = self.fingerprint(path)
+        fragment = url.partition('#')[2]
+        if url.startswith('/'):
+            new = '/' + hashed.replace(os.sep, '/')
+        else:
+            new = os.path.relpath(hashed, os.path.dirname(source) or '.').replace(os.sep, '/')
+            if url.startswith('./') and not new.startswith('.'):
+                new = './' + new  # keep ES module specifiers relative
+        return new + ('#' + fragment if fragment else '')
+
+    def rewrite_css(self, source, text):
+        def sub(m):
+            return f'url({m.group(1)}{self.rewrite_url(source, m.group(2))}{m.group(1)})'
+        return CSS_URL_RE.sub(sub, text)
+
+    def rewrite_js(self, source, text):
+        def sub(m):
+            return m.group(1) + m.group(2) + self.rewrite_url(source, m.group(3)) + m.group(2)
+        return JS_IMPORT_RE.sub(sub, text)
+
+    def fingerprint(self, path):
+        """Hashed path of an asset, rewriting and hashing its dependencies first."""
+        if path in self.manifest:
+            return self.manifest[path]
+        if path in self._visiting:
+            raise ValueError(f'reference cycle through {path}')
+        self._visiting.add(path)
+        with open(os.path.join(self.root, path), 'rb') as f:
+            data = f.read()
+        if path.endswith('.css'):
+            data = self.rewrite_css(path, data.decode('utf-8')).encode('utf-8')
+        elif path.endswith('.js'):
+            data = self.rewrite_js(path, data.decode('utf-8')).encode('utf-8')
+        self._visiting.discard(path)
+        hashed = hashed_name(path, hashlib.sha256(data).hexdigest())
+        self.manifest[path] = hashed
+        self.content[path] = data
+        return hashed
+
+    def rewrite_page(self, page):
+        """Page HTML with every asset reference fingerprinted."""
+        source = page.path
+
+        def sub_url(m):
+            return m.group(1) + m.group(2) + self.rewrite_url(source, m.group(3)) + m.group(2)
+
+        def sub_srcset(m):
+            candidates = []
+            for candidate in m.group(3).split(','):
+                url, _, descriptor = candidate.strip().partition(' ')
+                candidates.append(f'{self.rewrite_url(source, url)} {descriptor}'.strip())
+            return m.group(1) + m.group(2) + ', '.join(candidates) + m.group(2)
+
+        html = URL_ATTR_RE.sub(sub_url, page.html)
+        html = SRCSET_ATTR_RE.sub(sub_srcset, html)
+        return self.rewrite_css(source, html)  # <style> blocks and style=""
+
+
+def tracked_files(root):
+    """Repo-relative paths git tracks, so untracked local files (patches,
+    notes, editor backups) never reach the build."""
+    out = subprocess.run(['git', '-c', 'core.quotePath=false', 'ls-files', '-z'],
+                         cwd=root, capture_output=True, text=True, check=True).stdout
+    return {path.replace('/', os.sep) for path in out.split('\0') if path}
+
+
+def copy_tree(root, files, out):
+    for path in sorted(files):
+        dst = os.path.join(out, path)
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        shutil.copy2(os.path.join(root, path), dst)
+
+
+def write_file(out, path, data):
+    dst = os.path.join(out, path)
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    with open(dst, 'wb') as f:
+        f.write(data)
+
+
+def build(out_dir=OUT_DIR):
+    """Build the fingerprinted site into out_dir; returns the manifest."""
+    graph = get_link_graph(ROOT_DIR)
+    corpus = graph.corpus
+    fp = Fingerprinter(graph, tracked_files(corpus.root))
+    for path in sorted(fp.assets):
+        fp.fingerprint(path)
+
+    out_dir = os.path.abspath(out_dir)
+    if os.path.exists(out_dir) and os.listdir(out_dir) and not os.path.exists(
+            os.path.join(out_dir, MANIFEST_NAME)):
+        raise SystemExit(f'{out_dir} exists and is not a previous build; refusing to replace it')
+    parent = os.path.dirname(out_dir)
+    tmp = tempfile.mkdtemp(dir=parent, prefix='.site-')
+    try:
+        copy_tree(corpus.root, fp.files & corpus.files, tmp)
+        changed = 0
+        for page in corpus:
+            html = fp.rewrite_page(page)
+            if html != page.html:
+                changed += 1
+                write_file(tmp, page.path, html.encode('utf-8'))
+        for path, hashed in fp.manifest.items():
+            write_file(tmp, hashed, fp.content[path])
+        manifest = {k.replace(os.sep, '/'): v.replace(os.sep, '/')
+                    for k, v in sorted(fp.manifest.items())}
+        write_file(tmp, MANIFEST_NAME, json.dumps(manifest, indent=1).encode('utf-8'))
+        headers = ''.join(f'/{hashed}\n  Cache-Control: {IMMUTABLE}\n'
+                          for hashed in manifest.values())
+        write_file(tmp, '_headers', headers.encode('utf-8'))
+        os.chmod(tmp, 0o755)  # mkdtemp creates 0700
+        if os.path.exists(out_dir):
+            shutil.rmtree(out_dir)
+        os.replace(tmp, out_dir)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    print(f'{len(manifest)} assets fingerprinted, references rewritten in '
+          f'{changed} of {len(corpus)} pages -> {out_dir}')
+    return manifest
+
+
+if __name__ == '__main__':
+    build(sys.argv[1] if len(sys.argv) > 1 else OUT_DIR)
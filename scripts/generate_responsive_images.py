@@ -1,5 +1,43 @@
+"""Generate the responsive WebP ladder (_480w/_800w/_1200w) for content images.
+
+Encodes run concurrently: every (source, width) pair is one cwebp job and at
+most one job per CPU runs at a time. A manifest in
+.cache/responsive-variants.json maps each source to the SHA-256 it had when
+its variants were produced, so unchanged sources are skipped and a changed
+source has its whole ladder re-encoded. Variants that already exist but are
+not in the manifest yet are adopted as they are.
+
+Each variant is encoded into a temp file next to it and renamed into place,
+so an interrupted run never leaves a half-written _480w.webp behind.
+
+With --avif, every rung (and the full-size source) also gets an AVIF twin
+(foo_480w.avif, foo.avif) encoded with ffmpeg/libaom once its WebP exists.
+A twin is kept only when it is at least AVIF_MIN_SAVING smaller than the
+WebP it shadows; rejections are remembered in the manifest.
+apply_responsive_images.py serves the twins through <picture>.
+
+With --ssim (or --ssim=0.99) each rung is encoded at the lowest cwebp
+quality that reaches the SSIM target instead of the fixed CWEBP_ARGS; see
+encode_quality.py (needs NumPy). Switching modes re-encodes the ladder.
+
+Run from the repo root:
+    python3 scripts/generate_responsive_images.py [--avif] [--ssim[=TARGET]]
+"""
+import json
 import os
 import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import image_meta
+from file_io import file_sha256, write_json
+
+try:
+    import encode_quality
+except ImportError:  # NumPy missing: only fixed-quality encoding is available
+    encode_quality = None
 
 ROOT_DIR = "."
 # We want to scan images folder, and spring/images
@@ -7,8 +45,14 @@ SEARCH_DIRS = [
     os.path.join(ROOT_DIR, "images"),
     os.path.join(ROOT_DIR, "spring", "images")
 ]
+MANIFEST_PATH = os.path.join(ROOT_DIR, ".cache", "responsive-variants.json")
 
 VARIANTS = [480, 800, 1200]
+CWEBP_ARGS = ['-q', '75']
+AVIF_ARGS = ['-c:v', 'libaom-av1', '-still-picture', '1', '-crf', '32', '-cpu-used', '6']
+# Keep an AVIF twin only when it saves at least this fraction over the WebP
+AVIF_MIN_SAVING = 0.10
+MAX_JOBS = os.cpu_count() or 1
 
 # Non-content images that never need responsive variants
 EXCLUDE_BASENAMES = {"poster", "logo", "qr-code", "milano-sensual-congress-logo-preview"}
@@ -17,81 +61,300 @@ EXCLUDE_BASENAMES = {"poster", "logo", "qr-code", "milano-sensual-congress-logo-
 def source_width(path):
     """Return the pixel width of an image (0 if it cannot be read)."""
     try:
-        out = subprocess.check_output([
-            "ffprobe", "-v", "error", "-show_entries", "stream=width",
-            "-of", "csv=p=0", path
-        ], stderr=subprocess.DEVNULL)
-        return int(out.strip().splitlines()[0])
-    except Exception:
+        return image_meta.dims(path)[0]
+    except (OSError, ValueError):
         return 0
 
-def generate_variants():
-    count = 0
-    skipped = 0
-    errors = 0
 
-    print("Starting responsive image generation...")
-    
+def load_manifest():
+    try:
+        with open(MANIFEST_PATH, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(manifest):
+    write_json(MANIFEST_PATH, manifest, indent=1, sort_keys=True)
+
+
+def find_sources():
+    """Every content .webp under SEARCH_DIRS (variants and exclusions skipped)."""
+    sources = []
     for search_dir in SEARCH_DIRS:
         if not os.path.exists(search_dir):
             continue
-            
+
         print(f"Scanning directory: {search_dir}")
 
         for root, dirs, files in os.walk(search_dir):
-            for file in files:
+            dirs.sort()
+            for file in sorted(files):
                 if not file.lower().endswith(".webp"):
                     continue
-                
+
                 # Skip existing variants so we don't recurse on foo_480w_480w.webp
                 if any(f"_{w}w.webp" in file for w in VARIANTS):
                     continue
 
-                src_path = os.path.join(root, file)
                 base_name, _ = os.path.splitext(file)
-
                 if base_name in EXCLUDE_BASENAMES:
                     continue
+                sources.append(os.path.join(root, file))
+    return sources
+
+
+def ladder(src_path):
+    """{width: variant_path} for every rung below the source width."""
+    src_w = source_width(src_path)
+    base_name, _ = os.path.splitext(src_path)
+    # Never upscale: skip ladder rungs at or above the source width
+    return {width: f"{base_name}_{width}w.webp" for width in VARIANTS
+            if not (src_w and width >= src_w)}
+
+
+def webp_settings(target):
+    return f'ssim>={target}' if target else ' '.join(CWEBP_ARGS)
+
+
+def encode(src_path, width, variant_path, target=None):
+    """Encode one rung into a temp file, then rename it into place.
+
+    With an SSIM target the quality is searched (or read from the cache)
+    first. Returns (seconds, cwebp quality args) for the job. Raises
+    FileNotFoundError when cwebp is missing and CalledProcessError when it
+    fails.
+    """
+    start = time.perf_counter()
+    args = CWEBP_ARGS
+    if target:
+        args = ['-q', str(encode_quality.find_quality(src_path, width, target))]
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(variant_path),
+                               prefix='.', suffix='.webp.tmp')
+    os.close(fd)
+    try:
+        # cwebp -resize width 0 input -o output
+        # 0 height means maintain aspect ratio
+        subprocess.check_call(
+            ['cwebp', *args, '-resize', str(width), '0', src_path, '-o', tmp],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        os.chmod(tmp, 0o644)  # mkstemp creates 0600
+        os.replace(tmp, variant_path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return time.perf_counter() - start, args
+
+
+def avif_twin(webp_path):
+    return os.path.splitext(webp_path)[0] + '.avif'
+
+
+def encode_avif(src_path, width, avif_path, webp_path):
+    """Encode one AVIF twin; keep it only if it beats the WebP at webp_path.
+
+    width None encodes at the source size. Returns (seconds, saving) where
+    saving is the fraction of bytes saved, or None if the twin was dropped.
+    """
+    start = time.perf_counter()
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(avif_path),
+                               prefix='.', suffix='.avif.tmp')
+    os.close(fd)
+    scale = ['-vf', f'scale={width}:-2'] if width else []
+    try:
+        subprocess.check_call(
+            ['ffmpeg', '-y', '-v', 'error', '-i', src_path, *scale, *AVIF_ARGS,
+             '-f', 'avif', tmp],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        saving = 1 - os.path.getsize(tmp) / os.path.getsize(webp_path)
+        if saving < AVIF_MIN_SAVING:
+            os.unlink(tmp)
+            if os.path.exists(avif_path):
+                os.unlink(avif_path)  # a stale twin must not outlive its WebP
+            return time.perf_counter() - start, None
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, avif_path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    return time.perf_counter() - start, saving
+
+
+def plan_avif_jobs(sources, manifest):
+    """Return [(src, width, avif, webp)] twins still to try (width None = full size).
+
+    Run after the WebP jobs so every twin has a WebP to be compared with.
+    Twins tried for the current source hash and settings, kept or rejected,
+    are not tried again.
+    """
+    jobs = []
+    settings = ' '.join(AVIF_ARGS)
+    for src_path in sources:
+        entry = manifest[os.path.relpath(src_path, ROOT_DIR)]
+        if entry.get('avif_settings') != settings or entry.get('avif_sha256') != entry['sha256']:
+            entry['avif'] = {}
+            entry['avif_settings'] = settings
+            entry['avif_sha256'] = entry['sha256']
+        rungs = [(width, os.path.join(ROOT_DIR, path))
+                 for width, path in entry['variants'].items()] + [('full', src_path)]
+        for key, webp_path in rungs:
+            avif_path = avif_twin(webp_path)
+            tried = entry['avif'].get(key, False)
+            if tried is None or (tried and os.path.exists(avif_path)):
+                continue
+            width = None if key == 'full' else int(key)
+            jobs.append((src_path, width, avif_path, webp_path))
+    return jobs
+
+
+def drop_avif_twins(src_path, entry):
+    """Delete the AVIF twins of a source and its rungs and forget them."""
+    recorded = [os.path.join(ROOT_DIR, path) for path in entry.get('variants', {}).values()]
+    for webp_path in {src_path, *ladder(src_path).values(), *recorded}:
+        avif_path = avif_twin(webp_path)
+        if os.path.exists(avif_path):
+            os.unlink(avif_path)
+    entry['avif'] = {}
+    entry.pop('avif_sha256', None)
+
+
+def plan_jobs(sources, manifest, target=None):
+    """Return ([(src, width, variant)] to encode, skipped count, adopted count).
+
+    A rung is skipped when its file exists and either the manifest records
+    it for the source's current hash and settings, or the source has no
+    manifest entry yet (adopted). Manifest entries are updated in place to
+    list only the rungs that are current. When a source or the settings
+    change, its AVIF twins are deleted too, with or without --avif:
+    apply_responsive_images.py serves any twin that exists.
+    """
+    jobs, skipped, adopted = [], 0, 0
+    settings = webp_settings(target)
+    for src_path in sources:
+        key = os.path.relpath(src_path, ROOT_DIR)
+        sha = file_sha256(src_path)
+        entry = manifest.get(key)
+        if entry is None:
+            done = None  # adopt whatever is already on disk
+        elif entry['sha256'] == sha and entry['settings'] == settings:
+            done = entry['variants']
+        else:
+            done = {}  # source or settings changed: redo the whole ladder
+            drop_avif_twins(src_path, entry)
+        variants = {}
+        for width, variant_path in ladder(src_path).items():
+            if os.path.exists(variant_path) and (done is None or str(width) in done):
+                variants[str(width)] = os.path.relpath(variant_path, ROOT_DIR)
+                skipped += 1
+            else:
+                jobs.append((src_path, width, variant_path))
+        if done is None and variants:
+            adopted += 1
+        manifest.setdefault(key, {}).update(
+            sha256=sha, settings=settings, variants=variants)
+    return jobs, skipped, adopted
+
+
+def generate_variants():
+    count = 0
+    errors = 0
+
+    target = None
+    if any(arg.startswith('--ssim') for arg in sys.argv[1:]):
+        if encode_quality is None:
+            print("Error: --ssim needs NumPy (pip install numpy).")
+            return
+        target = encode_quality.target_from_argv(sys.argv[1:])
+
+    print("Starting responsive image generation...")
+    started = time.perf_counter()
+    sources = find_sources()
+    # Read every source's dimensions up front, in parallel (cached on disk)
+    image_meta.warm(sources)
+    manifest = load_manifest()
+    jobs, skipped, adopted = plan_jobs(sources, manifest, target)
+    image_meta.save()
+    print(f"{len(jobs)} variant(s) to encode with up to {MAX_JOBS} parallel job(s)")
+
+    timings = []
+    with ThreadPoolExecutor(max_workers=MAX_JOBS) as pool:
+        futures = {pool.submit(encode, *job, target): job for job in jobs}
+        for future in as_completed(futures):
+            src_path, width, variant_path = futures[future]
+            variant_name = os.path.basename(variant_path)
+            try:
+                seconds, args = future.result()
+            except FileNotFoundError:
+                print("Error: cwebp not found.")
+                for f in futures:
+                    f.cancel()
+                errors += 1
+                break
+            except subprocess.CalledProcessError as e:
+                # Some images might fail if dimension is too small?
+                print(f"Error generating {variant_name}: {e}")
+                errors += 1
+                continue
+            print(f"Generated: {variant_name} ({' '.join(args)}, {seconds:.2f}s)")
+            # Only finished rungs are recorded; failed ones are retried next run
+            manifest[os.path.relpath(src_path, ROOT_DIR)]['variants'][str(width)] = \
+                os.path.relpath(variant_path, ROOT_DIR)
+            timings.append((seconds, variant_name))
+            count += 1
+
+    avif_kept = avif_dropped = 0
+    if '--avif' in sys.argv[1:]:
+        avif_jobs = plan_avif_jobs(sources, manifest)
+        print(f"{len(avif_jobs)} AVIF twin(s) to try")
+        with ThreadPoolExecutor(max_workers=MAX_JOBS) as pool:
+            futures = {pool.submit(encode_avif, *job): job for job in avif_jobs}
+            for future in as_completed(futures):
+                src_path, width, avif_path, webp_path = futures[future]
+                avif_name = os.path.basename(avif_path)
+                try:
+                    seconds, saving = future.result()
+                except FileNotFoundError:
+                    print("Error: ffmpeg not found.")
+                    for f in futures:
+                        f.cancel()
+                    errors += 1
+                    break
+                except subprocess.CalledProcessError as e:
+                    print(f"Error generating {avif_name}: {e}")
+                    errors += 1
+                    continue
+                entry = manifest[os.path.relpath(src_path, ROOT_DIR)]
+                key = str(width) if width else 'full'
+                if saving is None:
+                    print(f"Dropped: {avif_name} (not {AVIF_MIN_SAVING:.0%} smaller than WebP, {seconds:.2f}s)")
+                    entry['avif'][key] = None
+                    avif_dropped += 1
+                else:
+                    print(f"Generated: {avif_name} (-{saving:.0%} vs WebP, {seconds:.2f}s)")
+                    entry['avif'][key] = os.path.relpath(avif_path, ROOT_DIR)
+                    timings.append((seconds, avif_name))
+                    avif_kept += 1
+    save_manifest(manifest)
+    if target:
+        encode_quality.save()
 
-                src_w = source_width(src_path)
-
-                for width in VARIANTS:
-                    # Never upscale: skip ladder rungs at or above the source width
-                    if src_w and width >= src_w:
-                        continue
-                    variant_name = f"{base_name}_{width}w.webp"
-                    variant_path = os.path.join(root, variant_name)
-                    
-                    if os.path.exists(variant_path):
-                        skipped += 1
-                        continue
-                    
-                    # cwebp -resize width 0 input -o output
-                    # 0 height means maintain aspect ratio
-                    
-                    try:
-                        subprocess.check_call([
-                            'cwebp', 
-                            '-q', '75',
-                            '-resize', str(width), '0',
-                            src_path, 
-                            '-o', variant_path
-                        ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-                        print(f"Generated: {variant_name}")
-                        count += 1
-                    except FileNotFoundError:
-                        print("Error: cwebp not found.")
-                        return
-                    except subprocess.CalledProcessError as e:
-                        # Some images might fail if dimension is too small?
-                        print(f"Error generating {variant_name}: {e}")
-                        errors += 1
-    
     print("-" * 50)
     print(f"Generation Complete.")
     print(f"Created: {count}")
     print(f"Skipped: {skipped}")
+    if adopted:
+        print(f"Adopted: {adopted} source(s) with pre-existing variants")
+    if avif_kept or avif_dropped:
+        print(f"AVIF twins kept: {avif_kept}, dropped: {avif_dropped}")
     print(f"Errors: {errors}")
+    if timings:
+        timings.sort(reverse=True)
+        print(f"Encode time: {sum(t for t, _ in timings):.2f}s across jobs, "
+              f"{time.perf_counter() - started:.2f}s wall")
+        for seconds, variant_name in timings[:5]:
+            print(f"  {seconds:6.2f}s  {variant_name}")
+
 
 if __name__ == "__main__":
     generate_variants()
@@ -1,49 +1,81 @@
+"""Generate sitemap.xml from every indexable page.
+
+    python3 scripts/generate_sitemap.py                 # single sitemap.xml
+    python3 scripts/generate_sitemap.py --index [--gzip]
+
+--index writes per-section shards (sitemap-pages.xml, sitemap-news.xml,
+sitemap-images.xml) plus a sitemap_index.xml pointing at them; --gzip
+pre-compresses the shards (.xml.gz). Either way the XML is streamed to disk
+and a file is only replaced when its content changed.
+"""
 import os
-import re
+import sys
+import contextlib
 import datetime
+import filecmp
+import gzip
+import io
 import subprocess
-from urllib.parse import quote, urljoin
-try:
-    from bs4 import BeautifulSoup
-    HAS_BS4 = True
-except ImportError:
-    HAS_BS4 = False
-    
+import tempfile
+
+from page_corpus import get_corpus
+
 ROOT_DIR = "."
 DOMAIN = 'https://milanosensualcongress.com'
-IGNORED_DIRS = {
-    '.git', '.claude', '.agent', '.agents', '.github',
-    'node_modules', 'scripts', '__pycache__'
-}
+URLSET_ATTRS = 'xmlns="http://www.sitemaps.org/schemas/sitemap/0.9" xmlns:xhtml="http://www.w3.org/1999/xhtml" xmlns:image="http://www.google.com/schemas/sitemap-image/1.1"'
+INDEX_ATTRS = 'xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"'
+SHARDS = ('pages', 'news', 'images')
 
-def is_noindex(filepath):
-    """Checks if a file has <meta name="robots" content="noindex...">"""
+def is_noindex(page):
+    """Checks if a page has <meta name="robots" content="noindex...">"""
+    return 'noindex' in (page.meta('robots') or '').lower()
+
+_lastmod_index = None
+
+def build_lastmod_index():
+    """Map repo-relative path -> newest commit date (ISO 8601), plus the set
+    of paths with uncommitted changes, from one `git log` and one `git status`
+    instead of two git processes per page."""
+    latest, dirty = {}, set()
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            content = f.read()
-        if re.search(r'<meta\s+name=["\']robots["\']\s+content=["\'].*?noindex.*?["\']', content, re.IGNORECASE):
-            return True
+        status = subprocess.run(
+            ['git', '-c', 'core.quotePath=false', 'status', '--porcelain',
+             '--untracked-files=all'],
+            capture_output=True, text=True).stdout
+        for line in status.splitlines():
+            path = line[3:]
+            if ' -> ' in path:  # rename: "old -> new"
+                path = path.split(' -> ', 1)[1]
+            dirty.add(path)
+
+        # Newest commit first, so the first date seen for a path is its lastmod.
+        # The \x00 prefix tells date lines apart from file names.
+        log = subprocess.run(
+            ['git', '-c', 'core.quotePath=false', 'log', '--name-only',
+             '--format=%x00%cI'],
+            capture_output=True, text=True).stdout
+        date = None
+        for line in log.splitlines():
+            if line.startswith('\x00'):
+                date = line[1:]
+            elif line and line not in latest:
+                latest[line] = date
     except Exception:
-        return False
-    return False
+        pass
+    return latest, dirty
 
 def get_lastmod(filepath):
     """Truthful lastmod: newest git commit touching the file (ISO 8601 with
     timezone). Files with uncommitted changes are stamped now. Never hand-edit
     lastmod values — search engines learn to distrust sitemaps that lie.
     NOTE: CI must clone with full history (fetch-depth: 0) or dates collapse."""
-    try:
-        dirty = subprocess.run(
-            ['git', 'status', '--porcelain', '--', filepath],
-            capture_output=True, text=True).stdout.strip()
-        if not dirty:
-            out = subprocess.run(
-                ['git', 'log', '-1', '--format=%cI', '--', filepath],
-                capture_output=True, text=True).stdout.strip()
-            if out:
-                return out
-    except Exception:
-        pass
+    global _lastmod_index
+    if _lastmod_index is None:
+        _lastmod_index = build_lastmod_index()
+    latest, dirty = _lastmod_index
+    rel_path = os.path.relpath(filepath, ROOT_DIR).replace(os.sep, '/')
+    if rel_path not in dirty and latest.get(rel_path):
+        return latest[rel_path]
     return datetime.datetime.now().astimezone().replace(microsecond=0).isoformat()
 
 def get_url_path(filepath):
@@ -64,132 +96,94 @@ def get_url_path(filepath):
     
     return '/' + rel_path
 
-def get_page_images(filepath):
-    """Extracts images from an HTML file for sitemap."""
+def get_page_images(page):
+    """Extracts images from a page for sitemap."""
     images = []
-    if not HAS_BS4:
-        return images
-        
-    try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            soup = BeautifulSoup(f, 'html.parser')
-            
-        seen_src = set()
-        
-        for img in soup.find_all('img'):
-            src = img.get('src')
-            if not src:
-                continue
-                
-            # Skip externals
-            if src.startswith(('http', '//', 'data:', 'blob:')):
-                continue
-                
-            # Logic for absolute URL
-            # 1. Resolve to file system absolute
-            # 2. Convert to domain absolute
-            
-            # Simple handling for known structures
-            img_url = ""
-            clean_src = src.split('?')[0]
-            
-            # Resolve relative ../
-            # file: spring/index.html, src: ../images/promo.webp
-            # resolved: images/promo.webp
-            # url: domain/images/promo.webp
-            
-            file_dir = os.path.dirname(filepath)
-            rel_file_dir = os.path.relpath(file_dir, ROOT_DIR)
+    seen_src = set()
+
+    for img in page.imgs:
+        src = img.get('src')
+        if not src:
+            continue
             
-            if clean_src.startswith('/'):
-                 # explicit root relative
-                 img_path_rel = clean_src.lstrip('/')
-            else:
-                 # relative
-                 # os.path.join base logic
-                 combined = os.path.join(rel_file_dir, clean_src)
-                 img_path_rel = os.path.normpath(combined)
+        # Skip externals
+        if src.startswith(('http', '//', 'data:', 'blob:')):
+            continue
             
-            # Construct URL
-            # Ensure forward slashes
-            img_path_rel = img_path_rel.replace(os.sep, '/')
-            img_url = f"{DOMAIN}/{img_path_rel}"
+        # Logic for absolute URL
+        # 1. Resolve to file system absolute
+        # 2. Convert to domain absolute
+        
+        # Simple handling for known structures
+        img_url = ""
+        clean_src = src.split('?')[0]
+        
+        # Resolve relative ../
+        # file: spring/index.html, src: ../images/promo.webp
+        # resolved: images/promo.webp
+        # url: domain/images/promo.webp
+        
+        rel_file_dir = os.path.dirname(page.path)
+        
+        if clean_src.startswith('/'):
+             # explicit root relative
+             img_path_rel = clean_src.lstrip('/')
+        else:
+             # relative
+             # os.path.join base logic
+             combined = os.path.join(rel_file_dir, clean_src)
+             img_path_rel = os.path.normpath(combined)
+        
+        # Construct URL
+        # Ensure forward slashes
+        img_path_rel = img_path_rel.replace(os.sep, '/')
+        img_url = f"{DOMAIN}/{img_path_rel}"
 
-            if img_url in seen_src:
-                continue
-                
-            img_data = {
-                'loc': img_url
-            }
+        if img_url in seen_src:
+            continue
             
-            alt = img.get('alt')
-            if alt:
-                img_data['title'] = alt
-                
-            images.append(img_data)
-            seen_src.add(img_url)
+        img_data = {
+            'loc': img_url
+        }
+        
+        alt = img.get('alt')
+        if alt:
+            img_data['title'] = alt
             
-    except Exception as e:
-        # print(f"Error parsing images for {filepath}: {e}")
-        pass
+        images.append(img_data)
+        seen_src.add(img_url)
         
     return images
 
-def get_hreflang_links(filepath):
+def get_hreflang_links(page):
     """Read explicit hreflang URLs from the page head.
 
     Translated pages often use different slugs, so filesystem-name matching is
     not sufficient to pair English and Italian URLs in the sitemap.
     """
     links = {}
-    try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            content = f.read()
-
-        if HAS_BS4:
-            soup = BeautifulSoup(content, 'html.parser')
-            for link in soup.find_all('link', hreflang=True, href=True):
-                rel = link.get('rel', [])
-                if 'alternate' not in rel:
-                    continue
-                lang = link.get('hreflang', '').lower()
-                href = link.get('href', '').strip()
-                if lang in {'en', 'it', 'x-default'} and href.startswith(DOMAIN):
-                    links[lang] = href
-        else:
-            pattern = re.compile(
-                r'<link\s+[^>]*rel=["\']alternate["\'][^>]*'
-                r'hreflang=["\'](en|it|x-default)["\'][^>]*'
-                r'href=["\']([^"\']+)["\']',
-                re.IGNORECASE
-            )
-            for lang, href in pattern.findall(content):
-                if href.startswith(DOMAIN):
-                    links[lang.lower()] = href
-    except Exception:
-        pass
+    for link in page.links:
+        if 'alternate' not in (link.get('rel') or '').split():
+            continue
+        lang = (link.get('hreflang') or '').lower()
+        href = (link.get('href') or '').strip()
+        if lang in {'en', 'it', 'x-default'} and href.startswith(DOMAIN):
+            links[lang] = href
     return links
 
-def generate_sitemap():
-    print("Generating sitemap.xml...")
-    
-    all_files = []
-    for root, dirs, files in os.walk(ROOT_DIR):
-        # Prune development-only directories before os.walk descends into them.
-        # Hidden worktrees must never become public sitemap URLs.
-        dirs[:] = [directory for directory in dirs if directory not in IGNORED_DIRS]
-        
-        for file in files:
-            if file.endswith('.html'):
-                filepath = os.path.join(root, file)
-                if not is_noindex(filepath):
-                    all_files.append(filepath)
+def iter_url_entries():
+    """Yield one dict per sitemap URL, in sitemap order, without holding the
+    rendered XML: {section, loc, lastmod, priority, alternates, images}."""
+    # One shared parse per page (robots meta, hreflangs and <img> together).
+    # The corpus prunes development-only directories (page_corpus.IGNORED_DIRS):
+    # hidden worktrees must never become public sitemap URLs.
+    all_pages = [page for page in get_corpus(ROOT_DIR) if not is_noindex(page)]
 
-    # Map: key -> {lang: filepath}
+    # Map: key -> {lang: page}
     page_map = {}
     
-    for filepath in all_files:
-        rel_path = os.path.relpath(filepath, ROOT_DIR).replace(os.sep, '/')
+    for page in all_pages:
+        rel_path = page.path.replace(os.sep, '/')
         
         if rel_path.startswith('it/'):
             key = rel_path[3:] 
@@ -201,19 +195,17 @@ def generate_sitemap():
         if key not in page_map:
             page_map[key] = {}
         
-        page_map[key][lang] = filepath
+        page_map[key][lang] = page
 
-    xml_output = '<?xml version="1.0" encoding="UTF-8"?>\n'
-    xml_output += '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9" xmlns:xhtml="http://www.w3.org/1999/xhtml" xmlns:image="http://www.google.com/schemas/sitemap-image/1.1">\n'
-    
     # Sort for stability
     sorted_keys = sorted(page_map.keys())
     
     for key in sorted_keys:
         variants = page_map[key]
-        for lang, filepath in variants.items():
-            url = DOMAIN + get_url_path(filepath)
-            lastmod = get_lastmod(filepath)
+        for lang in ('en', 'it'):
+            if lang not in variants:
+                continue
+            page = variants[lang]
             
             # Priority tiers: 1.0 home / 0.8 sections / 0.6 leaf pages
             if key in ['index.html', 'index']:
@@ -223,48 +215,161 @@ def generate_sitemap():
             else:
                 priority = '0.8'
                 
-            xml_output += '  <url>\n'
-            xml_output += f'    <loc>{url}</loc>\n'
-            xml_output += f'    <lastmod>{lastmod}</lastmod>\n'
-            xml_output += f'    <priority>{priority}</priority>\n'
-            
             # Prefer the page's explicit hreflang declarations. This preserves
             # language pairing when translated pages use localized slugs.
-            explicit_hreflangs = get_hreflang_links(filepath)
+            alternates = []
+            explicit_hreflangs = get_hreflang_links(page)
             if explicit_hreflangs:
                 for hreflang in ('en', 'x-default', 'it'):
                     href = explicit_hreflangs.get(hreflang)
                     if href:
-                        xml_output += f'    <xhtml:link rel="alternate" hreflang="{hreflang}" href="{href}" />\n'
+                        alternates.append((hreflang, href))
             else:
                 if 'en' in variants:
-                    en_url = DOMAIN + get_url_path(variants['en'])
-                    xml_output += f'    <xhtml:link rel="alternate" hreflang="en" href="{en_url}" />\n'
-                    xml_output += f'    <xhtml:link rel="alternate" hreflang="x-default" href="{en_url}" />\n'
+                    en_url = DOMAIN + get_url_path(variants['en'].path)
+                    alternates.append(('en', en_url))
+                    alternates.append(('x-default', en_url))
 
                 if 'it' in variants:
-                    it_url = DOMAIN + get_url_path(variants['it'])
-                    xml_output += f'    <xhtml:link rel="alternate" hreflang="it" href="{it_url}" />\n'
-                
+                    it_url = DOMAIN + get_url_path(variants['it'].path)
+                    alternates.append(('it', it_url))
+
+            yield {
+                'section': 'news' if key.startswith('news/') else 'pages',
+                'loc': DOMAIN + get_url_path(page.path),
+                'lastmod': get_lastmod(page.path),
+                'priority': priority,
+                'alternates': alternates,
+                'images': get_page_images(page),
+            }
+
+def xml_escape(text):
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('"', '&quot;').replace("'", "&apos;")
+
+def newest(a, b):
+    """The later of two ISO 8601 timestamps (either may be None)."""
+    if a is None or b is None:
+        return a or b
+    return max(a, b, key=datetime.datetime.fromisoformat)
+
+class SitemapWriter:
+    """Streams XML to a temp file next to `path`, then swaps it in atomically.
+
+    Nothing is accumulated in memory, so memory stays flat however many URLs
+    are written. With gzip_output the file is pre-compressed (path + '.gz',
+    deterministic: no timestamp in the gzip header). An unchanged result
+    leaves the existing file, and its mtime, untouched so crawlers and
+    conditional requests only see shards that really changed.
+    """
+
+    def __init__(self, path, root='urlset', attrs=URLSET_ATTRS, gzip_output=False):
+        self.path = path + '.gz' if gzip_output else path
+        self.root = root
+        self.attrs = attrs
+        self.gzip_output = gzip_output
+        self.count = 0
+        self.lastmod = None  # newest <lastmod> written
+
+    def __enter__(self):
+        fd, self.tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(self.path) or '.', suffix='.tmp')
+        self._raw = os.fdopen(fd, 'wb')
+        stream = self._raw
+        if self.gzip_output:
+            stream = gzip.GzipFile(filename='', mode='wb', fileobj=self._raw,
+                                   compresslevel=9, mtime=0)
+        self.out = io.TextIOWrapper(stream, encoding='utf-8')
+        self.out.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        self.out.write(f'<{self.root} {self.attrs}>\n')
+        return self
+
+    def write(self, text):
+        self.out.write(text)
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.out.write(f'</{self.root}>')
+            self.out.close()  # closes the gzip stream but not self._raw
+        finally:
+            self._raw.close()
+        if exc_type is not None:
+            os.unlink(self.tmp_path)
+            return False
+        if os.path.exists(self.path) and filecmp.cmp(self.tmp_path, self.path, shallow=False):
+            os.unlink(self.tmp_path)
+        else:
+            os.chmod(self.tmp_path, 0o644)  # mkstemp creates 0600
+            os.replace(self.tmp_path, self.path)
+        return False
+
+    def write_url(self, entry, with_meta=True, with_images=True):
+        self.count += 1
+        self.lastmod = newest(self.lastmod, entry['lastmod'])
+        self.write('  <url>\n')
+        self.write(f'    <loc>{entry["loc"]}</loc>\n')
+        self.write(f'    <lastmod>{entry["lastmod"]}</lastmod>\n')
+        if with_meta:
+            self.write(f'    <priority>{entry["priority"]}</priority>\n')
+            for hreflang, href in entry['alternates']:
+                self.write(f'    <xhtml:link rel="alternate" hreflang="{hreflang}" href="{href}" />\n')
+        if with_images:
             # Images
-            page_images = get_page_images(filepath)
-            for img in page_images:
-                xml_output += '    <image:image>\n'
-                xml_output += f'      <image:loc>{img["loc"]}</image:loc>\n'
+            for img in entry['images']:
+                self.write('    <image:image>\n')
+                self.write(f'      <image:loc>{img["loc"]}</image:loc>\n')
                 if 'title' in img:
-                    safe_title = img['title'].replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('"', '&quot;').replace("'", "&apos;")
-                    xml_output += f'      <image:title>{safe_title}</image:title>\n'
-                xml_output += '    </image:image>\n'
-                
-            xml_output += '  </url>\n'
+                    self.write(f'      <image:title>{xml_escape(img["title"])}</image:title>\n')
+                self.write('    </image:image>\n')
+        self.write('  </url>\n')
 
-    xml_output += '</urlset>'
-    
+def generate_sitemap():
+    print("Generating sitemap.xml...")
     output_path = os.path.join(ROOT_DIR, 'sitemap.xml')
-    with open(output_path, 'w', encoding='utf-8') as f:
-        f.write(xml_output)
+    with SitemapWriter(output_path) as writer:
+        for entry in iter_url_entries():
+            writer.write_url(entry)
     
-    print(f"Sitemap generated at {output_path} with {len(all_files)} URLs.")
+    print(f"Sitemap generated at {writer.path} with {writer.count} URLs.")
+
+def generate_sitemap_index(gzip_output=False):
+    """Write per-section shards (pages, news, images) and sitemap_index.xml.
+
+    Each shard is streamed to disk as entries are produced; the index lists
+    every non-empty shard with the newest <lastmod> of its URLs.
+    """
+    print("Generating sitemap_index.xml...")
+    writers = {}
+    with contextlib.ExitStack() as stack:
+        for name in SHARDS:
+            path = os.path.join(ROOT_DIR, f'sitemap-{name}.xml')
+            writers[name] = stack.enter_context(
+                SitemapWriter(path, gzip_output=gzip_output))
+        for entry in iter_url_entries():
+            writers[entry['section']].write_url(entry, with_images=False)
+            if entry['images']:
+                writers['images'].write_url(entry, with_meta=False)
+
+    shards = {}
+    for name, writer in writers.items():
+        if writer.count:
+            shards[name] = writer
+        else:
+            os.unlink(writer.path)
+
+    index_path = os.path.join(ROOT_DIR, 'sitemap_index.xml')
+    with SitemapWriter(index_path, 'sitemapindex', INDEX_ATTRS) as index:
+        for name, writer in shards.items():
+            index.write('  <sitemap>\n')
+            index.write(f'    <loc>{DOMAIN}/{os.path.basename(writer.path)}</loc>\n')
+            index.write(f'    <lastmod>{writer.lastmod}</lastmod>\n')
+            index.write('  </sitemap>\n')
+    for name, writer in shards.items():
+        print(f"  {os.path.basename(writer.path)}: {writer.count} URLs")
+    print(f"Sitemap index generated at {index_path} with {len(shards)} shards.")
 
 if __name__ == "__main__":
-    generate_sitemap()
+    if '--index' in sys.argv[1:]:
+        generate_sitemap_index(gzip_output='--gzip' in sys.argv[1:])
+    else:
+        generate_sitemap()
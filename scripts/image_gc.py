@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""Find duplicate and unreferenced images under images/ and optionally prune.
+
+generate_responsive_images.py never deletes a rung whose source changed or
+went away, and convert_images_tool.py leaves the original JPEG/PNG next to
+the .webp it made. This tool builds a reference index and reports on every
+file under images/:
+
+  unreferenced  no page, stylesheet, script, manifest, JSON-LD block, doc or
+                helper script names it. Each file is labelled as a source, a
+                ladder rung (_480w/_800w/_1200w), an AVIF twin, or a
+                converted original (a .jpg/.png whose .webp exists).
+                These are what --prune deletes, with one exception: a
+                source in use and its rungs and twins. A page may show the
+                source without a srcset, or only one rung of it (a CSS
+                background, say), but generate_responsive_images.py
+                encodes the ladder from the source, so those files are
+                listed separately and kept.
+  identical     byte-identical files (same SHA-256).
+  similar       perceptually near-identical sources: a 64-bit DCT hash
+                (pHash) of a 32x32 grey thumbnail, computed with NumPy on
+                pixels decoded by cwebp/dwebp, at most NEAR_DISTANCE bits
+                apart. Rungs and twins are left out, since they resemble
+                their source by design.
+
+The reference index covers every text file in the repo (HTML with its
+inline JSON-LD, CSS, JS, JSON, the web manifest, XML, TXT, Markdown,
+scripts/*.py). Build output and caches are skipped. A URL counts when it
+resolves to the file relative to the referring file or to the site root, or
+through the site's absolute https:// URLs. Only references that are
+written out literally are seen; if a script builds an image path at run
+time, list the file in KEEP.
+
+Hashes are cached in .cache/image-hashes.json, keyed by path, mtime and
+size. Without NumPy or cwebp/dwebp only identical files are found.
+
+Run from the repo root:
+    python3 scripts/image_gc.py            report only
+    python3 scripts/image_gc.py --prune    also delete the unreferenced files
+"""
+import json
+import os
+import posixpath
+import re
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import numpy as np
+    from encode_quality import luma, read_ppm
+except ImportError:  # NumPy missing: byte-identical duplicates only
+    np = None
+
+from file_io import file_sha256, write_json
+from page_corpus import ROOT_DIR
+
+IMAGES_DIR = 'images'
+CACHE_PATH = os.path.join(ROOT_DIR, '.cache', 'image-hashes.json')
+DOMAIN = 'https://milanosensualcongress.com'
+IMAGE_EXTS = ('.webp', '.avif', '.jpg', '.jpeg', '.png', '.gif', '.svg', '.ico')
+REFERENCE_EXTS = ('.html', '.css', '.js', '.mjs', '.json', '.webmanifest', '.xml',
+                  '.txt', '.md', '.py')
+SKIP_DIRS = {'.git', '.cache', '_site', 'node_modules', '__pycache__'}
+# Files kept even when nothing names them (paths relative to the repo root)
+KEEP = {
+    # In generate_responsive_images.EXCLUDE_BASENAMES: made for use off the pages
+    'images/qr-code.png',
+    'images/qr-code.svg',
+}
+# Formats cwebp can read for the perceptual hash
+HASHABLE_EXTS = ('.webp', '.jpg', '.jpeg', '.png')
+HASH_SAMPLE = 32      # thumbnail side the DCT runs on
+HASH_SIZE = 8         # low-frequency block kept: HASH_SIZE**2 bits
+NEAR_DISTANCE = 6     # max differing bits for "similar"
+
+URL_RE = re.compile(r'''[^\s"'`()<>,;=\\]*\.(?:%s)\b''' %
+                    '|'.join(e[1:] for e in IMAGE_EXTS), re.I)
+VARIANT_RE = re.compile(r'_\d+w\.(?:webp|avif)$')
+
+
+def walk_files(root, exts):
+    """Repo-relative paths of the files under root with one of exts."""
+    out = []
+    for dirpath, dirs, files in os.walk(os.path.join(ROOT_DIR, root)):
+        dirs[:] = sorted(d for d in dirs if d not in SKIP_DIRS)
+        out += [os.path.relpath(os.path.join(dirpath, f), ROOT_DIR).replace(os.sep, '/')
+                for f in sorted(files) if f.lower().endswith(exts)]
+    return out
+
+
+def resolve(source, url):
+    """Repo-relative candidate paths a URL found in source may name."""
+    url = url.split('?', 1)[0].split('#', 1)[0]
+    if url.startswith(DOMAIN):
+        return [url[len(DOMAIN):].lstrip('/')]
+    if url.startswith(('http:', 'https:', '//', 'data:')):
+        return []
+    if url.startswith('/'):
+        return [url.lstrip('/')]
+    relative = posixpath.normpath(posixpath.join(posixpath.dirname(source), url))
+    # Scripts and docs name paths relative to the page or the root, not to themselves
+    rooted = posixpath.normpath(re.sub(r'^(?:\.\.?/)+', '', url))
+    return [relative, rooted]
+
+
+def reference_index(images):
+    """{image path: [files naming it]} for the given image paths."""
+    wanted = set(images)
+    index = {}
+    for source in walk_files('.', REFERENCE_EXTS):
+        with open(os.path.join(ROOT_DIR, source), encoding='utf-8', errors='replace') as f:
+            text = f.read()
+        for url in set(URL_RE.findall(text)):
+            for path in resolve(source, url):
+                if path in wanted and path != source:
+                    index.setdefault(path, set()).add(source)
+    return {path: sorted(sources) for path, sources in index.items()}
+
+
+def kind(path, images):
+    """What an image file is: 'rung', 'AVIF twin', 'converted original' or 'source'."""
+    stem, ext = os.path.splitext(path)
+    if VARIANT_RE.search(path):
+        return 'rung'
+    if ext == '.avif' and f'{stem}.webp' in images:
+        return 'AVIF twin'
+    if ext in ('.jpg', '.jpeg', '.png') and f'{stem}.webp' in images:
+        return 'converted original'
+    return 'source'
+
+
+def source_of(path):
+    """The full-size .webp a rung or AVIF twin was made from."""
+    return re.sub(r'(?:_\d+w)?\.avif$|_\d+w\.webp$', '.webp', path)
+
+
+def _dct_matrix(n):
+    k = np.arange(n)[:, None]
+    return np.cos(np.pi * (2 * np.arange(n)[None, :] + 1) * k / (2 * n))
+
+
+def phash(path):
+    """64-bit perceptual hash as a hex string: the low-frequency DCT
+    coefficients of a grey HASH_SAMPLE px square thumbnail, thresholded at
+    their median."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        thumb = os.path.join(tmp_dir, 'phash.webp')
+        subprocess.check_call(['cwebp', '-lossless', '-resize', str(HASH_SAMPLE), str(HASH_SAMPLE),
+                               path, '-o', thumb],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        ppm = subprocess.check_output(['dwebp', thumb, '-ppm', '-o', '-'],
+                                      stderr=subprocess.DEVNULL)
+    grey = luma(read_ppm(ppm))
+    dct = _dct_matrix(HASH_SAMPLE)
+    block = (dct @ grey @ dct.T)[:HASH_SIZE, :HASH_SIZE].flatten()
+    bits = block > np.median(block[1:])  # the DC term only measures brightness
+    return f'{int("".join("1" if b else "0" for b in bits), 2):016x}'
+
+
+def distance(a, b):
+    return bin(int(a, 16) ^ int(b, 16)).count('1')
+
+
+def load_cache():
+    try:
+        with open(CACHE_PATH, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(cache):
+    write_json(CACHE_PATH, cache, sort_keys=True)
+
+
+def fingerprints(images, perceptual):
+    """{path: {'sha256', 'phash' (or None)}}, from the cache where the file's
+    mtime and size still match; hashing runs on a thread pool."""
+    cache = load_cache()
+    warned = []
+
+    def entry(path):
+        st = os.stat(os.path.join(ROOT_DIR, path))
+        old = cache.get(path)
+        if old and old['mtime'] == st.st_mtime_ns and old['size'] == st.st_size \
+                and (old['phash'] is not None or not perceptual):
+            return path, old
+        new = {'mtime': st.st_mtime_ns, 'size': st.st_size,
+               'sha256': file_sha256(os.path.join(ROOT_DIR, path)), 'phash': None}
+        if perceptual and path.lower().endswith(HASHABLE_EXTS):
+            try:
+                new['phash'] = phash(os.path.join(ROOT_DIR, path))
+            except (OSError, subprocess.CalledProcessError) as e:
+                warned.append(f'{path}: no perceptual hash ({e})')
+        return path, new
+
+    with ThreadPoolExecutor() as pool:
+        result = dict(pool.map(entry, images))
+    for message in warned[:3]:
+        print(f'WARNING: {message}')
+    save_cache(result)
+    return result
+
+
+def identical_groups(prints):
+    """[[paths]] of byte-identical files, largest files first."""
+    by_sha = {}
+    for path, entry in prints.items():
+        by_sha.setdefault(entry['sha256'], []).append(path)
+    groups = [sorted(paths) for paths in by_sha.values() if len(paths) > 1]
+    return sorted(groups, key=lambda g: -prints[g[0]]['size'])
+
+
+def similar_pairs(prints, images):
+    """[(bits apart, a, b)] of perceptually near-identical sources that are
+    not byte-identical."""
+    sources = sorted(p for p, e in prints.items() if e['phash'] is not None
+                     and kind(p, images) in ('source', 'converted original'))
+    pairs = []
+    for i, a in enumerate(sources):
+        for b in sources[i + 1:]:
+            if prints[a]['sha256'] == prints[b]['sha256']:
+                continue
+            bits = distance(prints[a]['phash'], prints[b]['phash'])
+            if bits <= NEAR_DISTANCE:
+                pairs.append((bits, a, b))
+    return sorted(pairs)
+
+
+def kb(size):
+    return f'{size / 1024:7.1f} KB'
+
+
+def main():
+    prune = '--prune' in sys.argv
+    images = walk_files(IMAGES_DIR, IMAGE_EXTS)
+    index = reference_index(images)
+    perceptual = np is not None
+    if not perceptual:
+        print('WARNING: NumPy is not installed; skipping near-duplicate detection')
+    prints = fingerprints(images, perceptual)
+    sizes = {path: prints[path]['size'] for path in images}
+    print(f'{len(images)} images under {IMAGES_DIR}/, {kb(sum(sizes.values())).strip()}')
+
+    unused = [p for p in images if p not in index and p not in KEEP]
+    # A source shown only through one of its rungs is in use too
+    in_use = {source_of(p) for p in index}
+    regenerated = [p for p in unused if kind(p, images) in ('rung', 'AVIF twin', 'source')
+                   and source_of(p) in in_use]
+    orphans = [p for p in unused if p not in regenerated]
+    print(f'\nUnreferenced ({len(orphans)}, {kb(sum(sizes[p] for p in orphans)).strip()}):')
+    for path in orphans:
+        print(f'  {kb(sizes[path])}  {kind(path, images):<18}  {path}')
+    print(f'\nUnused sources and variants of images in use, kept ({len(regenerated)}, '
+          f'{kb(sum(sizes[p] for p in regenerated)).strip()}):')
+    for path in regenerated:
+        print(f'  {kb(sizes[path])}  {kind(path, images):<18}  {path}')
+
+    groups = identical_groups(prints)
+    print(f'\nByte-identical ({len(groups)} group(s)):')
+    for group in groups:
+        # Keep the most referenced copy; the others can point at it
+        keep = max(group, key=lambda p: (len(index.get(p, ())), -len(p)))
+        print(f'  {kb(sizes[keep])}  keep {keep}')
+        for path in group:
+            if path != keep:
+                print(f'  {"":10}  same {path} ({len(index.get(path, ()))} reference(s))')
+
+    if perceptual:
+        pairs = similar_pairs(prints, images)
+        print(f'\nSimilar (pHash within {NEAR_DISTANCE} bits, {len(pairs)} pair(s)):')
+        for bits, a, b in pairs:
+            print(f'  {bits:2} bit(s)  {a}  ~  {b}')
+
+    if prune and orphans:
+        for path in orphans:
+            os.remove(os.path.join(ROOT_DIR, path))
+        print(f'\nPruned {len(orphans)} file(s), {kb(sum(sizes[p] for p in orphans)).strip()}')
+    elif orphans:
+        print('\nRun with --prune to delete the unreferenced files.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""Shared image metadata: pixel dimensions of WebP / JPEG / PNG files.
+
+Dimensions are read straight from the file header (a few hundred bytes at
+most) instead of spawning ffprobe once per image. Results persist in
+.cache/image-meta.json (gitignored) keyed by path, mtime and size, so a warm
+run never opens an image at all; a cold run probes on a thread pool:
+
+    import image_meta
+    image_meta.warm(paths)          # optional: probe many files in parallel
+    w, h = image_meta.dims(path)    # ValueError if the header is unreadable
+    image_meta.save()               # persist new entries
+
+Run directly to probe every image under images/ and print a summary:
+    python3 scripts/image_meta.py
+"""
+import json
+import os
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from file_io import write_json
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_PATH = os.path.join(ROOT_DIR, '.cache', 'image-meta.json')
+IMAGE_EXTS = ('.webp', '.jpg', '.jpeg', '.png')
+
+# JPEG start-of-frame markers carry the dimensions (not DHT/JPG/DAC).
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7,
+                0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def _png_dims(f):
+    head = f.read(24)
+    if len(head) < 24 or head[12:16] != b'IHDR':
+        raise ValueError('PNG without IHDR')
+    return struct.unpack('>II', head[16:24])
+
+
+def _webp_dims(f):
+    head = f.read(30)
+    chunk = head[12:16]
+    if chunk == b'VP8 ' and head[23:26] == b'\x9d\x01\x2a':
+        w, h = struct.unpack('<HH', head[26:30])
+        return w & 0x3FFF, h & 0x3FFF
+    if chunk == b'VP8L' and head[20:21] == b'\x2f':
+        bits = int.from_bytes(head[21:25], 'little')
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b'VP8X':
+        return (int.from_bytes(head[24:27], 'little') + 1,
+                int.from_bytes(head[27:30], 'little') + 1)
+    raise ValueError(f'unsupported WebP chunk {chunk!r}')
+
+
+def _jpeg_dims(f):
+    f.read(2)  # SOI
+    while True:
+        byte = f.read(1)
+        while byte and byte != b'\xff':
+            byte = f.read(1)
+        while byte == b'\xff':
+            byte = f.read(1)  # fill bytes before the marker code
+        if not byte:
+            raise ValueError('JPEG without a frame header')
+        marker = byte[0]
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            continue  # standalone markers have no length field
+        length = struct.unpack('>H', f.read(2))[0]
+        if marker in _SOF_MARKERS:
+            h, w = struct.unpack('>xHH', f.read(5))
+            return w, h
+        f.seek(length - 2, os.SEEK_CUR)
+
+
+def probe(path):
+    """(width, height) read from the image header; ValueError if unknown."""
+    with open(path, 'rb') as f:
+        sig = f.read(12)
+        f.seek(0)
+        try:
+            if sig.startswith(b'\x89PNG\r\n\x1a\n'):
+                return tuple(_png_dims(f))
+            if sig[:4] == b'RIFF' and sig[8:12] == b'WEBP':
+                return _webp_dims(f)
+            if sig.startswith(b'\xff\xd8'):
+                return _jpeg_dims(f)
+        except struct.error:
+            raise ValueError(f'{path}: truncated image header')
+    raise ValueError(f'{path}: not a WebP, JPEG or PNG file')
+
+
+class ImageMetaCache:
+    """Dimensions per file, valid while the file's mtime and size match."""
+
+    def __init__(self, path=CACHE_PATH):
+        self.path = path
+        self.entries = {}
+        self.dirty = False
+        self._lock = threading.Lock()
+        try:
+            with open(path, encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    @staticmethod
+    def _key(path):
+        return os.path.relpath(os.path.abspath(path), ROOT_DIR)
+
+    def dims(self, path):
+        st = os.stat(path)
+        key = self._key(path)
+        entry = self.entries.get(key)
+        if entry and entry['mtime'] == st.st_mtime_ns and entry['size'] == st.st_size:
+            return entry['width'], entry['height']
+        w, h = probe(path)
+        with self._lock:
+            self.entries[key] = {'mtime': st.st_mtime_ns, 'size': st.st_size,
+                                 'width': w, 'height': h}
+            self.dirty = True
+        return w, h
+
+    def warm(self, paths):
+        """Probe every uncached path in parallel; unreadable files are skipped."""
+        def try_dims(path):
+            try:
+                self.dims(path)
+            except (OSError, ValueError):
+                pass
+        with ThreadPoolExecutor() as pool:
+            list(pool.map(try_dims, paths))
+
+    def save(self):
+        """Write the cache atomically (no-op when nothing new was probed)."""
+        if not self.dirty:
+            return
+        write_json(self.path, self.entries, sort_keys=True)
+        self.dirty = False
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Process-wide shared ImageMetaCache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ImageMetaCache()
+        return _cache
+
+
+def dims(path):
+    return get_cache().dims(path)
+
+
+def warm(paths):
+    get_cache().warm(paths)
+
+
+def save():
+    get_cache().save()
+
+
+def image_files(root):
+    """Every WebP/JPEG/PNG file under root."""
+    out = []
+    for dirpath, _dirs, files in os.walk(root):
+        out += [os.path.join(dirpath, f) for f in sorted(files)
+                if f.lower().endswith(IMAGE_EXTS)]
+    return out
+
+
+if __name__ == '__main__':
+    paths = image_files(os.path.join(ROOT_DIR, 'images'))
+    warm(paths)
+    save()
+    ok = sum(1 for p in paths if os.path.relpath(os.path.abspath(p), ROOT_DIR) in get_cache().entries)
+    print(f'{ok} of {len(paths)} images probed (cache: {CACHE_PATH})')
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""Low-quality image placeholders (LQIP) for lazily loaded images.
+
+Each placeholder is a PLACEHOLDER_WIDTH px wide WebP of the image (cwebp at
+PLACEHOLDER_QUALITY, a few hundred bytes) as a data: URI, plus its dominant
+colour. The colour is the most common colour bucket of that thumbnail,
+averaged, and is found with NumPy on the pixels `dwebp -ppm` decodes.
+apply_responsive_images.py paints both behind an <img> as its inline
+background:
+
+    style="background:#3b2a4a url(data:image/webp;base64,...) 50%/cover no-repeat"
+
+The browser scales the thumbnail up smoothly into a blurred preview, which
+the real image covers once it has loaded. The colour shows in the meantime.
+The CSP already allows data: in img-src.
+
+Placeholders are cached in .cache/placeholders.json (gitignored), keyed by
+path, mtime and size like image-meta.json, so each image is encoded once:
+
+    import image_placeholders
+    color, uri = image_placeholders.placeholder('images/hotel/pool.webp')
+    image_placeholders.save()
+
+Run directly to build the placeholders for images/artists and images/hotel
+and print their sizes:
+    python3 scripts/image_placeholders.py [image ...]
+"""
+import base64
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import image_meta
+from encode_quality import read_ppm
+from file_io import write_json
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_PATH = os.path.join(ROOT_DIR, '.cache', 'placeholders.json')
+# Gallery images that load lazily below the fold
+PLACEHOLDER_DIRS = ('images/artists/', 'images/hotel/')
+PLACEHOLDER_WIDTH = 16
+PLACEHOLDER_QUALITY = 20
+COLOR_BITS = 3  # per channel, for the dominant-colour histogram
+VARIANT_RE = re.compile(r'_\d+w\.webp$')
+
+
+def dominant_color(rgb):
+    """'#rrggbb': the mean of the pixels in the most populated colour bucket."""
+    pixels = rgb.reshape(-1, 3).astype(np.int64)
+    shift = 8 - COLOR_BITS
+    buckets = ((pixels[:, 0] >> shift) << (2 * COLOR_BITS)
+               | (pixels[:, 1] >> shift) << COLOR_BITS
+               | pixels[:, 2] >> shift)
+    top = np.bincount(buckets).argmax()
+    r, g, b = pixels[buckets == top].mean(axis=0).round().astype(int)
+    return f'#{r:02x}{g:02x}{b:02x}'
+
+
+def encode(path):
+    """(dominant colour, data: URI) of an image's thumbnail."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        thumb = os.path.join(tmp_dir, 'lqip.webp')
+        subprocess.check_call(['cwebp', '-q', str(PLACEHOLDER_QUALITY), '-m', '6',
+                               '-resize', str(PLACEHOLDER_WIDTH), '0', path, '-o', thumb],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        ppm = subprocess.check_output(['dwebp', thumb, '-ppm', '-o', '-'],
+                                      stderr=subprocess.DEVNULL)
+        with open(thumb, 'rb') as f:
+            data = f.read()
+    uri = 'data:image/webp;base64,' + base64.b64encode(data).decode('ascii')
+    return dominant_color(read_ppm(ppm)), uri
+
+
+class PlaceholderCache:
+    """Placeholder per file, valid while the file's mtime and size match."""
+
+    def __init__(self, path=CACHE_PATH):
+        self.path = path
+        self.entries = {}
+        self.dirty = False
+        self.failed = set()
+        self._lock = threading.Lock()
+        try:
+            with open(path, encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    @staticmethod
+    def _key(path):
+        return os.path.relpath(os.path.abspath(path), ROOT_DIR)
+
+    def placeholder(self, path):
+        """(colour, data: URI), or None when cwebp/dwebp cannot produce one."""
+        st = os.stat(path)
+        key = self._key(path)
+        entry = self.entries.get(key)
+        if entry and entry['mtime'] == st.st_mtime_ns and entry['size'] == st.st_size:
+            return entry['color'], entry['uri']
+        if key in self.failed:
+            return None
+        try:
+            color, uri = encode(path)
+        except (OSError, ValueError, subprocess.CalledProcessError):
+            with self._lock:
+                self.failed.add(key)
+            return None
+        with self._lock:
+            self.entries[key] = {'mtime': st.st_mtime_ns, 'size': st.st_size,
+                                 'color': color, 'uri': uri}
+            self.dirty = True
+        return color, uri
+
+    def warm(self, paths):
+        """Encode every uncached path in parallel."""
+        with ThreadPoolExecutor() as pool:
+            list(pool.map(self.placeholder, paths))
+
+    def save(self):
+        """Write the cache atomically (no-op when nothing new was encoded)."""
+        if not self.dirty:
+            return
+        write_json(self.path, self.entries, sort_keys=True)
+        self.dirty = False
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Process-wide shared PlaceholderCache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = PlaceholderCache()
+        return _cache
+
+
+def placeholder(path):
+    return get_cache().placeholder(path)
+
+
+def warm(paths):
+    get_cache().warm(paths)
+
+
+def save():
+    get_cache().save()
+
+
+def wants_placeholder(fs_path):
+    """True for the full-size sources of the gallery directories."""
+    return fs_path.startswith(PLACEHOLDER_DIRS)
+
+
+def style(color, uri):
+    """Inline background declaration painting the placeholder."""
+    return f'background:{color} url({uri}) 50%/cover no-repeat'
+
+
+def gallery_images():
+    """The images under PLACEHOLDER_DIRS that pages show (no ladder rungs)."""
+    out = []
+    for directory in PLACEHOLDER_DIRS:
+        out += [p for p in image_meta.image_files(os.path.join(ROOT_DIR, directory))
+                if p.endswith('.webp') and not VARIANT_RE.search(p)]
+    return out
+
+
+if __name__ == '__main__':
+    paths = [p for p in sys.argv[1:] if not p.startswith('--')] or gallery_images()
+    warm(paths)
+    save()
+    total = 0
+    for path in paths:
+        result = placeholder(path)
+        if result is None:
+            print(f'{"-":>6}  {path}: no placeholder (are cwebp and dwebp installed?)')
+            continue
+        total += len(result[1])
+        print(f'{len(result[1]):>6}  {result[0]}  {os.path.relpath(path, ROOT_DIR)}')
+    print(f'{total:,} bytes of data: URIs for {len(paths)} images (cache: {CACHE_PATH})')
@@ -1,8 +1,9 @@
 import os
 import re
+import sys
 
-ROOT_DIR = "."
-IT_DIR = os.path.join(ROOT_DIR, 'it')
+import rewrite_pipeline
+from page_corpus import get_corpus
 
 DOMAIN = "https://milanosensualcongress.com"
 
@@ -11,86 +12,89 @@ def get_corresponding_path(filename, lang):
     Returns the absolute URL for a given filename and language version.
     """
     base = os.path.basename(filename)
-    
+
     if lang == 'en':
         if base == 'index.html':
             return f"{DOMAIN}/"
         clean = base.replace('.html', '')
         return f"{DOMAIN}/{clean}"
-        
+
     elif lang == 'it':
         if base == 'index.html':
             return f"{DOMAIN}/it/"
         clean = base.replace('.html', '')
         return f"{DOMAIN}/it/{clean}"
-    
+
     return None
 
-def inject_hreflangs():
-    print("Starting Hreflang Injection...")
-    
-    en_files = {f for f in os.listdir(ROOT_DIR) if f.endswith('.html')}
-    it_files = {f for f in os.listdir(IT_DIR) if f.endswith('.html')}
-    
-    all_pages = en_files.union(it_files)
-    
-    files_changed = 0
-    
-    for page in all_pages:
-        has_en = page in en_files
-        has_it = page in it_files
-        
-        tags = []
-        
-        # 1. EN Link
-        if has_en:
-            url_en = get_corresponding_path(page, 'en')
-            tags.append(f'<link rel="alternate" hreflang="en" href="{url_en}" />')
-            tags.append(f'<link rel="alternate" hreflang="x-default" href="{url_en}" />')
-            
-        # 2. IT Link
-        if has_it:
-            url_it = get_corresponding_path(page, 'it')
-            tags.append(f'<link rel="alternate" hreflang="it" href="{url_it}" />')
-            
-        block = "\n  ".join(tags)
-        
-        if has_en:
-            path = os.path.join(ROOT_DIR, page)
-            if process_file(path, block):
-                files_changed += 1
-            
-        if has_it:
-            path = os.path.join(IT_DIR, page)
-            if process_file(path, block):
-                files_changed += 1
-
-    print(f"Finished. Updated {files_changed} files.")
-
-def process_file(filepath, new_block):
-    try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            content = f.read()
-    except Exception as e:
-        print(f"Error reading {filepath}: {e}")
-        return False
-    
-    content_clean = re.sub(r'\s*<link rel="alternate" hreflang="[^"]+" href="[^"]+" />', '', content)
-    
+def path_for_url(url):
+    """Page path of an absolute site URL (clean URL form), or None."""
+    if not url.startswith(DOMAIN + '/'):
+        return None
+    rel = url[len(DOMAIN) + 1:]
+    if rel in ('', 'it/'):
+        return rel.replace('/', os.sep) + 'index.html'
+    return rel.replace('/', os.sep) + '.html'
+
+def counterpart(page, lang):
+    """Path of page's version in lang ('en': root, 'it': it/): the page its
+    hreflang links already name (translated names such as program /
+    programma), else the file of the same name, else None."""
+    corpus = get_corpus()
+    folder = '' if lang == 'en' else 'it'
+    named = path_for_url(page.hreflangs.get(lang, ''))
+    if named and os.path.dirname(named) == folder and corpus.page(named) is not None:
+        return named
+    path = os.path.join(folder, os.path.basename(page.path))
+    return path if corpus.page(path) is not None else None
+
+def hreflang_links(en_path, it_path):
+    """{hreflang: href} of an EN / IT pair; either side may be None."""
+    links = {}
+    if en_path:
+        links['en'] = links['x-default'] = get_corresponding_path(en_path, 'en')
+    if it_path:
+        links['it'] = get_corresponding_path(it_path, 'it')
+    return links
+
+def hreflang_block(links):
+    return "\n  ".join(f'<link rel="alternate" hreflang="{lang}" href="{links[lang]}">'
+                        for lang in ('en', 'x-default', 'it') if lang in links)
+
+def inject(ctx, content):
+    """Pipeline hook: root and it/ pages get the hreflang set of their EN / IT
+    pair (noindex pages such as 404.html have no alternates to declare). A
+    page that already declares exactly that set is left as written."""
+    page = ctx.page
+    folder = os.path.dirname(ctx.path)
+    if folder not in ('', 'it') or 'noindex' in (page.meta('robots') or '').lower():
+        return content
+    en_path = ctx.path if folder == '' else counterpart(page, 'en')
+    it_path = ctx.path if folder == 'it' else counterpart(page, 'it')
+    links = hreflang_links(en_path, it_path)
+
+    # Existing links in either form, <link ...> or <link ... />
+    link_re = r'\s*<link rel="alternate" hreflang="([^"]+)" href="([^"]+)"\s*/?>'
+    existing = re.findall(link_re, content)
+    if len(existing) == len(links) and dict(existing) == links:
+        return content
+    content_clean = re.sub(link_re, '', content)
+    new_block = hreflang_block(links)
+
     # Ideally after <link rel="canonical" ...>
     if '<link rel="canonical"' in content_clean:
          pattern = r'(<link rel="canonical" href="[^"]+">)'
          replacement = r'\1\n  ' + new_block
-         new_content = re.sub(pattern, replacement, content_clean)
-    else:
-        # Insert before </head>
-        new_content = content_clean.replace('</head>', f'{new_block}\n</head>')
-        
-    if new_content != content:
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(new_content)
-        return True
-    return False
+         return re.sub(pattern, replacement, content_clean)
+    # Insert before </head>
+    return content_clean.replace('</head>', f'{new_block}\n</head>')
+
+TRANSFORM = rewrite_pipeline.Transform('hreflang', document=inject)
+
+def inject_hreflangs(dry_run=False):
+    print("Starting Hreflang Injection...")
+    changed, _notes = rewrite_pipeline.run([TRANSFORM], dry_run=dry_run)
+    print(f"Finished. {'Would update' if dry_run else 'Updated'} {len(changed)} files.")
 
 if __name__ == "__main__":
-    inject_hreflangs()
+    inject_hreflangs('--dry-run' in sys.argv)
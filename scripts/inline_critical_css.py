@@ -1,72 +1,225 @@
 #!/usr/bin/env python3
-"""Inline page-critical CSS into <style data-inline="..."> blocks.
+"""Inline each page's critical CSS and load the rest of its stylesheets async.
 
-Standalone art-directed pages (currently the solo dancer guides) inline their
-CSS instead of loading it via render-blocking <link> tags, which removes two
-round trips from the LCP critical chain on slow connections.
+For every page on the site (no hand-maintained list), the local stylesheets
+its head links with render-blocking <link rel="stylesheet"> are parsed
+(css_rules.py) and purged against the page:
 
-The inlined copy lives inside a marker tag:
+- the "used" subset keeps every rule whose selectors match something in the
+  page's markup or scripts (reported, per page);
+- the "critical" subset keeps only what matches the head plus the body up
+  to the end of the first <header> or <section> (navigation and hero),
+  i.e. what is on screen before the first scroll.
+
+The critical subset is inlined and the original stylesheets are switched to
+non-blocking loads, with a <noscript> fallback:
+
+    <style data-inline="critical">...</style>
+    <link rel="stylesheet" href="/css/tailwind.min.css?v=1" media="print" onload="this.media='all'" data-inline-async>
+    <noscript data-inline-async><link rel="stylesheet" href="/css/tailwind.min.css?v=1"></noscript>
+
+The full stylesheets stay shared files, so after the first page the rest of
+the CSS comes from the browser cache instead of being re-sent per page.
+
+Standalone art-directed pages (the solo dancer guides) instead inline whole
+files into marker tags, which are discovered automatically:
 
     <style data-inline="css/solo-congress-guide.css">...</style>
 
-IMPORTANT: after editing any CSS file listed below, re-run this script so the
-inlined copies stay in sync:
+IMPORTANT: after editing any CSS file or a page's above-the-fold markup,
+re-run this script so the inlined copies stay in sync:
 
-    python3 scripts/inline_critical_css.py
+    python3 scripts/inline_critical_css.py [--check]
 
-The script is idempotent and rewrites only the marked blocks.
+The script is idempotent: it rewrites only the blocks it manages, and a
+second run changes nothing. --check reports pages that are out of date
+without writing them (exit 1 if any); run_all_checks.py runs the same
+check on every page.
 """
 import os
 import re
 import sys
 
-ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-
-# Pages that carry inlined CSS. Each entry lists the CSS files in the order
-# their <style data-inline> blocks appear in the page head.
-PAGES = {
-    "news/bachata-congress-alone-solo-dancer-guide.html": [
-        "css/fonts.css",
-        "css/solo-congress-guide.css",
-    ],
-    "it/news/congresso-bachata-da-soli-guida-ballerini.html": [
-        "css/fonts.css",
-        "css/solo-congress-guide.css",
-    ],
-}
-
-
-def inline_page(page, css_files):
-    path = os.path.join(ROOT, page)
-    with open(path, encoding="utf-8") as f:
-        html = f.read()
-    changed = False
-    for css in css_files:
-        with open(os.path.join(ROOT, css), encoding="utf-8") as f:
+from css_rules import page_tokens, parse, purge, serialize
+from file_io import write_atomic
+from page_corpus import ROOT_DIR, get_corpus
+
+ROOT = ROOT_DIR
+
+# Marker blocks: whole-file inlines and the generated critical subset
+FILE_MARKER_RE = re.compile(r'(<style data-inline="([^"]+\.css)">).*?(</style>)', re.S)
+CRITICAL_RE = re.compile(r'[ \t]*<style data-inline="critical">.*?</style>\n?', re.S)
+ASYNC_NOSCRIPT_RE = re.compile(r'[ \t]*<noscript data-inline-async>.*?</noscript>\n?', re.S)
+LINK_RE = re.compile(r'[ \t]*<link\b[^>]*>\n?')
+HREF_RE = re.compile(r'\shref="([^"]+)"')
+# The above-the-fold part of a body ends with its first header or section
+FOLD_END_RE = re.compile(r'</(?:header|section)>', re.I)
+FOLD_FALLBACK_CHARS = 15000
+
+ASYNC_LINK = ('  <link rel="stylesheet" href="{href}" media="print" '
+              'onload="this.media=\'all\'" data-inline-async>\n')
+
+_stylesheets = {}
+
+
+def stylesheet(href):
+    """Parsed rules of a root-relative stylesheet URL (memoized)."""
+    path = href.split('?')[0].split('#')[0].lstrip('/')
+    if path not in _stylesheets:
+        with open(os.path.join(ROOT, path), encoding='utf-8') as f:
+            _stylesheets[path] = parse(f.read())
+    return _stylesheets[path]
+
+
+def is_local_stylesheet(tag):
+    rel = re.search(r'\srel="([^"]*)"', tag)
+    href = HREF_RE.search(tag)
+    return (rel is not None and 'stylesheet' in rel.group(1).split()
+            and href is not None and not href.group(1).startswith(('http', '//'))
+            and ' media=' not in tag and ' disabled' not in tag)
+
+
+def strip_managed(html):
+    """(html without the critical block, async links and noscript fallbacks,
+    [hrefs of the stylesheets they loaded], offset where they stood)."""
+    hrefs, offset = [], None
+    m = CRITICAL_RE.search(html)
+    if m:
+        offset = m.start()
+        html = html[:m.start()] + html[m.end():]
+    html = ASYNC_NOSCRIPT_RE.sub('', html)
+    head_end = html.find('</head>')
+    if head_end < 0:
+        return html, hrefs, offset
+
+    def drop_async(m):
+        nonlocal offset
+        tag = m.group(0)
+        if 'data-inline-async' not in tag:
+            return tag
+        hrefs.append(HREF_RE.search(tag).group(1))
+        offset = m.start() if offset is None else min(offset, m.start())
+        return ''
+    html = LINK_RE.sub(drop_async, html[:head_end]) + html[head_end:]
+    return html, hrefs, offset
+
+
+def blocking_stylesheets(html):
+    """(html without them, [hrefs], offset of the first) for the local
+    render-blocking stylesheet links in the head."""
+    hrefs, offset = [], None
+    head_end = html.find('</head>')
+    if head_end < 0:
+        return html, hrefs, offset
+
+    def drop(m):
+        nonlocal offset
+        if not is_local_stylesheet(m.group(0)):
+            return m.group(0)
+        hrefs.append(HREF_RE.search(m.group(0)).group(1))
+        if offset is None:
+            offset = m.start()
+        return ''
+
+    return LINK_RE.sub(drop, html[:head_end]) + html[head_end:], hrefs, offset
+
+
+def above_the_fold(html):
+    """Head plus the body up to the end of its first header or section."""
+    body = html.find('<body')
+    if body < 0:
+        return html
+    m = FOLD_END_RE.search(html, body)
+    return html[:m.end()] if m else html[:body + FOLD_FALLBACK_CHARS]
+
+
+def critical_css(html, hrefs):
+    """(critical css, used bytes, shipped bytes) for a page without managed blocks."""
+    fold = page_tokens(above_the_fold(html))
+    used = page_tokens(html)
+    critical, used_bytes, total_bytes = [], 0, 0
+    for href in hrefs:
+        rules = stylesheet(href)
+        total_bytes += len(serialize(rules))
+        used_bytes += len(serialize(purge(rules, used)))
+        critical.append(serialize(purge(rules, fold)))
+    return ''.join(critical), used_bytes, total_bytes
+
+
+def inline_critical(html, stylesheets=None):
+    """(new html, report line or None) for the critical-CSS mode.
+
+    stylesheets, if given, maps the page's list of stylesheet hrefs to the
+    list it should load instead (build_fontawesome_subset.py --per-page
+    swaps the icon stylesheet this way).
+    """
+    html, hrefs, offset = strip_managed(html)
+    if not hrefs:
+        html, hrefs, offset = blocking_stylesheets(html)
+    if stylesheets is not None:
+        hrefs = stylesheets(hrefs)
+        if offset is None:
+            offset = html.find('</head>')
+    if not hrefs:
+        return html, None
+    css, used_bytes, total_bytes = critical_css(html, hrefs)
+    block = (f'  <style data-inline="critical">\n{css}\n  </style>\n'
+             + ''.join(ASYNC_LINK.format(href=href) for href in hrefs)
+             + '  <noscript data-inline-async>'
+             + ''.join(f'<link rel="stylesheet" href="{href}">' for href in hrefs)
+             + '</noscript>\n')
+    report = (f'critical {len(css):>6} B, used {used_bytes:>6} B '
+              f'of {total_bytes:>6} B shipped')
+    return html[:offset] + block + html[offset:], report
+
+
+def inline_files(html):
+    """html with every <style data-inline="path.css"> block refreshed."""
+    def sub(m):
+        with open(os.path.join(ROOT, m.group(2)), encoding='utf-8') as f:
             content = f.read().strip()
         # Font URLs are root-absolute (/fonts/...), so no path rewriting needed.
-        pattern = re.compile(
-            r'(<style data-inline="%s">).*?(</style>)' % re.escape(css), re.S
-        )
-        replacement = r"\g<1>\n%s\n  \g<2>" % content
-        new_html, count = pattern.subn(replacement, html)
-        if count != 1:
-            print(f"ERROR: expected 1 marker for {css} in {page}, found {count}")
-            return False
-        if new_html != html:
-            changed = True
-            html = new_html
-    with open(path, "w", encoding="utf-8") as f:
-        f.write(html)
-    print(f"{page}: {'updated' if changed else 'already in sync'}")
-    return True
+        return f'{m.group(1)}\n{content}\n  {m.group(3)}'
+    return FILE_MARKER_RE.sub(sub, html)
+
+
+def refreshed(page):
+    """(the page with its inlined CSS up to date, report line or None)."""
+    return inline_critical(inline_files(page.html))
+
+
+def page_css_issues(page):
+    """Return [(page, message)] if the page's inlined CSS is out of date."""
+    if refreshed(page)[0] == page.html:
+        return []
+    return [(page.path, 'inlined CSS is out of date; run python3 scripts/inline_critical_css.py')]
+
+
+def refresh(check=False):
+    """Bring every page's inlined CSS up to date (or just report, with
+    check); returns the paths of the pages that were out of date."""
+    stale = []
+    for page in get_corpus(ROOT):
+        html, report = refreshed(page)
+        if html == page.html:
+            status = 'already in sync'
+        else:
+            stale.append(page.path)
+            status = 'out of date' if check else 'updated'
+            if not check:
+                write_atomic(page.abspath, html)
+                page.update(html)
+        if report or html != page.html:
+            print(f'{page.path}: {status}' + (f' ({report})' if report else ''))
+    verb = 'out of date' if check else 'updated'
+    print(f'{len(stale)} page(s) {verb}')
+    return stale
 
 
 def main():
-    ok = True
-    for page, css_files in PAGES.items():
-        ok = inline_page(page, css_files) and ok
-    sys.exit(0 if ok else 1)
+    check = '--check' in sys.argv
+    stale = refresh(check)
+    sys.exit(1 if check and stale else 0)
 
 
 if __name__ == "__main__":
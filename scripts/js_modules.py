@@ -0,0 +1,503 @@
+#!/usr/bin/env python3
+"""Minimal ES module model and statement-level tree shaking for vendor code.
+
+Tokenizes plain or minified JavaScript (strings, template literals with
+${...} nesting, regular expression literals, comments), splits an ES module
+into its top-level statements and reports its imports and exports:
+
+    from js_modules import Module
+    module = Module(open('vendor/three/three.module.min.js').read())
+    module.exports            # {exported name: local name or (source, name)}
+    module.dynamic_imports    # ['/vendor/three/three.module.min.js', ...]
+    text, needs = module.shake({'WebGLRenderer', 'Scene'})
+
+shake() keeps the declarations reachable from the requested exports plus
+every statement that is not a declaration (anything with a possible side
+effect), and returns the pruned module text with {source: names imported
+from it}, so the modules it imports can be shaken in turn. Declarations
+whose initializers have side effects are dropped when unreferenced, which
+is the contract bundlers rely on for packages marked "sideEffects": false
+(three.js is). Identifier references are over-approximated - every name
+token that is not a property access counts - so the result can keep more
+than strictly needed, never less.
+"""
+import re
+
+KEYWORDS = {
+    'await', 'break', 'case', 'catch', 'class', 'const', 'continue',
+    'debugger', 'default', 'delete', 'do', 'else', 'export', 'extends',
+    'false', 'finally', 'for', 'function', 'if', 'import', 'in',
+    'instanceof', 'let', 'new', 'null', 'return', 'super', 'switch', 'this',
+    'throw', 'true', 'try', 'typeof', 'var', 'void', 'while', 'with',
+    'yield',
+}
+# After these keywords a '/' starts a regular expression, not a division
+REGEX_KEYWORDS = {
+    'await', 'case', 'delete', 'do', 'else', 'in', 'instanceof', 'new',
+    'return', 'throw', 'typeof', 'void', 'yield',
+}
+
+_SKIP_RE = re.compile(r'(?:\s+|//[^\n]*|/\*.*?\*/)+', re.S)
+_NAME_RE = re.compile(r'[A-Za-z_$\u0080-\uffff][\w$\u0080-\uffff]*')
+_NUMBER_RE = re.compile(r'\d[\w.]*|\.\d\w*')
+_STRING_RE = re.compile(r'''"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*\'''', re.S)
+_PUNCT = sorted('''>>>= ... === !== **= <<= >>= >>> &&= ||= ??= => == != <= >=
+    && || ?? ?. ++ -- += -= *= /= %= &= |= ^= ** << >>'''.split(), key=len, reverse=True)
+# ?. is optional chaining only when no digit follows (a?.5:1 is a ternary)
+_PUNCT_RE = re.compile(r'\?\.(?!\d)|' + '|'.join(re.escape(p) for p in _PUNCT if p != '?.')
+                       + r'|[^\s\w]')
+_TEMPLATE_RE = re.compile(r'(?:[^`\\$]|\\.|\$(?!\{))*(`|\$\{)', re.S)
+
+
+class Token:
+    __slots__ = ('kind', 'text', 'start', 'end')
+
+    def __init__(self, kind, text, start, end):
+        self.kind = kind    # name, num, str, tpl, regex, priv, punct
+        self.text = text
+        self.start = start
+        self.end = end
+
+    def __repr__(self):
+        return f'Token({self.kind}, {self.text!r})'
+
+
+def _regex_allowed(prev):
+    if prev is None:
+        return True
+    if prev.kind == 'name':
+        return prev.text in REGEX_KEYWORDS
+    if prev.kind == 'punct':
+        return prev.text not in (')', ']')
+    if prev.kind == 'tpl':
+        return not prev.text.endswith('`')
+    return False
+
+
+def _regex_end(text, i):
+    """Index just past the regular expression literal opening at text[i]."""
+    i += 1
+    in_class = False
+    while i < len(text):
+        c = text[i]
+        if c == '\\':
+            i += 2
+            continue
+        if c == '\n':
+            raise ValueError('unterminated regular expression')
+        if in_class:
+            in_class = c != ']'
+        elif c == '[':
+            in_class = True
+        elif c == '/':
+            i += 1
+            while i < len(text) and (text[i].isalnum() or text[i] in '_$'):
+                i += 1
+            return i
+        i += 1
+    raise ValueError('unterminated regular expression')
+
+
+def tokenize(text):
+    """[Token] for JavaScript source (comments and whitespace dropped).
+
+    A template literal becomes one 'tpl' token per literal chunk
+    (`a${ / }b${ / }c`) with the tokens of its expressions in between.
+    """
+    tokens, braces, i, prev = [], [], 0, None
+
+    def template(i):
+        m = _TEMPLATE_RE.match(text, i)
+        if not m:
+            raise ValueError('unterminated template literal')
+        if m.group(1) == '${':
+            braces.append('tpl')
+        return m.end()
+
+    while i < len(text):
+        m = _SKIP_RE.match(text, i)
+        if m:
+            i = m.end()
+            if i >= len(text):
+                break
+        c = text[i]
+        if c == '`':
+            end = template(i + 1)
+            tok = Token('tpl', text[i:end], i, end)
+        elif c == '}' and braces and braces[-1] == 'tpl':
+            braces.pop()
+            end = template(i + 1)
+            tok = Token('tpl', text[i:end], i, end)
+        elif c in '"\'':
+            m = _STRING_RE.match(text, i)
+            if not m:
+                raise ValueError(f'unterminated string at {i}')
+            tok = Token('str', m.group(0), i, m.end())
+        elif c == '#' and _NAME_RE.match(text, i + 1):
+            end = _NAME_RE.match(text, i + 1).end()
+            tok = Token('priv', text[i:end], i, end)
+        elif c == '/' and not text.startswith(('//', '/*'), i) and _regex_allowed(prev):
+            end = _regex_end(text, i)
+            tok = Token('regex', text[i:end], i, end)
+        else:
+            m = _NAME_RE.match(text, i)
+            if m:
+                tok = Token('name', m.group(0), i, m.end())
+            else:
+                m = _NUMBER_RE.match(text, i) or _PUNCT_RE.match(text, i)
+                kind = 'num' if m.group(0)[0].isdigit() or (
+                    m.group(0)[0] == '.' and len(m.group(0)) > 1) else 'punct'
+                tok = Token(kind, m.group(0), i, m.end())
+                if kind == 'punct':
+                    if tok.text == '{':
+                        braces.append('{')
+                    elif tok.text == '}' and braces:
+                        braces.pop()
+        tokens.append(tok)
+        prev = tok
+        i = tok.end
+    return tokens
+
+
+def references(tokens):
+    """Names a token run reads: every name token that is not a keyword or a
+    property access (over-approximated: object keys and method names count)."""
+    out = set()
+    for k, tok in enumerate(tokens):
+        if tok.kind == 'name' and tok.text not in KEYWORDS:
+            if k and tokens[k - 1].kind == 'punct' and tokens[k - 1].text in ('.', '?.'):
+                continue
+            out.add(tok.text)
+    return out
+
+
+def string_value(tok):
+    """The value of a plain string token (module specifiers never escape)."""
+    return tok.text[1:-1]
+
+
+class Unit:
+    """One removable piece: a declarator, a function or class declaration,
+    or an imported binding. names are the bindings it defines."""
+
+    __slots__ = ('names', 'tokens', 'start', 'end')
+
+    def __init__(self, names, tokens, start, end):
+        self.names = names
+        self.tokens = tokens
+        self.start = start
+        self.end = end
+
+
+class Statement:
+    """A top-level statement. kind is one of import, export, export-from,
+    decl, function, class or other (kept unconditionally)."""
+
+    def __init__(self, kind, tokens, start, end):
+        self.kind = kind
+        self.tokens = tokens
+        self.start = start
+        self.end = end
+        self.keyword = None   # const / let / var for decl
+        self.units = []
+        self.source = None    # module specifier for import / export-from
+        self.specifiers = []  # (imported or local, exported or local name)
+        self.namespace = None  # import * as ns / export * (as ns)
+
+
+def _split_statements(tokens):
+    """[(first token index, end token index)] of the top-level statements."""
+    out, depth, begin, k = [], 0, 0, 0
+    while k < len(tokens):
+        tok = tokens[k]
+        if tok.kind == 'punct':
+            if tok.text in '([{':
+                depth += 1
+            elif tok.text in ')]}':
+                depth -= 1
+                if depth == 0 and tok.text == '}' and _is_declaration(tokens, begin, k):
+                    out.append((begin, k + 1))
+                    begin = k + 1
+            elif tok.text == ';' and depth == 0:
+                out.append((begin, k + 1))
+                begin = k + 1
+        k += 1
+    if begin < len(tokens):
+        out.append((begin, len(tokens)))
+    return [(a, b) for a, b in out if b > a and not (b - a == 1 and tokens[a].text == ';')]
+
+
+def _is_declaration(tokens, begin, close):
+    """True when tokens[begin:close + 1] is a whole function or class
+    declaration (its body's closing brace is at close)."""
+    k = begin
+    if tokens[k].text == 'export':
+        k += 1
+    if tokens[k].text == 'async':
+        k += 1
+    if tokens[k].text not in ('function', 'class'):
+        return False
+    depth = 0
+    for j in range(k, close + 1):
+        t = tokens[j]
+        if t.kind == 'punct' and t.text in '([{':
+            if depth == 0 and t.text == '{':
+                return _matching(tokens, j) == close
+            depth += 1
+        elif t.kind == 'punct' and t.text in ')]}':
+            depth -= 1
+    return False
+
+
+def _matching(tokens, open_index):
+    depth = 0
+    for j in range(open_index, len(tokens)):
+        t = tokens[j]
+        if t.kind == 'punct' and t.text in '([{':
+            depth += 1
+        elif t.kind == 'punct' and t.text in ')]}':
+            depth -= 1
+            if depth == 0:
+                return j
+    return len(tokens) - 1
+
+
+def _split_commas(tokens):
+    """Token runs between top-level commas."""
+    parts, depth, begin = [], 0, 0
+    for k, t in enumerate(tokens):
+        if t.kind == 'punct':
+            if t.text in '([{':
+                depth += 1
+            elif t.text in ')]}':
+                depth -= 1
+            elif t.text == ',' and depth == 0:
+                parts.append(tokens[begin:k])
+                begin = k + 1
+    parts.append(tokens[begin:])
+    return [p for p in parts if p]
+
+
+def _specifiers(tokens):
+    """[(name, alias)] for the inside of import { } / export { }."""
+    out = []
+    for part in _split_commas(tokens):
+        texts = [t.text if t.kind != 'str' else string_value(t) for t in part]
+        if len(texts) == 3 and texts[1] == 'as':
+            out.append((texts[0], texts[2]))
+        else:
+            out.append((texts[0], texts[0]))
+    return out
+
+
+class Module:
+    """An ES module's top-level statements, imports and exports."""
+
+    def __init__(self, text):
+        self.text = text
+        self.tokens = tokenize(text)
+        self.header = text[:self.tokens[0].start] if self.tokens else text
+        self.statements = [self._statement(a, b) for a, b in _split_statements(self.tokens)]
+        self.imports = {}   # local name -> (source, imported name or '*')
+        self.exports = {}   # exported name -> local name, or (source, name)
+        self.star_exports = []  # sources of export * from
+        for s in self.statements:
+            if s.kind == 'import':
+                for imported, local in s.specifiers:
+                    self.imports[local] = (s.source, imported)
+            elif s.kind == 'export':
+                for local, exported in s.specifiers:
+                    self.exports[exported] = local
+            elif s.kind == 'export-from':
+                if s.namespace == '*':
+                    self.star_exports.append(s.source)
+                for imported, exported in s.specifiers:
+                    self.exports[exported] = (s.source, imported)
+            elif s.kind in ('decl', 'function', 'class') and s.specifiers:
+                for local, exported in s.specifiers:
+                    self.exports[exported] = local
+
+    @property
+    def static_imports(self):
+        """Specifiers of every import / export ... from statement."""
+        return [s.source for s in self.statements
+                if s.kind in ('import', 'export-from') and s.source is not None]
+
+    @property
+    def dynamic_imports(self):
+        """Specifiers of every import("literal") expression."""
+        t = self.tokens
+        return [string_value(t[k + 2]) for k in range(len(t) - 3)
+                if t[k].text == 'import' and t[k + 1].text == '('
+                and t[k + 2].kind == 'str' and t[k + 3].text == ')'
+                and not (k and t[k - 1].text in ('.', '?.'))]
+
+    def names(self):
+        """Every name token and string value: what the module could look up
+        on a namespace it imported (THREE.Mesh, THREE['Mesh'])."""
+        return ({t.text for t in self.tokens if t.kind == 'name'}
+                | {string_value(t) for t in self.tokens if t.kind == 'str'})
+
+    @property
+    def is_es_module(self):
+        return any(s.kind in ('import', 'export', 'export-from') or s.specifiers
+                   for s in self.statements)
+
+    def _statement(self, a, b):
+        tokens = self.tokens[a:b]
+        texts = [t.text for t in tokens]
+        s = Statement('other', tokens, tokens[0].start, tokens[-1].end)
+        body = tokens[:-1] if texts[-1] == ';' else tokens
+        if texts[0] == 'import' and len(texts) > 1 and texts[1] not in ('(', '.'):
+            s.kind = 'import'
+            s.source = string_value(body[-1])
+            if body[1].kind == 'str':
+                return s  # import "x": evaluated for its side effects
+            clause = body[1:-2]  # between import and from
+            if clause and clause[0].kind == 'name':  # default import
+                s.specifiers.append(('default', clause[0].text))
+                clause = clause[2:] if len(clause) > 1 else []
+            if clause and clause[0].text == '*':
+                s.namespace = clause[2].text
+                s.specifiers.append(('*', clause[2].text))
+            elif clause and clause[0].text == '{':
+                s.specifiers += _specifiers(clause[1:-1])
+            s.units = [Unit({local}, [], None, None) for _, local in s.specifiers]
+            return s
+        if texts[0] == 'export':
+            if texts[1] == '{':
+                close = _matching(body, 1)
+                specs = _specifiers(body[2:close])
+                if close + 1 < len(body) and body[close + 1].text == 'from':
+                    s.kind = 'export-from'
+                    s.source = string_value(body[close + 2])
+                else:
+                    s.kind = 'export'
+                s.specifiers = specs
+                return s
+            if texts[1] == '*':
+                s.kind = 'export-from'
+                s.source = string_value(body[-1])
+                if texts[2] == 'as':
+                    s.specifiers = [('*', texts[3])]
+                else:
+                    s.namespace = '*'
+                return s
+            if texts[1] == 'default':
+                return s  # kept as a side-effect statement
+            inner = self._statement(a + 1, b)
+            inner.start = s.start
+            inner.specifiers = [(n, n) for u in inner.units for n in sorted(u.names)]
+            return inner
+        if texts[0] in ('const', 'let', 'var'):
+            s.kind = 'decl'
+            s.keyword = texts[0]
+            for part in _split_commas(body[1:]):
+                pattern = []
+                for t in part:
+                    if t.kind == 'punct' and t.text == '=':
+                        break
+                    pattern.append(t)
+                if pattern and pattern[0].kind == 'name':
+                    names = {pattern[0].text}
+                else:
+                    names = {t.text for t in pattern if t.kind == 'name'}
+                s.units.append(Unit(names, part, part[0].start, part[-1].end))
+            return s
+        k = 1 if texts[0] == 'async' else 0
+        if texts[k] in ('function', 'class'):
+            name_index = k + 2 if texts[k + 1] == '*' else k + 1
+            if tokens[name_index].kind == 'name' and tokens[name_index].text not in KEYWORDS:
+                s.kind = texts[k]
+                s.units = [Unit({tokens[name_index].text}, tokens, s.start, s.end)]
+        return s
+
+    def shake(self, used, rename=None):
+        """(pruned module text, {source: imported names it still needs}).
+
+        used: exported names to keep. rename(source) -> specifier to write
+        for an import or re-export source (default: unchanged).
+        """
+        rename = rename or (lambda source: source)
+        defines = {}
+        for s in self.statements:
+            for u in s.units:
+                for name in u.names:
+                    defines.setdefault(name, []).append(u)
+        live_units, seen, stack = set(), set(), []
+
+        def need(name):
+            if name not in seen:
+                seen.add(name)
+                stack.append(name)
+
+        for s in self.statements:
+            if s.kind == 'other':
+                for name in references(s.tokens):
+                    need(name)
+        wanted_exports = {}
+        needs = {}
+        for exported in sorted(used):
+            target = self.exports.get(exported)
+            if target is None:
+                for source in self.star_exports:
+                    needs.setdefault(source, set()).add(exported)
+                continue
+            if isinstance(target, tuple):
+                needs.setdefault(target[0], set()).add(target[1])
+            else:
+                need(target)
+            wanted_exports[exported] = target
+        while stack:
+            name = stack.pop()
+            for u in defines.get(name, ()):
+                if id(u) not in live_units:
+                    live_units.add(id(u))
+                    for ref in references(u.tokens):
+                        need(ref)
+
+        out = []
+        for s in self.statements:
+            if s.kind == 'other':
+                out.append(self.text[s.start:s.end])
+            elif s.kind == 'import':
+                if s.source is not None and not s.specifiers:
+                    out.append(f'import"{rename(s.source)}";')
+                    continue
+                kept = [(imp, local) for imp, local in s.specifiers if local in seen]
+                if not kept:
+                    continue
+                for imp, _local in kept:
+                    needs.setdefault(s.source, set()).add(imp)
+                if s.namespace:
+                    out.append(f'import*as {s.namespace} from"{rename(s.source)}";')
+                else:
+                    out.append('import{%s}from"%s";' % (
+                        ','.join(_alias(imp, local) for imp, local in kept), rename(s.source)))
+            elif s.kind == 'export-from':
+                kept = [(imp, exp) for imp, exp in s.specifiers if exp in wanted_exports]
+                if s.namespace == '*':
+                    if needs.get(s.source):
+                        out.append(f'export*from"{rename(s.source)}";')
+                elif kept:
+                    out.append('export{%s}from"%s";' % (
+                        ','.join(_alias(imp, exp) for imp, exp in kept), rename(s.source)))
+            elif s.kind == 'export':
+                continue  # one combined export list is written at the end
+            elif s.kind == 'decl':
+                kept = [u for u in s.units if id(u) in live_units]
+                if kept:
+                    out.append(s.keyword + ' ' + ','.join(
+                        self.text[u.start:u.end] for u in kept) + ';')
+            elif id(s.units[0]) in live_units:
+                body = self.text[s.start:s.end]
+                out.append(body[len('export'):].lstrip() if body.startswith('export') else body)
+        local_exports = [(local, exported) for exported, local in sorted(wanted_exports.items())
+                         if not isinstance(local, tuple)]
+        if local_exports:
+            out.append('export{%s};' % ','.join(_alias(local, exp) for local, exp in local_exports))
+        return self.header + '\n'.join(out) + '\n', needs
+
+
+def _alias(name, alias):
+    return name if name == alias else f'{name} as {alias}'
@@ -0,0 +1,452 @@
+#!/usr/bin/env python3
+"""Estimate an image's rendered width from the Tailwind classes around it.
+
+Derives the `sizes` attribute of an <img> from layout instead of a browser
+measurement: the classes on the image and on every element enclosing it
+(w-full, w-1/2, md:w-1/3, max-w-*, container, px-*, grid-cols-* with gap-*,
+col-span-*, hidden/md:block) are looked up in the compiled stylesheet
+(css/tailwind.min.css, so the declarations are exactly what ships) and
+applied at each viewport width, with the breakpoints taken from
+tailwind.config.js (Tailwind's defaults unless theme.screens overrides
+them).
+
+The width as a function of the viewport is piecewise linear: it can only
+jump at a breakpoint, and between two breakpoints it bends where a
+max-width cap starts to bite. Each linear piece becomes one sizes entry:
+
+    (max-width: 639px) calc(100vw - 48px), (max-width: 1023px) 50vw, 382px
+
+What it cannot see - content-sized flex items, widths set by scripts or by
+the page's own <style> - is treated as filling the parent, so an estimate
+errs towards a larger candidate, never a blurry one.
+
+Run from the repo root to compare the estimate with the browser-measured
+CONTEXT_RULES in apply_responsive_images.py and with the sizes already on
+the pages; disagreements beyond TOLERANCE at the measured viewports are
+flagged:
+    python3 scripts/layout_sizes.py [page.html ...]
+"""
+import os
+import re
+import sys
+
+import css_rules
+import rewrite_pipeline
+from page_corpus import ROOT_DIR, get_corpus
+from rewrite_pipeline import attributes
+
+CONFIG_PATH = os.path.join(ROOT_DIR, 'tailwind.config.js')
+STYLESHEET_PATH = os.path.join(ROOT_DIR, 'css', 'tailwind.min.css')
+# Tailwind 3 defaults, used for every screen the config does not redefine
+DEFAULT_SCREENS = {'sm': 640, 'md': 768, 'lg': 1024, 'xl': 1280, '2xl': 1536}
+ROOT_FONT_PX = 16
+# Viewports the estimate is evaluated on; narrower/wider ones extend the end pieces
+MIN_VIEWPORT, MAX_VIEWPORT = 320, 1920
+STEP = 8
+# Viewports CONTEXT_RULES were measured at, and the relative difference
+# between estimate and measurement that counts as a disagreement
+MEASURED_VIEWPORTS = (375, 768, 1440)
+TOLERANCE = 0.15
+# Declarations that can change an element's width or its children's
+LAYOUT_PROPS = {
+    'display', 'width', 'height', 'min-width', 'max-width', 'padding', 'padding-left',
+    'padding-right', 'margin', 'margin-left', 'margin-right',
+    'grid-template-columns', 'grid-column', 'gap', 'column-gap',
+}
+
+SCREENS_RE = re.compile(r'\bscreens\s*:\s*\{([^{}]*)\}')
+SCREEN_RE = re.compile(r'''['"]?([\w-]+)['"]?\s*:\s*['"](\d+)px['"]''')
+MIN_WIDTH_RE = re.compile(r'@media\s*\(\s*min-width\s*:\s*(\d+)px\s*\)\s*$')
+CLASS_SELECTOR_RE = re.compile(r'\.((?:\\.|[\w-])+)')
+LENGTH_RE = re.compile(r'(-?\d*\.?\d+)(px|rem|em|%|vw)?$')
+SPAN_RE = re.compile(r'span\s+(\d+)')
+SIZES_ENTRY_RE = re.compile(r'^\((max|min)-width\s*:\s*(\d+)px\)\s*(.+)$')
+CALC_RE = re.compile(r'calc\(\s*(-?[\d.]+)vw\s*([+-])\s*([\d.]+)px\s*\)$')
+
+_screens = None
+_class_rules = None
+
+
+def load_screens(path=CONFIG_PATH):
+    """{name: min-width px} of the Tailwind breakpoints. A screens block
+    inside theme.extend adds to the defaults, one directly under theme
+    replaces them."""
+    try:
+        with open(path, encoding='utf-8') as f:
+            text = f.read()
+    except OSError:
+        return dict(DEFAULT_SCREENS)
+    m = SCREENS_RE.search(text)
+    if not m:
+        return dict(DEFAULT_SCREENS)
+    screens = {name: int(px) for name, px in SCREEN_RE.findall(m.group(1))}
+    extend = list(re.finditer(r'\bextend\s*:\s*\{', text[:m.start()]))
+    inside = text[extend[-1].end():m.start()] if extend else None
+    if inside is not None and inside.count('{') == inside.count('}'):
+        return {**DEFAULT_SCREENS, **screens}
+    return screens
+
+
+def screens():
+    global _screens
+    if _screens is None:
+        _screens = load_screens()
+    return _screens
+
+
+def declarations(body):
+    """{property: value} of a declaration block, layout properties only."""
+    out = {}
+    for declaration in body.split(';'):
+        prop, _, value = declaration.partition(':')
+        prop = prop.strip().lower()
+        if prop in LAYOUT_PROPS:
+            out[prop] = value.replace('!important', '').strip()
+    return out
+
+
+def load_class_rules(path=STYLESHEET_PATH):
+    """{class name: [(order, min-width px, {property: value})]} for every rule
+    of the stylesheet whose selector is a single bare class, top level (min
+    width 0) or inside a min-width media query."""
+    with open(path, encoding='utf-8') as f:
+        rules = css_rules.parse(f.read())
+    out = {}
+    order = 0
+
+    def collect(rules, min_width):
+        nonlocal order
+        for rule in rules:
+            if rule.children is not None:
+                m = MIN_WIDTH_RE.match(rule.prelude)
+                if m:
+                    collect(rule.children, int(m.group(1)))
+                continue
+            if rule.is_at_rule or not rule.body:
+                continue
+            props = declarations(rule.body)
+            if not props:
+                continue
+            for selector in css_rules.split_selectors(rule.prelude):
+                m = CLASS_SELECTOR_RE.fullmatch(selector)
+                if m:
+                    order += 1
+                    out.setdefault(css_rules.unescape(m.group(1)), []).append(
+                        (order, min_width, props))
+
+    collect(rules, 0)
+    return out
+
+
+def class_rules():
+    global _class_rules
+    if _class_rules is None:
+        _class_rules = load_class_rules()
+    return _class_rules
+
+
+def computed(tag, viewport):
+    """{property: value} the element's classes apply at this viewport width
+    (later rules in the stylesheet win, as in the cascade)."""
+    rules = class_rules()
+    matching = []
+    for name in attributes(tag).get('class', '').split():
+        matching += [r for r in rules.get(name, ()) if r[1] <= viewport]
+    out = {}
+    for _order, _min_width, props in sorted(matching, key=lambda r: r[0]):
+        for shorthand in ('padding', 'margin'):
+            if shorthand in props:  # resets the longhands set before it
+                out.pop(f'{shorthand}-left', None)
+                out.pop(f'{shorthand}-right', None)
+        out.update(props)
+    return out
+
+
+def length(value, basis, viewport):
+    """A CSS length in px (percentages of basis), or None for auto, none,
+    fit-content and anything else that depends on content."""
+    if value is None:
+        return None
+    value = value.strip()
+    if value.startswith('calc(') and value.endswith(')'):
+        m = re.fullmatch(r'(.+?)\s+([+-])\s+(.+)', value[5:-1].strip())
+        if not m:
+            return None
+        a, b = length(m.group(1), basis, viewport), length(m.group(3), basis, viewport)
+        if a is None or b is None:
+            return None
+        return a + b if m.group(2) == '+' else a - b
+    m = LENGTH_RE.match(value)
+    if not m:
+        return None
+    number, unit = float(m.group(1)), m.group(2)
+    if unit in ('rem', 'em'):
+        return number * ROOT_FONT_PX
+    if unit == '%':
+        return number * basis / 100
+    if unit == 'vw':
+        return number * viewport / 100
+    return number  # px, or a unitless 0
+
+
+def sides(props, prop, basis, viewport):
+    """(left, right) px of a padding or margin, from the shorthand and the
+    longhands that override it."""
+    left = right = 0
+    values = props.get(prop, '').split()
+    if values:
+        right = length(values[1 if len(values) > 1 else 0], basis, viewport) or 0
+        left = length(values[3 if len(values) > 3 else 1 if len(values) > 1 else 0],
+                      basis, viewport) or 0
+    if f'{prop}-left' in props:
+        left = length(props[f'{prop}-left'], basis, viewport) or 0
+    if f'{prop}-right' in props:
+        right = length(props[f'{prop}-right'], basis, viewport) or 0
+    return left, right
+
+
+def tracks(template):
+    """The column tracks of a grid-template-columns value, repeat() expanded."""
+    template = re.sub(r'repeat\(\s*(\d+)\s*,\s*((?:[^()]|\([^()]*\))+)\)',
+                      lambda m: ' '.join([m.group(2).strip()] * int(m.group(1))), template)
+    return re.findall(r'minmax\([^()]*\)|\S+', template)
+
+
+def grid_cell(parent, child, width, viewport):
+    """Width of the grid area a child of this grid container gets. Which
+    column the child sits in is not known, so fr tracks are assumed to be
+    the widest one."""
+    columns = tracks(parent.get('grid-template-columns', 'none'))
+    if not columns or columns == ['none']:
+        return width
+    gap = length((parent.get('column-gap') or parent.get('gap', '0')).split()[-1], width, viewport) or 0
+    fixed, fractions = 0, []
+    for track in columns:
+        fr = re.fullmatch(r'(?:minmax\(\s*0\s*,\s*)?(\d*\.?\d+)fr\)?', track)
+        if fr:
+            fractions.append(float(fr.group(1)))
+        else:
+            fixed += length(track, width, viewport) or 0
+    free = max(width - fixed - gap * (len(columns) - 1), 0)
+    track = free * max(fractions) / sum(fractions) if fractions else free / len(columns)
+    span = SPAN_RE.match(child.get('grid-column', ''))
+    span = min(int(span.group(1)), len(columns)) if span else 1
+    return track * span + gap * (span - 1)
+
+
+def image_width(tag, props, basis, viewport):
+    """Width of an <img> with auto width: scaled from a fixed CSS height
+    (h-12 w-auto), else its width attribute; None when neither is known."""
+    attrs = attributes(tag)
+    try:
+        ratio = float(attrs['width']) / float(attrs['height'])
+    except (KeyError, ValueError, ZeroDivisionError):
+        ratio = None
+    height = props.get('height', '')
+    if ratio and not height.endswith('%'):
+        height = length(height, basis, viewport)
+        if height:
+            return height * ratio
+    return length(attrs.get('width'), basis, viewport)
+
+
+def rendered_width(tags, viewport):
+    """Width in px of the last element of tags (start tags, outermost
+    first) at a viewport width, or 0 when it is not displayed."""
+    available = float(viewport)
+    parent = {}
+    width = available
+    for tag in tags:
+        props = computed(tag, viewport)
+        if props.get('display') == 'none':
+            return 0
+        if parent.get('display') in ('grid', 'inline-grid'):
+            available = grid_cell(parent, props, available, viewport)
+        width = length(props.get('width'), available, viewport)
+        if width is None:
+            margin_left, margin_right = sides(props, 'margin', available, viewport)
+            width = available - margin_left - margin_right
+            if tag.startswith('<img'):
+                width = min(width, image_width(tag, props, available, viewport) or width)
+        cap = length(props.get('max-width'), available, viewport)
+        if cap is not None:
+            width = min(width, cap)
+        floor = length(props.get('min-width'), available, viewport)
+        if floor is not None:
+            width = max(width, floor)
+        padding_left, padding_right = sides(props, 'padding', available, viewport)
+        available = max(width - padding_left - padding_right, 0)
+        parent = props
+    return max(width, 0)
+
+
+def _on_line(line, viewport, width):
+    slope, intercept = line
+    return abs(slope * viewport + intercept - width) <= 0.5
+
+
+def _pieces(f, lo, hi):
+    """[(first viewport, last viewport, (slope, intercept))] of the linear
+    pieces of f on the integer viewports lo..hi."""
+    out = []
+    start = lo
+    while start <= hi:
+        if start == hi:
+            out.append((start, hi, (0.0, f(start))))
+            break
+        probe = min(start + STEP, hi)
+        slope = (f(probe) - f(start)) / (probe - start)
+        line = (slope, f(start) - slope * start)
+        # walk forward in STEP jumps, then bisect to the last viewport on the line
+        good, bad = probe, None
+        while good < hi:
+            nxt = min(good + STEP, hi)
+            if _on_line(line, nxt, f(nxt)):
+                good = nxt
+            else:
+                bad = nxt
+                break
+        if bad is not None:
+            while bad - good > 1:
+                mid = (good + bad) // 2
+                if _on_line(line, mid, f(mid)):
+                    good = mid
+                else:
+                    bad = mid
+        out.append((start, good, line))
+        start = good + 1
+    return out
+
+
+def width_pieces(tags):
+    """[(first viewport, last viewport, (slope, intercept))] of the element's
+    width between MIN_VIEWPORT and MAX_VIEWPORT, adjacent equal pieces merged."""
+    cache = {}
+
+    def f(viewport):
+        if viewport not in cache:
+            cache[viewport] = rendered_width(tags, viewport)
+        return cache[viewport]
+
+    bounds = sorted({MIN_VIEWPORT, MAX_VIEWPORT + 1} | {
+        px for px in screens().values() if MIN_VIEWPORT < px <= MAX_VIEWPORT})
+    pieces = []
+    for lo, hi in zip(bounds, bounds[1:]):
+        for piece in _pieces(f, lo, hi - 1):
+            if pieces and all(_on_line(pieces[-1][2], v, f(v)) for v in (piece[0], piece[1])):
+                pieces[-1] = (pieces[-1][0], piece[1], pieces[-1][2])
+            else:
+                pieces.append(piece)
+    return pieces
+
+
+def _number(value):
+    return f'{value:.2f}'.rstrip('0').rstrip('.')
+
+
+def expression(line):
+    """A sizes length for width = slope * viewport + intercept."""
+    slope, intercept = line
+    intercept = round(intercept)
+    if abs(slope) < 1e-4:
+        return f'{intercept}px'
+    vw = _number(slope * 100)
+    if intercept == 0:
+        return f'{vw}vw'
+    return f'calc({vw}vw {"+" if intercept > 0 else "-"} {abs(intercept)}px)'
+
+
+def sizes_attr(tags):
+    """The sizes attribute for the last element of tags (start tags,
+    outermost first), or None when it is never displayed."""
+    pieces = width_pieces(tags)
+    if all(expression(line) == '0px' for _first, _last, line in pieces):
+        return None
+    entries = [f'(max-width: {last}px) {expression(line)}' for _first, last, line in pieces[:-1]]
+    return ', '.join(entries + [expression(pieces[-1][2])])
+
+
+def length_at(value, viewport):
+    """px of a sizes length (px, vw or calc(vw +/- px)) at a viewport."""
+    value = value.strip()
+    m = CALC_RE.match(value)
+    if m:
+        px = float(m.group(3))
+        return float(m.group(1)) * viewport / 100 + (px if m.group(2) == '+' else -px)
+    m = re.fullmatch(r'(\d*\.?\d+)(px|vw)', value)
+    if not m:
+        return None
+    return float(m.group(1)) * (viewport / 100 if m.group(2) == 'vw' else 1)
+
+
+def sizes_width(sizes, viewport):
+    """The slot width a sizes attribute selects at a viewport, or None."""
+    for entry in (e.strip() for e in re.split(r',(?![^()]*\))', sizes)):
+        m = SIZES_ENTRY_RE.match(entry)
+        if not m:
+            return length_at(entry, viewport)
+        kind, px, value = m.groups()
+        if (viewport <= int(px)) if kind == 'max' else (viewport >= int(px)):
+            return length_at(value, viewport)
+    return None
+
+
+def disagreement(measured, estimated):
+    """'375px: 326 vs 343, ...' for the measured viewports where two sizes
+    attributes differ by more than TOLERANCE; '' when they agree."""
+    out = []
+    for viewport in MEASURED_VIEWPORTS:
+        a, b = sizes_width(measured, viewport), sizes_width(estimated, viewport)
+        if a is None or not b:  # not displayed at this viewport
+            continue
+        if abs(a - b) > TOLERANCE * max(a, b, 1):
+            out.append(f'{viewport}px: {a:.0f} vs {b:.0f}')
+    return ', '.join(out)
+
+
+def page_images(page):
+    """[(img start tag, its ancestors' start tags)] of a page, in order."""
+    found = []
+
+    def collect(ctx, tag):
+        found.append((tag, list(ctx.open_tags)))
+        return tag
+
+    rewrite_pipeline.Pipeline([rewrite_pipeline.Transform(
+        'layout-sizes', tags=('img',), tag=collect)]).rewrite(page)
+    return found
+
+
+def main():
+    import apply_responsive_images  # the measured table lives there
+
+    wanted = set(a for a in sys.argv[1:] if not a.startswith('--'))
+    flagged = checked = 0
+    for page in get_corpus():
+        if wanted and page.path not in wanted:
+            continue
+        for tag, ancestors in page_images(page):
+            src = attributes(tag).get('src', '')
+            estimate = sizes_attr(ancestors + [tag])
+            if estimate is None:
+                continue
+            measured, _hero = apply_responsive_images.measured_sizes(page.path, src, tag)
+            current = attributes(tag).get('sizes')
+            for label, reference in (('CONTEXT_RULES', measured), ('page', current)):
+                if not reference or (label == 'page' and reference == measured):
+                    continue
+                checked += 1
+                diff = disagreement(reference, estimate)
+                if diff:
+                    flagged += 1
+                    print(f'{page.path}: {src}\n  {label}: {reference}\n'
+                          f'  estimate: {estimate}\n  differs at {diff}')
+            if wanted:
+                print(f'{page.path}: {src}\n  sizes:    {current}\n  estimate: {estimate}')
+    print(f'{flagged} of {checked} measured sizes differ from the layout estimate '
+          f'by more than {TOLERANCE:.0%}')
+    return 1 if flagged and '--strict' in sys.argv else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
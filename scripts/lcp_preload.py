@@ -0,0 +1,444 @@
+#!/usr/bin/env python3
+"""Find each page's probable LCP element and give it a matching image preload.
+
+Without a browser, the Largest Contentful Paint element is estimated from
+the static DOM, the way the page's layout classes lay it out:
+
+- only the first screen counts: everything before the page's first <h2>
+  (or, when that heading sits in a grid, before the end of its grid row,
+  so a card's image next to its title is in), outside <head>, <nav>,
+  <footer> and <noscript>;
+- a hero wins outright, the first one in document order: an element whose
+  class or style="" gives it a background-image url() (the .hero-bg rules
+  in the pages' inline <style>), or a full-bleed <img> or <video poster>:
+  object-cover (or w-full h-full) and absolute, itself or through one of
+  its two nearest wrappers - apply_responsive_images.EAGER_MARKERS, with
+  the wrapper taken into account;
+- otherwise the largest image, by its rendered width (the default slot of
+  its sizes, vw at a 1440px viewport) and aspect ratio, if at least
+  MIN_WIDTH px wide;
+- a first screen without such an image has a text LCP (the <h1>, painted
+  with the preloaded fonts) and needs no image preload.
+
+The LCP image should be fetched from the HTML head at high priority, as the
+same responsive variant the <img> will pick:
+
+    <link rel="preload" as="image" href="/images/a.webp"
+          imagesrcset="/images/a_480w.webp 480w, /images/a.webp 1024w"
+          imagesizes="100vw" fetchpriority="high">
+
+(type="image/avif" with the <source>'s candidates when the <img> is served
+through an AVIF <picture>; just href for posters).
+
+A CSS background hero has no srcset. When its class rule names a file with
+ladder rungs, the rule keeps the full-size file and a <style
+data-lcp-background> block after it swaps in each rung by media query: a
+rung is shown where the viewport width times the device pixel ratio fits
+in it (in DPR_STEPS steps), which is how the browser picks from the
+preload's imagesrcset at imagesizes="100vw":
+
+    <style data-lcp-background>
+      @media (max-width: 1200px) and (max-resolution: 1dppx), ... {
+        .hero-bg { background-image: linear-gradient(...), url('a_1200w.webp'); }
+      }
+      ...
+    </style>
+
+The check flags a missing or mismatching preload or background block,
+image preloads of anything else and a lazy-loaded LCP image;
+run_all_checks.py runs it on every page. The fix writes the background
+block, replaces the image preloads with the expected one (after the font
+preloads) and loads the LCP <img> eagerly with fetchpriority="high".
+
+Runs as the lcp-preload step of rewrite_pipeline.py, or alone:
+    python3 scripts/lcp_preload.py             # report
+    python3 scripts/lcp_preload.py --dry-run   # diff of the fixes
+    python3 scripts/lcp_preload.py --write     # apply them
+"""
+import os
+import re
+import sys
+from collections import namedtuple
+
+import apply_responsive_images
+import rewrite_pipeline
+from link_graph import get_link_graph
+from page_corpus import get_corpus
+from rewrite_pipeline import attributes
+
+MIN_WIDTH = 200
+VIEWPORT = 1440
+# Device pixel ratios the background media queries step through; a screen
+# between two steps gets the rung for the higher one
+DPR_STEPS = (1, 1.5, 2, 3)
+BACKGROUND_STYLE = 'data-lcp-background'
+BACKGROUND_STYLE_RE = re.compile(r'\n?[ \t]*<style %s>.*?</style>' % BACKGROUND_STYLE, re.S)
+FOLD_TAG = 'h2'
+OFF_SCREEN = ('head', 'nav', 'footer', 'noscript')
+LINK_RE = re.compile(r'<link\b[^>]*>')
+PRELOAD_ATTRS = ('rel', 'as', 'type', 'href', 'imagesrcset', 'imagesizes', 'fetchpriority')
+STYLE_BLOCK_RE = re.compile(r'<style\b[^>]*>(.*?)</style\s*>', re.S | re.I)
+CSS_RULE_RE = re.compile(r'([^{}]+)\{([^{}]*)\}')
+BACKGROUND_URL_RE = re.compile(r'''background(?:-image)?\s*:[^;]*?url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+BACKGROUND_VALUE_RE = re.compile(r'background(?:-image)?\s*:([^;]*)')
+IMAGE_FUNCTION_RE = re.compile(r'(?:url|(?:repeating-)?(?:linear|radial|conic)-gradient)\(')
+
+# kind: 'img', 'poster' or 'background'; tag: the element's start tag as
+# written; url: the image it shows, as written; source: attrs of the AVIF
+# <source> serving an <img>, or None
+Candidate = namedtuple('Candidate', 'kind tag attrs url source hero width')
+
+
+def classes(tag):
+    return set(attributes(tag).get('class', '').split())
+
+
+def background_rules(html):
+    """{class name: (url, rule body, <style> block match)} for the class
+    rules of the page's own <style> blocks that set a background image (the
+    last one of a class, which wins the cascade)."""
+    out = {}
+    for block in STYLE_BLOCK_RE.finditer(html):
+        if block.group(0).startswith(f'<style {BACKGROUND_STYLE}>'):
+            continue
+        for selectors, body in CSS_RULE_RE.findall(block.group(1)):
+            m = BACKGROUND_URL_RE.search(body)
+            if not m:
+                continue
+            for selector in selectors.split(','):
+                if re.fullmatch(r'\s*\.[\w-]+\s*', selector):
+                    out[selector.strip()[1:]] = (m.group(2), body, block)
+    return out
+
+
+def background_classes(html):
+    """{class name: url} for the class rules that set a background image."""
+    return {name: rule[0] for name, rule in background_rules(html).items()}
+
+
+def is_full_bleed(tag, wrappers):
+    """Hero markers on the element, positioned by it or by a near wrapper."""
+    own = classes(tag)
+    covers = set(apply_responsive_images.EAGER_MARKERS) - {'absolute'} <= own or {'w-full', 'h-full'} <= own
+    positioned = 'absolute' in own or any('absolute' in classes(w) for w in wrappers[-2:])
+    return covers and positioned
+
+
+def rendered_width(attrs):
+    """Estimated CSS width at a desktop viewport, from sizes, else width."""
+    sizes = attrs.get('sizes', '').split(',')[-1].strip()
+    m = re.fullmatch(r'(\d+(?:\.\d+)?)(px|vw)', sizes)
+    if m:
+        value = float(m.group(1))
+        return value * VIEWPORT / 100 if m.group(2) == 'vw' else value
+    try:
+        return min(float(attrs.get('width', 0)), VIEWPORT)
+    except ValueError:
+        return 0
+
+
+def area(candidate):
+    try:
+        ratio = float(candidate.attrs['height']) / float(candidate.attrs['width'])
+    except (KeyError, ValueError, ZeroDivisionError):
+        ratio = 1
+    return candidate.width * candidate.width * ratio
+
+
+class _Finder:
+    """Tag hook collecting the first screen's image candidates."""
+
+    def __init__(self, backgrounds):
+        self.backgrounds = backgrounds
+        self.candidates = []
+        self.avif = None
+        self.done = False
+        self.row = None  # (depth, start tag) of the grid row holding the first <h2>
+
+    def past_row(self, ctx):
+        depth, tag = self.row
+        return len(ctx.open_tags) < depth or ctx.open_tags[depth - 1] is not tag
+
+    def tag(self, ctx, tag):
+        name = tag[1:].split(None, 1)[0].rstrip('/>').lower()
+        if self.row is not None and self.past_row(ctx):
+            self.done = True
+        if self.done or any(ctx.inside(t) for t in OFF_SCREEN):
+            return tag
+        if name == FOLD_TAG and self.row is None:
+            rows = [i for i, t in enumerate(ctx.open_tags) if 'grid' in classes(t)]
+            if not rows:
+                self.done = True
+                return tag
+            self.row = (rows[-1] + 1, ctx.open_tags[rows[-1]])
+            return tag
+        attrs = attributes(tag)
+        background = BACKGROUND_URL_RE.search(attrs.get('style', ''))
+        url = background.group(2) if background else next(
+            (self.backgrounds[c] for c in attrs.get('class', '').split() if c in self.backgrounds), None)
+        if url is not None and not url.startswith('data:'):  # inline LQIPs are never fetched
+            self.candidates.append(Candidate('background', tag, attrs, url, None, True, VIEWPORT))
+        if name == 'picture':
+            self.avif = None
+        elif name == 'source' and ctx.inside('picture') and attrs.get('type') == 'image/avif':
+            self.avif = attrs
+        elif name == 'img' and attrs.get('src') and rendered_width(attrs) > 1:
+            source = self.avif if ctx.inside('picture') else None
+            self.candidates.append(Candidate('img', tag, attrs, attrs['src'], source,
+                                             is_full_bleed(tag, ctx.open_tags),
+                                             rendered_width(attrs)))
+        elif name == 'video' and attrs.get('poster'):
+            self.candidates.append(Candidate('poster', tag, attrs, attrs['poster'], None,
+                                             is_full_bleed(tag, ctx.open_tags), VIEWPORT))
+        return tag
+
+
+def find_lcp(page, html=None):
+    """The page's probable LCP image Candidate, or None for a text LCP."""
+    html = page.html if html is None else html
+    finder = _Finder(background_classes(html))
+    rewrite_pipeline.Pipeline([rewrite_pipeline.Transform(
+        'lcp-candidates', tags=('*',), tag=finder.tag)]).rewrite(page, html)
+    heroes = [c for c in finder.candidates if c.hero]
+    if heroes:
+        return heroes[0]
+    images = [c for c in finder.candidates if c.width >= MIN_WIDTH]
+    return max(images, key=area) if images else None
+
+
+def absolute_url(page, url):
+    """A page-relative URL as a root-relative one (/images/a.webp)."""
+    path = get_link_graph(page.root).target_path(page.path, url)
+    return url if path is None else '/' + path.replace(os.sep, '/')
+
+
+def absolute_srcset(page, srcset):
+    out = []
+    for candidate in srcset.split(','):
+        url, _, descriptor = candidate.strip().partition(' ')
+        out.append(f'{absolute_url(page, url)} {descriptor.strip()}'.strip())
+    return ', '.join(out)
+
+
+def background_ladder(page, url):
+    """[(width, url as written)] of a background file's ladder rungs and the
+    file itself, narrowest first; [] when it has no rungs."""
+    path = get_link_graph(page.root).target_path(page.path, url)
+    if path is None:
+        return []
+    fs_path = os.path.join(page.root, path)
+    rungs = apply_responsive_images.variants_for(fs_path)
+    if not rungs:
+        return []
+    stem, ext = os.path.splitext(url)
+    return [(w, f'{stem}_{w}w{ext}') for w, _ in rungs] + [
+        (apply_responsive_images.dims(fs_path)[0], url)]
+
+
+def image_layers(body):
+    """The image functions (url(), gradients) of a rule's background, in
+    layer order, as written."""
+    m = BACKGROUND_VALUE_RE.search(body)
+    if not m:
+        return []
+    value, layers, pos = m.group(1), [], 0
+    while True:
+        start = IMAGE_FUNCTION_RE.search(value, pos)
+        if not start:
+            return layers
+        depth, end = 0, start.end() - 1
+        for end in range(start.end() - 1, len(value)):
+            depth += {'(': 1, ')': -1}.get(value[end], 0)
+            if depth == 0:
+                break
+        layers.append(value[start.start():end + 1])
+        pos = end + 1
+
+
+def resolution_query(width):
+    """Media query for screens whose viewport x DPR fits in width px."""
+    return ', '.join(f'(max-width: {int(width / dpr)}px) and (max-resolution: {dpr:g}dppx)'
+                     for dpr in DPR_STEPS)
+
+
+def background_style(page, lcp, html):
+    """(the <style data-lcp-background> block a background hero needs, the
+    <style> block match it follows), or (None, None) when it needs none."""
+    if lcp is None or lcp.kind != 'background' or BACKGROUND_URL_RE.search(lcp.attrs.get('style', '')):
+        return None, None
+    rules = background_rules(html)
+    name = next((c for c in lcp.attrs.get('class', '').split() if c in rules), None)
+    if name is None:
+        return None, None
+    url, body, block = rules[name]
+    ladder = background_ladder(page, url)
+    if not ladder:
+        return None, None
+    layers = image_layers(body)
+    indent = re.search(r'([ \t]*)$', html[:block.start()]).group(1)
+    lines = [f'{indent}<style {BACKGROUND_STYLE}>']
+    for width, rung in reversed(ladder[:-1]):  # narrower rungs last, so they win
+        image = ', '.join(f"url('{rung}')" if url in layer else layer for layer in layers)
+        lines += [f'{indent}  @media {resolution_query(width)} {{',
+                  f'{indent}    .{name} {{ background-image: {image}; }}',
+                  f'{indent}  }}']
+    return '\n'.join(lines + [f'{indent}</style>']), block
+
+
+def expected_preload(page, lcp):
+    """{attribute: value} of the preload an LCP Candidate needs, in order."""
+    attrs = {'rel': 'preload', 'as': 'image'}
+    if lcp.kind == 'background':
+        attrs['href'] = absolute_url(page, lcp.url)
+        ladder = [] if BACKGROUND_URL_RE.search(lcp.attrs.get('style', '')) else \
+            background_ladder(page, lcp.url)
+        if ladder:
+            attrs['imagesrcset'] = ', '.join(f'{absolute_url(page, u)} {w}w' for w, u in ladder)
+            attrs['imagesizes'] = '100vw'
+    elif lcp.kind == 'poster':
+        attrs['href'] = absolute_url(page, lcp.url)
+    elif lcp.source is not None:
+        attrs['type'] = 'image/avif'
+        attrs['imagesrcset'] = absolute_srcset(page, lcp.source['srcset'])
+        attrs['imagesizes'] = lcp.source.get('sizes') or lcp.attrs.get('sizes', '')
+    else:
+        attrs['href'] = absolute_url(page, lcp.attrs['src'])
+        if lcp.attrs.get('srcset'):
+            attrs['imagesrcset'] = absolute_srcset(page, lcp.attrs['srcset'])
+            attrs['imagesizes'] = lcp.attrs.get('sizes', '100vw')
+    attrs['fetchpriority'] = 'high'
+    return attrs
+
+
+def preload_tag(attrs):
+    return '<link ' + ' '.join(f'{k}="{v}"' for k, v in attrs.items()) + '>'
+
+
+def image_preloads(page, html):
+    """[(tag, normalized attrs)] of the <link rel=preload as=image>s in <head>."""
+    head = html.split('</head>', 1)[0]
+    head = re.sub(r'<noscript\b.*?</noscript>', '', head, flags=re.S)
+    out = []
+    for tag in LINK_RE.findall(head):
+        attrs = attributes(tag)
+        if attrs.get('rel') != 'preload' or attrs.get('as') != 'image':
+            continue
+        if 'href' in attrs:
+            attrs['href'] = absolute_url(page, attrs['href'])
+        if 'imagesrcset' in attrs:
+            attrs['imagesrcset'] = absolute_srcset(page, attrs['imagesrcset'])
+        out.append((tag, {k: attrs[k] for k in PRELOAD_ATTRS if k in attrs}))
+    return out
+
+
+def lcp_issues(page, html=None):
+    """[message] for one page's LCP fetch (html: content standing in for the page's)."""
+    html = page.html if html is None else html
+    lcp = find_lcp(page, html)
+    expected = expected_preload(page, lcp) if lcp is not None else None
+    issues = []
+    found = False
+    for tag, attrs in image_preloads(page, html):
+        if attrs == expected:
+            found = True
+        elif expected is None:
+            issues.append(f'image preload {attrs.get("href") or attrs.get("imagesrcset")} '
+                          f'but the LCP is text')
+        else:
+            issues.append(f'image preload {tag} does not match the LCP image {lcp.url}')
+    if expected is not None and not found:
+        issues.append(f'no preload for the LCP image {lcp.url}; expected {preload_tag(expected)}')
+    style, _block = background_style(page, lcp, html)
+    written = [m.group(0).strip('\n') for m in BACKGROUND_STYLE_RE.finditer(html)]
+    if written != ([style] if style else []):
+        issues.append(f'the background rungs of the LCP image {lcp.url} are not served by '
+                      f'media query' if style else f'<style {BACKGROUND_STYLE}> but the LCP '
+                      f'is not a background with ladder rungs')
+    if lcp is not None and lcp.kind == 'img':
+        if lcp.attrs.get('loading') == 'lazy':
+            issues.append(f'the LCP image {lcp.url} is loading="lazy"')
+        if lcp.attrs.get('fetchpriority') != 'high':
+            issues.append(f'the LCP image {lcp.url} lacks fetchpriority="high"')
+    return issues
+
+
+def page_lcp_issues(page):
+    """Return [(page, message)] for one page's LCP preload and loading."""
+    return [(page.path, message) for message in lcp_issues(page)]
+
+
+def eager(tag):
+    """An <img> tag loaded eagerly at high priority."""
+    tag = re.sub(r'\s(?:loading|fetchpriority)="\w+"', '', tag)
+    return tag.replace('<img', '<img loading="eager" fetchpriority="high"', 1)
+
+
+def remove_line(html, tag):
+    """html without tag, and without the line it leaves empty."""
+    return re.sub(r'\n[ \t]*' + re.escape(tag) + r'(?=[ \t]*\n)|' + re.escape(tag), '', html, count=1)
+
+
+def insert_preload(html, tag):
+    """html with tag after the last preload in <head>, else before its first
+    stylesheet, else at the end of <head>, on a line of its own."""
+    head_end = html.find('</head>')
+    preloads = [m for m in re.finditer(r'[ \t]*<link\b[^>]*\brel="preload"[^>]*>', html[:head_end])]
+    if preloads:
+        anchor = preloads[-1]
+        indent = re.match(r'[ \t]*', anchor.group(0)).group(0)
+        return html[:anchor.end()] + f'\n{indent}{tag}' + html[anchor.end():]
+    m = re.search(r'([ \t]*)<link\b[^>]*\brel="stylesheet"', html[:head_end])
+    if m:
+        return html[:m.start()] + f'{m.group(1)}{tag}\n' + html[m.start():]
+    return html[:head_end] + f'  {tag}\n' + html[head_end:]
+
+
+def fix(ctx, html):
+    """Pipeline hook: the page with exactly the expected image preload, an
+    eager LCP <img> and the background rungs of a background hero."""
+    page = ctx.page
+    html = BACKGROUND_STYLE_RE.sub('', html)
+    lcp = find_lcp(page, html)
+    style, block = background_style(page, lcp, html)
+    if style:
+        html = html[:block.end()] + '\n' + style + html[block.end():]
+    expected = expected_preload(page, lcp) if lcp is not None else None
+    found = False
+    for tag, attrs in image_preloads(page, html):
+        if attrs == expected and not found:
+            found = True
+        else:
+            html = remove_line(html, tag)
+    if expected is not None and not found:
+        html = insert_preload(html, preload_tag(expected))
+    if lcp is not None and lcp.kind == 'img' and (
+            lcp.attrs.get('loading') == 'lazy' or lcp.attrs.get('fetchpriority') != 'high'):
+        html = html.replace(lcp.tag, eager(lcp.tag), 1)
+    return html
+
+
+TRANSFORM = rewrite_pipeline.Transform('lcp-preload', document=fix)
+
+
+def main():
+    if '--write' in sys.argv or '--dry-run' in sys.argv:
+        changed, _notes = rewrite_pipeline.run([TRANSFORM], dry_run='--dry-run' in sys.argv)
+        verb = 'would change' if '--dry-run' in sys.argv else 'updated'
+        print(f'{len(changed)} pages {verb}')
+        return
+
+    issues = 0
+    for page in get_corpus():
+        lcp = find_lcp(page)
+        what = 'text' if lcp is None else f'{lcp.kind} {lcp.url}{" (hero)" if lcp.hero else ""}'
+        problems = lcp_issues(page)
+        print(f'{page.path:<78} {what}{"" if problems else "  OK"}')
+        for message in problems:
+            print(f'    {message}')
+        issues += len(problems)
+    print(f'\n{issues} issue(s); fix with --write')
+    sys.exit(1 if issues else 0)
+
+
+if __name__ == '__main__':
+    main()
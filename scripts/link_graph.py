@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""In-memory link graph of the site, shared by every link checker.
+
+Nodes are the pages of the shared corpus (page_corpus.py) and the assets
+they reference; edges are every href / src on a page together with the
+file it resolves to. Resolution is a set lookup against the corpus's list
+of existing files (plus the directories derived from it), so no link ever
+touches the filesystem:
+
+    from link_graph import get_link_graph
+    graph = get_link_graph()
+    graph.broken(tags=('a',))        # [Edge] that resolve to nothing
+    graph.broken_fragments()         # [Edge] whose #fragment names no id
+    graph.html_fix(page_path, href)  # 'foo.html' if 'foo' lacks the extension
+    graph.orphans()                  # pages no other page links to
+    graph.pagerank()                 # {page: score} over internal <a> links
+
+A page's edges are computed on first use, so checkers that only look at a
+few pages (run_all_checks.py --incremental) never parse the others.
+
+Run directly for a summary with orphans and the top internal PageRank:
+    python3 scripts/link_graph.py
+"""
+import os
+import threading
+from collections import namedtuple
+from urllib.parse import unquote
+
+from page_corpus import ROOT_DIR, get_corpus
+
+# Links that leave the site or never name a file
+NON_FILE_PREFIXES = ('http', '//', 'mailto:', 'tel:', 'javascript:', 'data:')
+# Fragments browsers resolve without a matching id ('' and #top scroll to top)
+IMPLICIT_FRAGMENTS = {'', 'top'}
+# Pages reachable without an inbound link (entry points)
+ENTRY_PAGES = {'index.html', '404.html'}
+
+# source: page path; tag/attr: where the URL came from; path: the normalized
+# path it points at (None for external links); target: the existing file it
+# resolves to, or None when broken; fragment: the decoded #fragment, or ''.
+Edge = namedtuple('Edge', 'source tag attr url path target fragment')
+
+
+class LinkGraph:
+    def __init__(self, corpus):
+        self.corpus = corpus
+        self.files = corpus.files
+        self.dirs = {'.'}
+        for path in self.files:
+            parent = os.path.dirname(path)
+            while parent and parent not in self.dirs:
+                self.dirs.add(parent)
+                parent = os.path.dirname(parent)
+        self._edges = {}
+        self._lock = threading.Lock()
+
+    def target_path(self, source, url):
+        """Normalized root-relative path a URL on page `source` points at
+        (the page itself for a bare #fragment), or None for external links
+        and the like."""
+        if url.startswith(NON_FILE_PREFIXES):
+            return None
+        if url.startswith('#'):
+            return source
+        path = url.split('#')[0].split('?')[0]
+        if not path:
+            return None
+        base = '' if path.startswith('/') else os.path.dirname(source)
+        return os.path.normpath(os.path.join(base, unquote(path).lstrip('/')))
+
+    def resolve(self, path):
+        """The existing file a target path is served from, else None.
+
+        A file matches as is, a directory by its index.html, and an
+        extensionless clean URL by its .html twin (news -> news.html even
+        though a news/ directory exists too).
+        """
+        if path in self.files:
+            return path
+        if path in self.dirs:
+            index = os.path.normpath(os.path.join(path, 'index.html'))
+            if index in self.files:
+                return index
+        if not path.endswith('.html') and path + '.html' in self.files:
+            return path + '.html'
+        return None
+
+    def edges_from(self, page):
+        """[Edge] for every href and src on a page, in document order per attr."""
+        edges = self._edges.get(page.path)
+        if edges is None:
+            edges = []
+            for attr, urls in (('href', page.hrefs), ('src', page.srcs)):
+                for tag, url in urls:
+                    path = self.target_path(page.path, url)
+                    target = self.resolve(path) if path is not None else None
+                    fragment = unquote(url.partition('#')[2])
+                    edges.append(Edge(page.path, tag, attr, url, path, target, fragment))
+            with self._lock:
+                self._edges[page.path] = edges
+        return edges
+
+    def edges(self):
+        for page in self.corpus:
+            yield from self.edges_from(page)
+
+    def broken(self, page=None, tags=None):
+        """Internal edges that resolve to nothing, for one page or all."""
+        edges = self.edges_from(page) if page is not None else self.edges()
+        return [e for e in edges if e.path is not None and e.target is None
+                and (tags is None or e.tag in tags)]
+
+    def ids(self, path):
+        """Fragment targets (ids and <a name>s) of the page at path."""
+        page = self.corpus.page(path)
+        return page.ids if page is not None else set()
+
+    def broken_fragments(self, page=None):
+        """<a> edges into a page whose #fragment matches no id there."""
+        edges = self.edges_from(page) if page is not None else self.edges()
+        return [e for e in edges
+                if e.tag == 'a' and e.fragment not in IMPLICIT_FRAGMENTS
+                and e.target is not None and e.target.endswith('.html')
+                and e.fragment not in self.ids(e.target)]
+
+    def assets(self):
+        """Every existing non-page file some page references."""
+        return {e.target for e in self.edges()
+                if e.target is not None and not e.target.endswith('.html')}
+
+    def html_fix(self, source, href):
+        """href + '.html' when href is a clean URL whose .html file exists
+        and that is not also a directory, else None (fix_links.py rule)."""
+        if href.startswith(NON_FILE_PREFIXES + ('#',)) or href.endswith(('/', '.html')):
+            return None
+        base = '' if href.startswith('/') else os.path.dirname(source)
+        path = os.path.normpath(os.path.join(base, href.lstrip('/')))
+        if path + '.html' in self.files and path not in self.dirs:
+            return href + '.html'
+        return None
+
+    def page_links(self):
+        """{page: set of other pages it links to with <a href>}."""
+        out = {page.path: set() for page in self.corpus}
+        for e in self.edges():
+            if e.tag == 'a' and e.target in out and e.target != e.source:
+                out[e.source].add(e.target)
+        return out
+
+    def orphans(self):
+        """Pages no other page links to (entry pages excepted)."""
+        linked = set().union(*self.page_links().values())
+        return [page.path for page in self.corpus
+                if page.path not in linked and page.path not in ENTRY_PAGES]
+
+    def pagerank(self, damping=0.85, iterations=100, tol=1e-10):
+        """Internal PageRank over <a> links; dangling pages spread evenly."""
+        links = self.page_links()
+        n = len(links)
+        if not n:
+            return {}
+        rank = dict.fromkeys(links, 1 / n)
+        for _ in range(iterations):
+            dangling = sum(rank[p] for p, out in links.items() if not out)
+            base = (1 - damping) / n + damping * dangling / n
+            new = dict.fromkeys(links, base)
+            for p, out in links.items():
+                for q in out:
+                    new[q] += damping * rank[p] / len(out)
+            delta = sum(abs(new[p] - rank[p]) for p in links)
+            rank = new
+            if delta < tol:
+                break
+        return rank
+
+
+_graphs = {}
+_graphs_lock = threading.Lock()
+
+
+def get_link_graph(root=ROOT_DIR):
+    """Process-wide shared LinkGraph for root (built on the shared corpus)."""
+    corpus = get_corpus(root)
+    with _graphs_lock:
+        if corpus.root not in _graphs:
+            _graphs[corpus.root] = LinkGraph(corpus)
+        return _graphs[corpus.root]
+
+
+if __name__ == '__main__':
+    graph = get_link_graph()
+    edges = list(graph.edges())
+    internal = [e for e in edges if e.path is not None]
+    print(f'{len(graph.corpus)} pages, {len(graph.assets())} assets, '
+          f'{len(edges)} links ({len(internal)} internal)')
+    print(f'{len(graph.broken())} broken internal link(s)')
+    print(f'{len(graph.broken_fragments())} link(s) to a missing #fragment')
+    orphans = graph.orphans()
+    print(f'\n{len(orphans)} orphan page(s):')
+    for path in orphans:
+        print(f'  {path}')
+    print('\nTop internal PageRank:')
+    ranked = sorted(graph.pagerank().items(), key=lambda kv: -kv[1])
+    for path, score in ranked[:15]:
+        print(f'  {score:.4f}  {path}')
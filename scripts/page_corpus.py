@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""Shared, memoized model of every HTML page on the site.
+
+Pages are discovered once, each file is read once, and each page is parsed
+once (lazily, on first access) by a single HTMLParser pass that collects
+everything the audit scripts look at: title, metas, links, imgs, JSON-LD,
+headings, hreflangs, fragment targets (ids) and the raw start/end tag stream
+used by the syntax check.
+
+Checkers query the model instead of walking and re-parsing the tree:
+
+    from page_corpus import get_corpus
+    for page in get_corpus():
+        print(page.path, page.title, page.meta('description'))
+
+get_corpus() is memoized per root, so every checker imported into the same
+process (run_all_checks.py, generate_report.py) shares one parse per page.
+"""
+import os
+import threading
+from html.parser import HTMLParser
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IGNORED_DIRS = {
+    '.git', '.claude', '.agent', '.agents', '.github', '.cache',
+    'node_modules', 'scripts', '__pycache__', '_site'
+}
+HEADING_TAGS = ('h1', 'h2', 'h3', 'h4', 'h5', 'h6')
+
+
+class PageModel:
+    """Everything extracted from one page by a single parse."""
+
+    def __init__(self):
+        self.title = None
+        self.metas = []       # attr dicts of every <meta>
+        self.links = []       # attr dicts of every <link>
+        self.anchors = []     # (href, line) of every <a href>
+        self.hrefs = []       # (tag, url) for every href attribute
+        self.srcs = []        # (tag, url) for every src / data-src attribute
+        self.imgs = []        # attr dicts of every <img>, plus 'line'
+        self.jsonld = []      # raw JSON-LD script bodies
+        self.headings = []    # (level, text)
+        self.hreflangs = {}   # lang -> href from <link rel="alternate">
+        self.ids = set()      # fragment targets: every id, plus <a name>
+        self.tags = []        # ('start' | 'end', tag, line)
+        self.parse_error = None
+
+
+class _PageParser(HTMLParser):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+        self._in_title = False
+        self._title = []
+        self._heading = None
+        self._jsonld = None
+
+    def handle_starttag(self, tag, attrs):
+        model = self.model
+        line = self.getpos()[0]
+        model.tags.append(('start', tag, line))
+        a = dict(attrs)
+
+        if a.get('id'):
+            model.ids.add(a['id'])
+        if tag == 'a' and a.get('name'):
+            model.ids.add(a['name'])
+        if a.get('href') is not None:
+            model.hrefs.append((tag, a['href']))
+        for name, value in attrs:
+            # src plus lazy-loading twins such as data-src
+            if value is not None and (name == 'src' or name.endswith('-src')):
+                model.srcs.append((tag, value))
+
+        if tag == 'title':
+            self._in_title = True
+        elif tag == 'meta':
+            model.metas.append(a)
+        elif tag == 'link':
+            model.links.append(a)
+            rel = (a.get('rel') or '').split()
+            if 'alternate' in rel and a.get('hreflang') and a.get('href'):
+                model.hreflangs.setdefault(a['hreflang'], a['href'])
+        elif tag == 'a' and a.get('href'):
+            model.anchors.append((a['href'], line))
+        elif tag == 'img':
+            a['line'] = line
+            model.imgs.append(a)
+        elif tag == 'script' and a.get('type') == 'application/ld+json':
+            self._jsonld = []
+        elif tag in HEADING_TAGS:
+            self._heading = (int(tag[1]), [])
+
+    def handle_endtag(self, tag):
+        self.model.tags.append(('end', tag, self.getpos()[0]))
+        if tag == 'title' and self._in_title:
+            self._in_title = False
+            if self.model.title is None:
+                self.model.title = ''.join(self._title).strip()
+        elif tag == 'script' and self._jsonld is not None:
+            self.model.jsonld.append(''.join(self._jsonld))
+            self._jsonld = None
+        elif tag in HEADING_TAGS and self._heading is not None:
+            level, text = self._heading
+            self.model.headings.append((level, ''.join(text).strip()))
+            self._heading = None
+
+    def handle_data(self, data):
+        if self._in_title:
+            self._title.append(data)
+        if self._jsonld is not None:
+            self._jsonld.append(data)
+        if self._heading is not None:
+            self._heading[1].append(data)
+
+
+class Page:
+    """One HTML page: raw text and parsed model, both loaded on first use."""
+
+    def __init__(self, root, path):
+        self.root = root
+        self.path = path  # relative to root, OS separators
+        self.abspath = os.path.join(root, path)
+        self._html = None
+        self._model = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f'Page({self.path!r})'
+
+    @property
+    def html(self):
+        if self._html is None:
+            with self._lock:
+                if self._html is None:
+                    with open(self.abspath, 'r', encoding='utf-8') as f:
+                        self._html = f.read()
+        return self._html
+
+    def update(self, html):
+        """Replace the cached text after the page was rewritten on disk; the
+        parsed model is rebuilt on next use."""
+        with self._lock:
+            self._html = html
+            self._model = None
+
+    @property
+    def model(self):
+        if self._model is None:
+            html = self.html
+            with self._lock:
+                if self._model is None:
+                    model = PageModel()
+                    try:
+                        parser = _PageParser(model)
+                        parser.feed(html)
+                        parser.close()
+                    except Exception as e:
+                        model.parse_error = str(e)
+                    self._model = model
+        return self._model
+
+    # Convenience accessors so checkers read like queries.
+    @property
+    def title(self):
+        return self.model.title
+
+    @property
+    def metas(self):
+        return self.model.metas
+
+    @property
+    def links(self):
+        return self.model.links
+
+    @property
+    def anchors(self):
+        return self.model.anchors
+
+    @property
+    def hrefs(self):
+        return self.model.hrefs
+
+    @property
+    def srcs(self):
+        return self.model.srcs
+
+    @property
+    def imgs(self):
+        return self.model.imgs
+
+    @property
+    def jsonld(self):
+        return self.model.jsonld
+
+    @property
+    def headings(self):
+        return self.model.headings
+
+    @property
+    def hreflangs(self):
+        return self.model.hreflangs
+
+    @property
+    def ids(self):
+        return self.model.ids
+
+    def meta(self, key):
+        """Content of the first <meta name=key> or <meta property=key>, else None."""
+        for m in self.model.metas:
+            if m.get('name') == key or m.get('property') == key:
+                return m.get('content')
+        return None
+
+    def link(self, rel):
+        """href of the first <link rel=...> carrying the given rel, else None."""
+        for l in self.model.links:
+            if rel in (l.get('rel') or '').split():
+                return l.get('href')
+        return None
+
+
+class Corpus:
+    """Every page under root, discovered once and sorted by path."""
+
+    def __init__(self, root=ROOT_DIR):
+        self.root = os.path.abspath(root)
+        self.pages = []
+        self.files = set()  # every non-ignored file, relative to root
+        for dirpath, dirs, files in os.walk(self.root):
+            dirs[:] = sorted(d for d in dirs if d not in IGNORED_DIRS)
+            for file in sorted(files):
+                rel = os.path.relpath(os.path.join(dirpath, file), self.root)
+                self.files.add(rel)
+                if file.endswith('.html'):
+                    self.pages.append(Page(self.root, rel))
+        self._by_path = {p.path: p for p in self.pages}
+
+    def __iter__(self):
+        return iter(self.pages)
+
+    def __len__(self):
+        return len(self.pages)
+
+    def page(self, path):
+        """The Page at a root-relative path, or None."""
+        return self._by_path.get(os.path.normpath(path))
+
+
+_corpora = {}
+_corpora_lock = threading.Lock()
+
+
+def get_corpus(root=ROOT_DIR):
+    """Process-wide shared Corpus for root."""
+    root = os.path.abspath(root)
+    with _corpora_lock:
+        if root not in _corpora:
+            _corpora[root] = Corpus(root)
+        return _corpora[root]
+
+
+if __name__ == '__main__':
+    corpus = get_corpus()
+    for page in corpus:
+        page.model
+    print(f'{len(corpus)} pages parsed under {corpus.root}')
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""Write precompressed .br and .gz siblings for every text asset of a build.
+
+Every HTML, CSS, JS, SVG, XML and TXT file under the build directory gets
+foo.css.br (brotli, quality 11, large window) and foo.css.gz (gzip -9, no
+timestamp, so output is reproducible) next to it. Hosts that serve static
+precompressed files (nginx gzip_static / brotli_static, Caddy
+precompressed, most CDNs' origin pass-through) then never compress on the
+fly. A sibling is written only when it is smaller than the file itself.
+
+Compression runs in a process pool, one job per CPU. The compressed bytes
+are cached by content hash in .cache/precompressed/ and described in
+.cache/precompressed.json, so a file whose content is unchanged since any
+earlier run is never recompressed - that includes every unchanged file of
+a freshly rebuilt _site/ (fingerprint_assets.py replaces the whole tree).
+Siblings that already hold the cached bytes are not rewritten. Every write
+goes to a temp file that is renamed into place.
+
+Prints a per-file report (original size, then gzip and brotli size and ratio),
+largest first, and the totals.
+
+Run after the build (brotli optional: without it only .gz is written):
+    python3 scripts/fingerprint_assets.py
+    python3 scripts/precompress.py [BUILD_DIR]      (default: _site)
+"""
+import gzip
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import brotli
+except ImportError:  # only .gz siblings without the brotli module
+    brotli = None
+
+from file_io import file_sha256, write_atomic, write_json
+from page_corpus import ROOT_DIR
+
+BUILD_DIR = os.path.join(ROOT_DIR, '_site')
+CACHE_DIR = os.path.join(ROOT_DIR, '.cache', 'precompressed')
+MANIFEST_PATH = os.path.join(ROOT_DIR, '.cache', 'precompressed.json')
+TEXT_EXTS = ('.html', '.css', '.js', '.mjs', '.svg', '.xml', '.txt')
+ENCODINGS = ('gz', 'br')
+MAX_JOBS = os.cpu_count() or 1
+
+
+def load_manifest():
+    try:
+        with open(MANIFEST_PATH, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(manifest):
+    write_json(MANIFEST_PATH, manifest, indent=1, sort_keys=True)
+
+
+def text_files(build_dir):
+    """Relative paths of every text asset under build_dir (hidden dirs skipped)."""
+    out = []
+    for dirpath, dirs, files in os.walk(build_dir):
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+        out += [os.path.relpath(os.path.join(dirpath, f), build_dir)
+                for f in sorted(files) if f.lower().endswith(TEXT_EXTS)]
+    return out
+
+
+def blob_path(sha, encoding):
+    return os.path.join(CACHE_DIR, sha[:2], f'{sha}.{encoding}')
+
+
+def compress(path, sha):
+    """Compress one file into the blob cache; returns (sha, {encoding: size
+    or None when it would not be smaller})."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    encoded = {'gz': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        encoded['br'] = brotli.compress(data, mode=brotli.MODE_TEXT, quality=11, lgwin=24)
+    sizes = {}
+    for encoding, blob in encoded.items():
+        if len(blob) < len(data):
+            write_atomic(blob_path(sha, encoding), blob)
+            sizes[encoding] = len(blob)
+        else:
+            sizes[encoding] = None
+    return sha, sizes
+
+
+def cached(entry, sha):
+    """True when the manifest entry covers every encoding we can produce and
+    its blobs are still on disk."""
+    if entry is None:
+        return False
+    for encoding in ENCODINGS:
+        if encoding == 'br' and brotli is None:
+            continue
+        if encoding not in entry:
+            return False
+        if entry[encoding] is not None and not os.path.exists(blob_path(sha, encoding)):
+            return False
+    return True
+
+
+def install(build_dir, path, sha, entry):
+    """Place the cached siblings of path; returns how many were (re)written."""
+    written = 0
+    for encoding in ENCODINGS:
+        sibling = os.path.join(build_dir, f'{path}.{encoding}')
+        size = entry.get(encoding)
+        if size is None:
+            if os.path.exists(sibling):
+                os.unlink(sibling)  # stale: the file no longer compresses
+            continue
+        with open(blob_path(sha, encoding), 'rb') as f:
+            blob = f.read()
+        if os.path.exists(sibling) and os.path.getsize(sibling) == size:
+            with open(sibling, 'rb') as f:
+                if f.read() == blob:
+                    continue
+        write_atomic(sibling, blob)
+        written += 1
+    return written
+
+
+def prune_cache(manifest):
+    """Drop blobs no manifest entry refers to."""
+    keep = {f'{sha}.{encoding}' for sha, entry in manifest.items()
+            for encoding in ENCODINGS if entry.get(encoding) is not None}
+    for dirpath, _dirs, files in os.walk(CACHE_DIR):
+        for file in files:
+            if file not in keep:
+                os.unlink(os.path.join(dirpath, file))
+
+
+def column(size, original):
+    """'12,345  31.2%' for a compressed size, '-' when there is none."""
+    if size is None:
+        return f'{"-":>17}'
+    return f'{size:>10,} {size / original:6.1%}'
+
+
+def precompress(build_dir=BUILD_DIR):
+    if not os.path.isdir(build_dir):
+        print(f'ERROR: {build_dir} does not exist; build it first '
+              f'(python3 scripts/fingerprint_assets.py) or pass a directory')
+        return 1
+    if brotli is None:
+        print('WARNING: brotli is not installed (pip3 install --user brotli); writing .gz only')
+
+    manifest = load_manifest()
+    files = text_files(build_dir)
+    hashes = {path: file_sha256(os.path.join(build_dir, path)) for path in files}
+    jobs = [sha for sha in set(hashes.values()) if not cached(manifest.get(sha), sha)]
+    print(f'{len(files)} text file(s), {len(jobs)} to compress with up to '
+          f'{MAX_JOBS} parallel job(s)')
+
+    # Largest first so the slow brotli jobs start early
+    by_sha = {sha: path for path, sha in hashes.items()}
+    jobs.sort(key=lambda sha: -os.path.getsize(os.path.join(build_dir, by_sha[sha])))
+    with ProcessPoolExecutor(max_workers=MAX_JOBS) as pool:
+        for sha, sizes in pool.map(compress, [os.path.join(build_dir, by_sha[sha]) for sha in jobs], jobs):
+            manifest[sha] = {'size': os.path.getsize(os.path.join(build_dir, by_sha[sha])), **sizes}
+
+    written = 0
+    rows = []
+    for path in files:
+        sha = hashes[path]
+        entry = manifest[sha]
+        written += install(build_dir, path, sha, entry)
+        rows.append((entry['size'], entry.get('gz'), entry.get('br'), path))
+
+    # Keep only what this build uses, so the cache does not grow without bound
+    manifest = {sha: manifest[sha] for sha in set(hashes.values())}
+    save_manifest(manifest)
+    prune_cache(manifest)
+
+    print(f'{"original":>10} {"gzip":>17} {"brotli":>17}  file')
+    for size, gz, br, path in sorted(rows, key=lambda r: (-r[0], r[3])):
+        print(f'{size:>10,} {column(gz, size)} {column(br, size)}  {path}')
+    total = sum(r[0] for r in rows)
+    total_gz = sum(r[1] if r[1] is not None else r[0] for r in rows)
+    total_br = (sum(r[2] if r[2] is not None else r[0] for r in rows)
+                if any(r[2] is not None for r in rows) else None)
+    print(f'{total:>10,} {column(total_gz, total)} {column(total_br, total)}  total')
+    fresh = sum(1 for path in files if hashes[path] in jobs)
+    print(f'{fresh} file(s) compressed, {len(files) - fresh} from cache, '
+          f'{written} sibling(s) written -> {build_dir}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(precompress(sys.argv[1] if len(sys.argv) > 1 else BUILD_DIR))
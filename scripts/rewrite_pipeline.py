@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""Single-pass HTML rewrite pipeline shared by the fixer scripts.
+
+Each fixer exposes its rewrite as a Transform instead of walking the tree
+and writing files itself:
+
+    Transform('responsive-images', tags=('img',), tag=rewrite_tag)  # per tag
+    Transform('social-meta', document=sync_head)                     # whole page
+
+For every page (read once, through the shared corpus) the pipeline
+tokenizes the HTML once, hands each start tag to the tag transforms that
+registered for it, in chain order (raw-text elements such as <script> are
+skipped), then runs the document transforms on the result, in chain order.
+A page is written only if it changed, and atomically (temp file in the same
+directory + rename), so an interrupted run never leaves a half-written page. --dry-run prints a unified diff instead of writing.
+
+The default chain is the site's normalization suite, one read and at most
+one write per page:
+
+    python3 scripts/rewrite_pipeline.py [--dry-run] [--check] [--only=hreflang]
+
+The suite is idempotent: a second run changes nothing. --check verifies
+that without writing (each page is rewritten twice in memory) and exits 1
+listing the pages whose second pass still differs. run_all_checks.py
+requires more: every committed page must already be a fixed point.
+
+Transforms, in chain order:
+    responsive-images   apply_responsive_images.py
+    lcp-preload         lcp_preload.py
+    social-meta         sync_social_meta.py
+    hreflang            inject_hreflangs.py
+Each script still runs on its own (same pipeline, its transform only).
+fix_links.py (pages/about -> about.html) is not part of the suite: the site
+links to clean URLs, so it only runs on its own, on request.
+"""
+import difflib
+import importlib
+import re
+import sys
+import threading
+
+from file_io import write_atomic
+from page_corpus import ROOT_DIR, get_corpus
+
+# name -> module exposing TRANSFORM, in the order the suite applies them
+CHAIN = (
+    ('responsive-images', 'apply_responsive_images'),
+    ('lcp-preload', 'lcp_preload'),
+    ('social-meta', 'sync_social_meta'),
+    ('hreflang', 'inject_hreflangs'),
+)
+
+TOKEN_RE = re.compile(r'<!--.*?-->|<(/?)([a-zA-Z][\w:-]*)\b[^>]*>', re.S)
+# Elements whose content is text, not markup (a '<' in a script is not a tag)
+RAW_TEXT = {'script', 'style', 'textarea', 'title'}
+VOID = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link',
+        'meta', 'param', 'source', 'track', 'wbr'}
+ATTR_RE = re.compile(r'''\s([\w:-]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+)))?''')
+
+
+def attributes(tag):
+    """{name: value} of a start tag's attributes; valueless ones map to ''."""
+    body = tag[tag.find(' '):] if ' ' in tag else ''
+    return {m.group(1).lower(): next((v for v in m.group(2, 3, 4) if v is not None), '')
+            for m in ATTR_RE.finditer(body.rstrip('/>'))}
+
+
+class Transform:
+    """A named rewrite step.
+
+    tag(ctx, text) -> text is called for each start tag whose name is in
+    tags ('*' for every tag); document(ctx, html) -> html runs once per page
+    after the tag pass. Either may be omitted.
+    """
+
+    def __init__(self, name, tags=(), tag=None, document=None):
+        self.name = name
+        self.tags = set(tags)
+        self.tag = tag
+        self.document = document
+
+    def __repr__(self):
+        return f'Transform({self.name!r})'
+
+
+class Context:
+    """What a transform knows about the page being rewritten."""
+
+    def __init__(self, page):
+        self.page = page
+        self.path = page.path
+        self.open = []    # names of the elements enclosing the current tag
+        self.open_tags = []  # their start tags, as written
+        self.notes = []   # messages for the run summary
+        self.html = None  # the content this pass rewrites (page.html unless standing in)
+        self.state = {}   # per-page values a transform computes once and reuses
+
+    def inside(self, tag):
+        return tag in self.open
+
+    def note(self, message):
+        self.notes.append(message)
+
+
+class Pipeline:
+    def __init__(self, transforms):
+        self.transforms = list(transforms)
+        self._handlers = {}
+
+    def handlers(self, name):
+        """Tag transforms for a tag name, in chain order (memoized)."""
+        if name not in self._handlers:
+            self._handlers[name] = [t for t in self.transforms if t.tag is not None
+                                    and ('*' in t.tags or name in t.tags)]
+        return self._handlers[name]
+
+    def _tag_pass(self, ctx, html):
+        out, pos, i = [], 0, 0
+        while True:
+            m = TOKEN_RE.search(html, i)
+            if m is None:
+                break
+            i = m.end()
+            closing, name = m.group(1), (m.group(2) or '').lower()
+            if not name:
+                continue  # comment
+            if closing:
+                if name in ctx.open:
+                    at = len(ctx.open) - 1 - ctx.open[::-1].index(name)
+                    del ctx.open[at:], ctx.open_tags[at:]
+                continue
+            text = m.group(0)
+            for transform in self.handlers(name):
+                text = transform.tag(ctx, text)
+            if text != m.group(0):
+                out.append(html[pos:m.start()])
+                out.append(text)
+                pos = m.end()
+            if name in RAW_TEXT:
+                end = re.compile(r'</%s\s*>' % name, re.I).search(html, i)
+                i = end.end() if end else len(html)
+            elif name not in VOID and not m.group(0).endswith('/>'):
+                ctx.open.append(name)
+                ctx.open_tags.append(m.group(0))
+        out.append(html[pos:])
+        return ''.join(out)
+
+    def rewrite(self, page, html=None):
+        """(new html, Context) for a page, or for html standing in for its
+        content; the page itself is not touched."""
+        ctx = Context(page)
+        html = page.html if html is None else html
+        ctx.html = html
+        if any(t.tag is not None for t in self.transforms):
+            html = self._tag_pass(ctx, html)
+        for transform in self.transforms:
+            if transform.document is not None:
+                html = transform.document(ctx, html)
+        return html, ctx
+
+
+def run(transforms, pages=None, dry_run=False, root=ROOT_DIR):
+    """Rewrite pages (default: the whole corpus); returns (changed paths,
+    notes). With dry_run, print a diff per changed page instead."""
+    pipeline = Pipeline(transforms)
+    changed, notes = [], []
+    for page in pages if pages is not None else get_corpus(root):
+        html, ctx = pipeline.rewrite(page)
+        notes.extend(ctx.notes)
+        if html == page.html:
+            continue
+        changed.append(page.path)
+        if dry_run:
+            sys.stdout.writelines(difflib.unified_diff(
+                page.html.splitlines(keepends=True), html.splitlines(keepends=True),
+                fromfile=f'a/{page.path}', tofile=f'b/{page.path}'))
+        else:
+            write_atomic(page.abspath, html)
+            page.update(html)
+    return changed, notes
+
+
+def unstable(transforms, pages=None, root=ROOT_DIR):
+    """Paths of the pages a second pass of transforms would change again.
+    Both passes run in memory; nothing is written."""
+    pipeline = Pipeline(transforms)
+    out = []
+    for page in pages if pages is not None else get_corpus(root):
+        once, _ctx = pipeline.rewrite(page)
+        twice, _ctx = pipeline.rewrite(page, once)
+        if twice != once:
+            out.append(page.path)
+    return out
+
+
+_suite = None
+_suite_lock = threading.Lock()
+
+
+def page_idempotency_issues(page):
+    """Return [(page, message)] unless the page is a fixed point of the
+    default suite: as committed, a run of the suite leaves it unchanged."""
+    global _suite
+    with _suite_lock:
+        if _suite is None:
+            _suite = Pipeline(load_chain())
+    once, _ctx = _suite.rewrite(page)
+    if once == page.html:
+        return []
+    twice, _ctx = _suite.rewrite(page, once)
+    if twice != once:
+        return [(page.path, 'the rewrite suite is not idempotent here: '
+                            'a second run changes the page again')]
+    return [(page.path, 'the rewrite suite would change the page; '
+                        'run python3 scripts/rewrite_pipeline.py')]
+
+
+def load_chain(names=None):
+    """The registered transforms (all, or those named), in chain order."""
+    out = []
+    for name, module in CHAIN:
+        if names is None or name in names:
+            out.append(importlib.import_module(module).TRANSFORM)
+    return out
+
+
+def main():
+    dry_run = '--dry-run' in sys.argv
+    names = None
+    for arg in sys.argv[1:]:
+        if arg.startswith('--only='):
+            names = set(arg.split('=', 1)[1].split(','))
+            unknown = names - {name for name, _ in CHAIN}
+            if unknown:
+                print(f'ERROR: unknown transform(s): {", ".join(sorted(unknown))}')
+                sys.exit(1)
+    transforms = load_chain(names)
+    hooks = [importlib.import_module(module) for name, module in CHAIN
+             if names is None or name in names]
+    for module in hooks:
+        if hasattr(module, 'before_run'):
+            module.before_run()
+    if '--check' in sys.argv:
+        paths = unstable(transforms)
+        for path in paths:
+            print(f'{path}: changes again on a second run')
+        print(f'{", ".join(t.name for t in transforms)}: '
+              f'{len(paths)} page(s) not idempotent')
+        sys.exit(1 if paths else 0)
+    changed, notes = run(transforms, dry_run=dry_run)
+    for module in hooks:
+        if hasattr(module, 'after_run'):
+            module.after_run()
+    for note in notes:
+        print(note)
+    verb = 'would change' if dry_run else 'updated'
+    print(f'{", ".join(t.name for t in transforms)}: {len(changed)} page(s) {verb}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,103 +1,299 @@
 #!/usr/bin/env python3
 """Master site gate: runs every checker and fails (exit 1) on any violation.
 
-Absorbs the single-purpose audit scripts by matching their success markers,
-and adds repo-wide invariant checks (CSP presence, speculation rules presence,
-theme-color presence, sitemap validity/coverage, duplicate titles).
+Absorbs the single-purpose audit scripts by importing their per-page check
+functions (each returns a list of (page, message) issues) and running them
+in-process on a thread pool, and adds repo-wide invariant checks (CSP
+presence, speculation rules presence, theme-color presence, sitemap
+validity/coverage, duplicate titles). All checks query the shared page corpus
+(page_corpus.py), so every page is read and parsed once per run.
+
+Cross-page checks (hreflang reciprocity, #fragment targets, duplicate
+titles, sitemap coverage) run on small per-page facts rather than on the
+pages themselves.
+
+Every page must also be a fixed point of the rewrite suite
+(rewrite_pipeline.py): running the normalizers on the committed tree
+changes nothing.
+
+Page-weight budgets (audit_budget.py, limits in scripts/budgets.json) depend
+on the size of every asset a page loads, not on the page alone, so they are
+re-measured on every run, also with --incremental. So are the checks that
+read other files than the page: the LCP preload check and the rewrite-suite
+fixed point (the images) and the inlined-CSS check (the stylesheets).
 
 Run from the repo root:  python3 scripts/run_all_checks.py
+
+With --incremental, per-page verdicts and facts are kept in an on-disk cache
+(see check_cache.py). Unchanged pages are not parsed again; their cached
+verdicts are replayed, and only hreflang edges touching a changed page are
+re-checked. Any edit to a checker invalidates the whole cache.
 """
-import glob
-import re
-import subprocess
+import gzip
+import os
 import sys
 import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-FAILURES = []
+import apply_responsive_images
+import audit_budget
+import audit_hreflang
+import audit_links
+import audit_og
+import audit_schema
+import check_cache
+import check_html_syntax
+import inject_hreflangs
+import inline_critical_css
+import lcp_preload
+import link_graph
+import page_corpus
+import rewrite_pipeline
+import sync_social_meta
+from page_corpus import get_corpus
 
-# ---- absorbed checkers: (script, success marker in stdout) ----
-CHECKERS = [
-    ('scripts/check_html_syntax.py', 'No syntax errors'),
-    ('scripts/audit_links.py', 'No broken relative links'),
-    ('scripts/audit_schema.py', 'valid JSON'),
-    ('scripts/audit_hreflang.py', 'perfectly reciprocal'),
-    ('scripts/audit_og.py', 'consistent and valid'),
+# ---- absorbed checkers, in report order ----
+HREFLANG_SCRIPT = 'scripts/audit_hreflang.py'
+LINKS_SCRIPT = 'scripts/audit_links.py'
+BUDGET_SCRIPT = 'scripts/audit_budget.py'
+ABSORBED = [
+    'scripts/check_html_syntax.py',
+    LINKS_SCRIPT,
+    'scripts/audit_schema.py',
+    HREFLANG_SCRIPT,
+    'scripts/audit_og.py',
+    'scripts/lcp_preload.py',
+    'scripts/rewrite_pipeline.py',
+    'scripts/inline_critical_css.py',
+    BUDGET_SCRIPT,
+]
+# Checkers whose verdict depends only on the page itself (links also on
+# which files exist): script -> function(page) returning [(page, message)]
+PAGE_CHECKERS = {
+    'scripts/check_html_syntax.py': check_html_syntax.page_syntax_errors,
+    LINKS_SCRIPT: audit_links.page_broken_links,
+    'scripts/audit_schema.py': audit_schema.page_schema_issues,
+    'scripts/audit_og.py': audit_og.page_og_issues,
+}
+# Per-page checkers that also read files the cache key does not cover (the
+# images under images/: dimensions, which ladder rungs exist, placeholders;
+# the stylesheets the critical CSS is cut from), so a cached verdict could
+# be stale; they run on every page on every run, also with --incremental.
+ASSET_CHECKERS = {
+    'scripts/lcp_preload.py': lcp_preload.page_lcp_issues,
+    'scripts/rewrite_pipeline.py': rewrite_pipeline.page_idempotency_issues,
+    'scripts/inline_critical_css.py': inline_critical_css.page_css_issues,
+}
+# Everything whose source affects a verdict; part of the cache key together
+# with every scripts/ module these import (check_cache.source_files).
+CHECKER_MODULES = [
+    sys.modules[__name__], page_corpus, link_graph, check_html_syntax, audit_links,
+    audit_schema, audit_hreflang, audit_og, lcp_preload, apply_responsive_images,
+    rewrite_pipeline, sync_social_meta, inject_hreflangs,
 ]
 
 
-def pages():
-    return (glob.glob('*.html') + glob.glob('it/*.html')
-            + glob.glob('news/*.html') + glob.glob('it/news/*.html'))
+def check_page_invariants(page):
+    failures = []
+    html = page.html
+    checks = {
+        'CSP meta': 'http-equiv="Content-Security-Policy"' in html,
+        'speculation rules': 'type="speculationrules"' in html,
+        'theme-color': 'name="theme-color"' in html,
+        'single canonical or noindex': (
+            html.count('rel="canonical"') == 1 or 'noindex' in html),
+    }
+    for name, ok in checks.items():
+        if not ok:
+            failures.append(f'{page.path}: missing {name}')
+    # exactly one CSP meta
+    if html.count('http-equiv="Content-Security-Policy"') > 1:
+        failures.append(f'{page.path}: more than one CSP meta')
+    return failures
 
 
-def run_absorbed_checkers():
-    for script, marker in CHECKERS:
-        proc = subprocess.run([sys.executable, script], capture_output=True, text=True)
-        if marker not in proc.stdout:
-            FAILURES.append(f'{script}: success marker "{marker}" not found')
-            print(proc.stdout[-1500:])
+def asset_verdicts(page):
+    return {script: [list(i) for i in fn(page)] for script, fn in ASSET_CHECKERS.items()}
 
 
-def check_per_page_invariants():
-    for page in pages():
-        html = open(page).read()
-        checks = {
-            'CSP meta': 'http-equiv="Content-Security-Policy"' in html,
-            'speculation rules': 'type="speculationrules"' in html,
-            'theme-color': 'name="theme-color"' in html,
-            'single canonical or noindex': (
-                html.count('rel="canonical"') == 1 or 'noindex' in html),
-        }
-        for name, ok in checks.items():
-            if not ok:
-                FAILURES.append(f'{page}: missing {name}')
-        # exactly one CSP meta
-        if html.count('http-equiv="Content-Security-Policy"') > 1:
-            FAILURES.append(f'{page}: more than one CSP meta')
+def audit_page(page):
+    """Everything the gate needs from one page, in JSON-serializable form."""
+    return {
+        'facts': {
+            'title': page.title,
+            'noindex': 'noindex' in page.html,
+            'hreflangs': page.hreflangs,
+            'ids': sorted(page.ids),
+            'fragment_links': audit_links.page_fragment_links(page),
+        },
+        'verdicts': {script: [list(i) for i in fn(page)]
+                     for script, fn in PAGE_CHECKERS.items()},
+        'invariants': check_page_invariants(page),
+    }
 
 
-def check_titles_unique():
+def check_hreflang_edges(facts, hashes, cache=None):
+    """EN -> IT reciprocity per edge; returns (issues, {edge: cache entry})."""
+    issues, edges = [], {}
+    for path, page_facts in facts.items():
+        if os.sep in path:
+            continue  # EN pages live in the repo root
+        it_url = page_facts['hreflangs'].get('it')
+        if it_url is None:
+            continue
+        it_path = audit_hreflang.it_file_for(it_url)
+        key = f'{hashes[path]}:{hashes.get(it_path, "-")}'
+        edge_issues = cache.edge(path, key) if cache is not None else None
+        if edge_issues is None:
+            it_facts = facts.get(it_path)
+            edge_issues = [list(i) for i in audit_hreflang.check_pair(
+                path, it_url, it_facts['hreflangs'] if it_facts else None)]
+        edges[path] = {'key': key, 'issues': edge_issues}
+        issues.extend(edge_issues)
+    return issues, edges
+
+
+def check_titles_unique(facts):
+    failures = []
     seen = {}
-    for page in pages():
-        m = re.search(r'<title>(.*?)</title>', open(page).read(), re.S)
-        if not m:
-            FAILURES.append(f'{page}: missing <title>')
+    for path, page_facts in facts.items():
+        t = page_facts['title']
+        if t is None:
+            failures.append(f'{path}: missing <title>')
             continue
-        t = m.group(1).strip()
         if t in seen:
-            FAILURES.append(f'duplicate title in {page} and {seen[t]}: "{t[:60]}"')
-        seen[t] = page
+            failures.append(f'duplicate title in {path} and {seen[t]}: "{t[:60]}"')
+        seen[t] = path
+    return failures
 
 
-def check_sitemap():
+SITEMAP_NS = {'sm': 'http://www.sitemaps.org/schemas/sitemap/0.9'}
+SITE_URL = 'https://milanosensualcongress.com'
+
+
+def sitemap_locs(path):
+    """(<loc>s of every <url>, failures) for a sitemap, .xml or .xml.gz."""
     try:
-        tree = ET.parse('sitemap.xml')
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rb') as f:
+            tree = ET.parse(f)
     except ET.ParseError as e:
-        FAILURES.append(f'sitemap.xml: XML parse error {e}')
-        return
-    ns = {'sm': 'http://www.sitemaps.org/schemas/sitemap/0.9'}
-    locs = {u.findtext('sm:loc', namespaces=ns) for u in tree.getroot().findall('sm:url', ns)}
+        return set(), [f'{path}: XML parse error {e}']
+    except OSError as e:
+        return set(), [f'{path}: unreadable ({e.strerror})']
+    urls = tree.getroot().findall('sm:url', SITEMAP_NS)
+    return {u.findtext('sm:loc', namespaces=SITEMAP_NS) for u in urls}, []
+
+
+def check_sitemap(facts):
+    locs, failures = sitemap_locs('sitemap.xml')
+    if failures:
+        return failures
+    # shards listed in an optional sitemap index count towards coverage too
+    if os.path.exists('sitemap_index.xml'):
+        shard_urls, failures = set(), []
+        try:
+            index = ET.parse('sitemap_index.xml').getroot()
+            shard_urls = {s.findtext('sm:loc', namespaces=SITEMAP_NS)
+                          for s in index.findall('sm:sitemap', SITEMAP_NS)}
+        except ET.ParseError as e:
+            failures.append(f'sitemap_index.xml: XML parse error {e}')
+        for url in sorted(shard_urls):
+            shard = (url or '')[len(SITE_URL) + 1:]
+            if not (url or '').startswith(SITE_URL + '/') or not os.path.exists(shard):
+                failures.append(f'sitemap_index.xml: missing shard {url}')
+                continue
+            shard_locs, shard_failures = sitemap_locs(shard)
+            locs |= shard_locs
+            failures += shard_failures
     # every indexable page must be in the sitemap
-    for page in pages():
-        html = open(page).read()
-        if 'noindex' in html:
+    for path, page_facts in facts.items():
+        if page_facts['noindex']:
             continue
-        path = '/' + page[:-5]
+        path = '/' + path.replace(os.sep, '/')[:-5]
         if path.endswith('/index'):
             path = path[:-5]
-        url = 'https://milanosensualcongress.com' + path
+        url = SITE_URL + path
         if url not in locs and url.rstrip('/') not in locs:
-            FAILURES.append(f'sitemap.xml: missing indexable page {url}')
+            failures.append(f'sitemap.xml: missing indexable page {url}')
+    return failures
+
+
+def report_absorbed(script, issues):
+    if not issues:
+        return []
+    for page, message in issues[:20]:
+        print(f'{script}: {page}: {message}')
+    return [f'{script}: {len(issues)} issue(s) found']
+
+
+def run_checks(corpus, cache=None):
+    """Return the gate's failure list, reusing cached verdicts when given a cache."""
+    hashes = {page.path: check_cache.sha256_text(page.html) for page in corpus}
+    files_key = check_cache.files_fingerprint(corpus.files)
+
+    results, stale, relink = {}, [], []
+    for page in corpus:
+        entry = cache.page(page.path, hashes[page.path]) if cache is not None else None
+        if entry is None:
+            stale.append(page)
+            continue
+        results[page.path] = entry
+        if entry['files'] != files_key:
+            relink.append(page)  # a file appeared or vanished: links only
+
+    with ThreadPoolExecutor() as pool:
+        for page, result in zip(stale, pool.map(audit_page, stale)):
+            results[page.path] = result
+        for page, issues in zip(relink, pool.map(audit_links.page_broken_links, relink)):
+            results[page.path]['verdicts'][LINKS_SCRIPT] = [list(i) for i in issues]
+        asset_results = dict(zip((page.path for page in corpus),
+                                 pool.map(asset_verdicts, corpus)))
+    for page in corpus:
+        results[page.path].update(sha256=hashes[page.path], files=files_key)
+
+    facts = {page.path: results[page.path]['facts'] for page in corpus}
+    absorbed = {script: [] for script in ABSORBED}
+    for page in corpus:
+        for script, issues in results[page.path]['verdicts'].items():
+            absorbed[script].extend(issues)
+        for script, issues in asset_results[page.path].items():
+            absorbed[script].extend(issues)
+    absorbed[HREFLANG_SCRIPT], edges = check_hreflang_edges(facts, hashes, cache)
+    # #fragment targets: a set lookup per link against every page's cached ids
+    absorbed[LINKS_SCRIPT] += [list(i) for i in audit_links.check_fragments(
+        {path: f['fragment_links'] for path, f in facts.items()},
+        {path: set(f['ids']) for path, f in facts.items()},
+        link_graph.get_link_graph(corpus.root).resolve)]
+    # never cached: a page's weight changes with the assets it loads
+    templates = audit_budget.load_budgets()
+    absorbed[BUDGET_SCRIPT] = [list(i) for page in corpus
+                               for i in audit_budget.page_budget_issues(page, templates)]
+
+    failures = []
+    for script in ABSORBED:
+        failures += report_absorbed(script, absorbed[script])
+    for page in corpus:
+        failures += results[page.path]['invariants']
+    failures += check_titles_unique(facts)
+    failures += check_sitemap(facts)
+
+    if cache is not None:
+        cache.save(results, edges)
+        print(f'incremental: {len(stale)} of {len(corpus)} page(s) re-audited')
+    return failures
 
 
 def main():
-    run_absorbed_checkers()
-    check_per_page_invariants()
-    check_titles_unique()
-    check_sitemap()
-    if FAILURES:
-        print(f'\nFAILED: {len(FAILURES)} violation(s)')
-        for f in FAILURES:
+    cache = None
+    if '--incremental' in sys.argv[1:]:
+        cache = check_cache.CheckCache(check_cache.code_fingerprint(CHECKER_MODULES))
+    failures = run_checks(get_corpus(), cache)
+    if failures:
+        print(f'\nFAILED: {len(failures)} violation(s)')
+        for f in failures:
             print(' -', f)
         sys.exit(1)
     print('OK: all site checks passed')
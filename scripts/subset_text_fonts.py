@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""Subset the self-hosted text fonts to the characters the site renders.
+
+Google's latin / latin-ext splits of Inter and Playfair Display cover far
+more than the EN and IT pages ever show. This script:
+
+1. walks the body text of every page (plus placeholders and button values)
+   and works out, from the page's own CSS, which face renders each text
+   node: Inter, Playfair Display or Playfair Display italic. font-family
+   and font-style are resolved with a small cascade (selector specificity,
+   source order, inheritance, var(--x), inline style="", and the UA's
+   italic <em>/<i>); text-transform is covered by adding both cases;
+2. adds printable ASCII and any non-ASCII characters in page scripts, so
+   text injected later or a small copy edit does not fall back to a system
+   font;
+3. subsets each pristine font in fonts/src/ (source only, left out of the
+   fingerprint_assets.py build) with fontTools (variable axes
+   and the default OpenType features kept) to fonts/<same name>.woff2, and
+   regenerates css/fonts.css with a unicode-range listing exactly the
+   characters each file carries. The characters of SAFETY_TEXT (the rest of
+   Latin-1, typographic punctuation) that no page renders go to a separate
+   fonts/<name>-supplement.woff2: the pages preload only the main file, and
+   the browser fetches the supplement only for text that needs it. A file
+   left with no characters is dropped;
+4. refreshes the inlined copies of fonts.css (inline_critical_css.py).
+
+File names are unchanged, so the <link rel="preload"> tags stay valid.
+Re-run after adding text in a new script or language:
+
+    python3 scripts/subset_text_fonts.py [--dry-run]
+
+--dry-run prints the character counts and estimated sizes without writing.
+
+Requires: fonttools, brotli  (pip3 install --user fonttools brotli)
+"""
+import io
+import os
+import re
+import sys
+from html.parser import HTMLParser
+
+try:
+    from fontTools import subset as ft_subset
+    from fontTools.ttLib import TTFont
+except ImportError:
+    ft_subset = None
+
+import inline_critical_css
+from css_rules import parse, selector_requirements, split_selectors
+from page_corpus import ROOT_DIR, get_corpus
+
+SRC_DIR = os.path.join(ROOT_DIR, 'fonts', 'src')
+OUT_DIR = os.path.join(ROOT_DIR, 'fonts')
+FONTS_CSS = os.path.join(ROOT_DIR, 'css', 'fonts.css')
+
+# (family, style, weight range, file) in css/fonts.css order. Earlier files
+# of a face win characters that several files carry.
+FACES = [
+    ('Inter', 'normal', '100 900', 'inter-latin.woff2'),
+    ('Inter', 'normal', '100 900', 'inter-latin-ext.woff2'),
+    ('Playfair Display', 'italic', '400 900', 'playfair-display-italic-latin.woff2'),
+    ('Playfair Display', 'italic', '400 900', 'playfair-display-italic-latin-ext.woff2'),
+    ('Playfair Display', 'normal', '400 900', 'playfair-display-latin.woff2'),
+    ('Playfair Display', 'normal', '400 900', 'playfair-display-latin-ext.woff2'),
+]
+CSS_HEADER = ('/* Self-hosted variable fonts (formerly Google Fonts), subset to the characters '
+              'the site uses by scripts/subset_text_fonts.py. */\n')
+
+# Always in the preloaded files: printable ASCII
+BASE_TEXT = ''.join(map(chr, range(0x20, 0x7F)))
+# Always kept, in the supplement files unless a page renders them: all of
+# Latin-1 (NBSP, Italian accents and the ä/ñ/ç/ß of names) and the
+# typographic punctuation of EN / IT copy
+SAFETY_TEXT = ''.join(map(chr, range(0xA0, 0x100))) + '‘’“”–—…€'
+SUPPLEMENT_SUFFIX = '-supplement'
+
+# Elements whose text is not rendered with the page fonts
+SKIP_TEXT = {'script', 'style', 'template', 'title', 'head', 'svg', 'textarea'}
+VOID = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link',
+        'meta', 'param', 'source', 'track', 'wbr'}
+UA_CSS = 'em,i,cite,var,dfn,address{font-style:italic}'
+FONT_PROPS = ('font-family', 'font-style', 'font')
+COMBINATOR_RE = re.compile(r'\s*[>+~]\s*|\s+')
+VAR_RE = re.compile(r'var\(\s*(--[\w-]+)\s*(?:,([^)]*))?\)')
+
+
+def declarations(body):
+    """{property: value} of a declaration block (last one wins)."""
+    out = {}
+    for decl in body.split(';'):
+        prop, sep, value = decl.partition(':')
+        if sep:
+            out[prop.strip().lower()] = value.replace('!important', '').strip()
+    return out
+
+
+class FontCascade:
+    """font-family / font-style rules of one page, ready for matching."""
+
+    def __init__(self, css_texts):
+        self.rules = []      # (specificity, order, compounds, {prop: value})
+        self.variables = {}
+        order = 0
+        for text in [UA_CSS] + css_texts:
+            for rule in self._flatten(parse(text)):
+                decls = declarations(rule.body)
+                for prop, value in decls.items():
+                    if prop.startswith('--'):
+                        self.variables[prop] = value
+                font = {p: v for p, v in decls.items() if p in FONT_PROPS}
+                if not font:
+                    continue
+                for selector in split_selectors(rule.prelude):
+                    if '::' in selector or re.search(r':(?:before|after)\b', selector):
+                        continue  # generated content, not page text
+                    classes, ids, types = selector_requirements(selector)
+                    specificity = (len(ids), len(classes), len(types))
+                    compounds = [selector_requirements(c)
+                                 for c in COMBINATOR_RE.split(selector.strip()) if c]
+                    order += 1
+                    self.rules.append((specificity, order, compounds, font))
+        self.rules.sort(key=lambda r: (r[0], r[1]))
+
+    def _flatten(self, rules):
+        for rule in rules:
+            if rule.children is not None:
+                yield from self._flatten(rule.children)  # any @media may apply
+            elif not rule.is_at_rule and rule.body is not None:
+                yield rule
+
+    @staticmethod
+    def _matches_compound(compound, element):
+        classes, ids, types = compound
+        tag, el_classes, el_id = element
+        return (classes <= el_classes and ids <= ({el_id} if el_id else set())
+                and all(t == tag for t in types))
+
+    def _matches(self, compounds, stack):
+        if not self._matches_compound(compounds[-1], stack[-1]):
+            return False
+        i = len(stack) - 2
+        for compound in reversed(compounds[:-1]):
+            while i >= 0 and not self._matches_compound(compound, stack[i]):
+                i -= 1
+            if i < 0:
+                return False
+            i -= 1
+        return True
+
+    def resolve(self, value):
+        for _ in range(5):
+            m = VAR_RE.search(value)
+            if not m:
+                break
+            value = value[:m.start()] + self.variables.get(m.group(1), m.group(2) or '') + value[m.end():]
+        return value
+
+    def computed(self, stack, inline_style, parent):
+        """(family, italic) of the element on top of stack; family is
+        'Inter', 'Playfair Display' or None for some other font."""
+        family, italic = parent
+        for _, _, compounds, font in self.rules:  # ascending precedence
+            if not self._matches(compounds, stack):
+                continue
+            family, italic = self._apply(font, family, italic, parent)
+        if inline_style:
+            family, italic = self._apply(declarations(inline_style), family, italic, parent)
+        return family, italic
+
+    def _apply(self, font, family, italic, parent):
+        for prop in FONT_PROPS:
+            if prop not in font:
+                continue
+            value = self.resolve(font[prop]).lower()
+            if prop in ('font-family', 'font'):
+                if 'inherit' in value:
+                    family = parent[0]
+                elif 'playfair' in value:
+                    family = 'Playfair Display'
+                elif 'inter' in value:
+                    family = 'Inter'
+                elif prop == 'font-family':
+                    family = None
+            if prop in ('font-style', 'font'):
+                if 'italic' in value or 'oblique' in value:
+                    italic = True
+                elif prop == 'font-style':
+                    italic = parent[1] if value == 'inherit' else False
+        return family, italic
+
+
+class TextCollector(HTMLParser):
+    """Characters rendered per face: {(family, style): set(chars)}."""
+
+    def __init__(self, cascade, chars):
+        super().__init__(convert_charrefs=True)
+        self.cascade = cascade
+        self.chars = chars
+        self.elements = [('html', set(), None)]
+        self.computed = [(None, False)]
+        self.skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        a = dict(attrs)
+        element = (tag, set((a.get('class') or '').split()), a.get('id'))
+        if tag == 'html':  # the root: replaces the placeholder
+            self.elements = [element]
+            self.computed = [self.cascade.computed(self.elements, a.get('style'), (None, False))]
+            return
+        stack = self.elements + [element]
+        computed = self.cascade.computed(stack, a.get('style'), self.computed[-1])
+        for name in ('placeholder', 'value'):
+            if a.get(name) and (name == 'placeholder' or a.get('type') in ('submit', 'button', 'reset')):
+                self._add(a[name], computed)
+        if tag in VOID:
+            return
+        self.elements.append(element)
+        self.computed.append(computed)
+        if tag in SKIP_TEXT:
+            self.skip += 1
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID and tag != 'html':
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        for i in range(len(self.elements) - 1, 0, -1):
+            if self.elements[i][0] == tag:
+                for el, _ in zip(self.elements[i:], self.computed[i:]):
+                    if el[0] in SKIP_TEXT:
+                        self.skip -= 1
+                del self.elements[i:], self.computed[i:]
+                return
+
+    def handle_data(self, data):
+        if not self.skip and data.strip():
+            self._add(data, self.computed[-1])
+
+    def _add(self, text, computed):
+        family, italic = computed
+        if family is None:
+            return
+        # Inter has no italic file: browsers slant the upright one
+        style = 'italic' if italic and family == 'Playfair Display' else 'normal'
+        self.chars.setdefault((family, style), set()).update(text, text.upper(), text.lower())
+
+
+def page_css(page):
+    """Every stylesheet that applies to a page, as text."""
+    texts = re.findall(r'<style\b[^>]*>(.*?)</style>', page.html, re.S)
+    for link in page.links:
+        href = link.get('href') or ''
+        if 'stylesheet' in (link.get('rel') or '').split() and href.startswith('/'):
+            path = os.path.join(ROOT_DIR, href.split('?')[0].lstrip('/'))
+            if os.path.exists(path):
+                with open(path, encoding='utf-8') as f:
+                    texts.append(f.read())
+    return texts
+
+
+def script_chars(page):
+    """Non-ASCII characters in a page's inline and local scripts."""
+    texts = re.findall(r'<script\b(?![^>]*ld\+json)[^>]*>(.*?)</script>', page.html, re.S)
+    for src in re.findall(r'<script\b[^>]*\ssrc="(/[^"?]+)', page.html):
+        path = os.path.join(ROOT_DIR, src.lstrip('/'))
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                texts.append(f.read())
+    return {c for text in texts for c in text if ord(c) > 0x7F and c.isprintable()}
+
+
+def collect_chars(corpus):
+    chars = {}
+    extra = set(BASE_TEXT)
+    for page in corpus:
+        collector = TextCollector(FontCascade(page_css(page)), chars)
+        collector.feed(page.html)
+        collector.close()
+        extra |= script_chars(page)
+    for face in {(family, style) for family, style, _, _ in FACES}:
+        chars.setdefault(face, set()).update(extra)
+    return chars
+
+
+def unicode_range(codepoints):
+    """'U+0020-007E, U+00A0, ...' for a set of codepoints."""
+    ranges, cps = [], sorted(codepoints)
+    start = prev = cps[0]
+    for cp in cps[1:] + [None]:
+        if cp is not None and cp == prev + 1:
+            prev = cp
+            continue
+        ranges.append(f'U+{start:04X}' if start == prev else f'U+{start:04X}-{prev:04X}')
+        if cp is not None:
+            start = prev = cp
+    return ', '.join(ranges)
+
+
+def subset(src, codepoints):
+    """woff2 bytes of src subset to codepoints (fontTools' default features)."""
+    options = ft_subset.Options()
+    options.flavor = 'woff2'
+    font = ft_subset.load_font(src, options)
+    subsetter = ft_subset.Subsetter(options)
+    subsetter.populate(unicodes=codepoints)
+    subsetter.subset(font)
+    buf = io.BytesIO()
+    ft_subset.save_font(font, buf, options)
+    return buf.getvalue()
+
+
+def supplement_name(name):
+    stem, ext = os.path.splitext(name)
+    return f'{stem}{SUPPLEMENT_SUFFIX}{ext}'
+
+
+def main():
+    if ft_subset is None:
+        print('ERROR: fontTools is not installed (pip3 install --user fonttools brotli)')
+        sys.exit(1)
+    dry_run = '--dry-run' in sys.argv
+    chars = collect_chars(get_corpus())
+    faces, claimed = [], {}
+    total_before = total_after = 0
+    safety = {ord(c) for c in SAFETY_TEXT}
+    for family, style, weight, name in FACES:
+        src = os.path.join(SRC_DIR, name)
+        cmap = set(TTFont(src).getBestCmap())
+        wanted = {ord(c) for c in chars[(family, style)]}
+        taken = claimed.setdefault((family, style), set())
+        codepoints = (wanted & cmap) - taken
+        spare = (safety & cmap) - taken - codepoints
+        taken |= codepoints | spare
+        before = os.path.getsize(src)
+        total_before += before
+        for out_name, part in ((name, codepoints), (supplement_name(name), spare)):
+            out = os.path.join(OUT_DIR, out_name)
+            if not part:
+                if out_name == name or os.path.exists(out):
+                    print(f'{out_name}: no characters used, dropped ({before:,} B)')
+                if not dry_run and os.path.exists(out):
+                    os.remove(out)
+                continue
+            data = subset(src, sorted(part))
+            total_after += len(data)
+            print(f'{out_name}: {len(part)} of {len(cmap)} characters, '
+                  f'{before:,} -> {len(data):,} B')
+            faces.append(
+                f"@font-face {{\n  font-family: '{family}';\n  font-style: {style};\n"
+                f"  font-weight: {weight};\n  font-display: swap;\n"
+                f"  src: url('/fonts/{out_name}') format('woff2');\n"
+                f"  unicode-range: {unicode_range(part)};\n}}\n")
+            if not dry_run:
+                with open(out, 'wb') as f:
+                    f.write(data)
+    print(f'Total: {total_before:,} -> {total_after:,} B')
+    missing = {c for face in chars.values() for c in face
+               if c.isprintable() and not c.isspace()
+               and not any(ord(c) in t for t in claimed.values())}
+    if missing:
+        print(f'Characters with no glyph in any face (system fallback): {"".join(sorted(missing))}')
+    if dry_run:
+        return
+    with open(FONTS_CSS, 'w', encoding='utf-8') as f:
+        f.write(CSS_HEADER + ''.join(faces))
+    inline_critical_css.refresh()
+
+
+if __name__ == '__main__':
+    main()
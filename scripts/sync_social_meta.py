@@ -9,12 +9,17 @@
 - twitter:* mirrors og:*; og:locale/alternate set per language
 - Adds <meta name="theme-color"> after the viewport meta
 
-Run from the repo root: python3 scripts/sync_social_meta.py
+Runs as the social-meta step of rewrite_pipeline.py, or alone (from the
+repo root): python3 scripts/sync_social_meta.py [--dry-run]
 """
-import glob
 import os
 import re
 import subprocess
+import sys
+
+import image_meta
+import rewrite_pipeline
+from image_meta import dims
 
 SITE = 'https://milanosensualcongress.com'
 BRAND_CARD = '/images/og/milano-sensual-congress-social-card.jpg'
@@ -29,18 +34,6 @@ PREBUILT = {
     'duomo-di-milano-bachata-italy-2026-dance-destination.webp': '/images/og/duomo-di-milano-bachata-2026.jpg',
 }
 
-_dims_cache = {}
-
-
-def dims(path):
-    if path not in _dims_cache:
-        out = subprocess.check_output(
-            ['ffprobe', '-v', 'error', '-show_entries', 'stream=width,height',
-             '-of', 'csv=p=0', path], stderr=subprocess.DEVNULL)
-        w, h = out.decode().strip().splitlines()[0].split(',')
-        _dims_cache[path] = (int(w), int(h))
-    return _dims_cache[path]
-
 
 def jpg_card_for(og_image_url):
     """Map an og:image URL to a local JPG card path, building it if needed."""
@@ -72,14 +65,17 @@ def get_meta(html, pattern):
     return m.group(1).strip() if m else None
 
 
-def process(path):
-    html = orig = open(path).read()
-
+def sync_head(ctx, html):
+    """Pipeline hook: the page with one canonical social-meta block."""
+    path = ctx.path
+    if os.path.basename(path) == '404.html':
+        return html
     title = get_meta(html, r'<title>([^<]+)</title>')
     desc = get_meta(html, r'<meta\s+name="description"\s+content="([^"]*)"')
     canonical = get_meta(html, r'<link\s+rel="canonical"\s+href="([^"]*)"')
     if not (title and desc and canonical):
-        return f'SKIP {path} (missing title/description/canonical)'
+        ctx.note(f'SKIP {path} (missing title/description/canonical)')
+        return html
 
     is_it = path.startswith('it/') or path.startswith('it\\')
     is_article = '/news/' in ('/' + path)
@@ -124,18 +120,26 @@ def process(path):
             r'\1\n  <meta name="theme-color" content="' + THEME_COLOR + '">',
             html, count=1)
 
-    if html != orig:
-        open(path, 'w').write(html)
-        return None
-    return None
+    return html
+
+
+TRANSFORM = rewrite_pipeline.Transform('social-meta', document=sync_head)
+
+
+def before_run():
+    image_meta.warm(image_meta.image_files('images'))
+
+
+def after_run():
+    image_meta.save()
 
 
 def main():
-    pages = (glob.glob('*.html') + glob.glob('it/*.html')
-             + glob.glob('news/*.html') + glob.glob('it/news/*.html'))
-    pages = [p for p in pages if os.path.basename(p) != '404.html']
-    skipped = [r for p in pages if (r := process(p))]
-    print(f'{len(pages) - len(skipped)} pages normalized')
+    dry_run = '--dry-run' in sys.argv
+    before_run()
+    changed, skipped = rewrite_pipeline.run([TRANSFORM], dry_run=dry_run)
+    after_run()
+    print(f'{len(changed)} pages {"would change" if dry_run else "normalized"}')
     for s in skipped:
         print(s)
 
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""Map the site's JavaScript dependency graph and tree-shake vendor modules.
+
+Every page's <script src>, and every static import, export-from and dynamic
+import("...") of the local scripts they load, is resolved into one module
+graph (js_modules.py parses the code). For each site script (an "entry",
+e.g. js/solo-congress-guide.js) that imports a vendor ES module, the names
+it can look up on it are collected and the vendor module - and the vendor
+modules it imports in turn - is shaken down to the declarations those
+exports reach:
+
+    js/solo-congress-guide.js --import()--> vendor/three/three.module.min.js
+                                              --> vendor/three/three.core.min.js
+    becomes
+    js/solo-congress-guide.js --import()--> vendor/three/three.module.solo-congress-guide.min.js
+                                              --> vendor/three/three.core.solo-congress-guide.min.js
+
+Classic (non-module) vendor scripts such as GSAP's UMD builds cannot be
+shaken statically; they are listed with how each page loads them.
+
+The report lists per page the JS bytes loaded up front (<script src> and
+their static imports) and lazily (dynamic imports), raw and gzipped,
+before and after shaking. Pages with the same scripts share a line.
+
+    python3 scripts/tree_shake_vendor.py            # report only
+    python3 scripts/tree_shake_vendor.py --write    # write the bundles
+
+--write writes the shaken bundles next to their vendor originals, points
+the entry's import specifiers at them, bumps the entry's ?v=N cache buster
+on the pages that load it, and removes bundles the entry no longer uses.
+Re-run it after editing an entry that imports vendor code. The shaken
+bundles keep the originals' license headers; the originals stay in place.
+"""
+import gzip
+import os
+import re
+import sys
+
+import rewrite_pipeline
+from file_io import write_atomic
+from js_modules import Module
+from link_graph import get_link_graph
+from page_corpus import ROOT_DIR
+
+VENDOR_DIR = 'vendor'
+SCRIPT_TAG_RE = re.compile(r'<script\b[^>]*>')
+SRC_RE = re.compile(r'\ssrc="([^"]+)"')
+VERSION_RE = re.compile(r'\?v=(\d+)')
+
+_modules = {}
+
+
+def module(path):
+    """Parsed Module of a root-relative JS file (memoized)."""
+    if path not in _modules:
+        with open(os.path.join(ROOT_DIR, path), encoding='utf-8') as f:
+            _modules[path] = Module(f.read())
+    return _modules[path]
+
+
+def is_vendor(path):
+    return path.split(os.sep, 1)[0] == VENDOR_DIR
+
+
+def entry_id(path):
+    """js/solo-congress-guide.js -> solo-congress-guide"""
+    name = os.path.basename(path)
+    return name[:-len('.min.js')] if name.endswith('.min.js') else os.path.splitext(name)[0]
+
+
+def shaken_name(path, entry):
+    """vendor/three/three.core.min.js -> vendor/three/three.core.<entry>.min.js"""
+    directory, name = os.path.split(path)
+    suffix = '.min.js' if name.endswith('.min.js') else os.path.splitext(name)[1]
+    return os.path.join(directory, f'{name[:-len(suffix)]}.{entry}{suffix}')
+
+
+def gzip_size(data):
+    return len(gzip.compress(data, compresslevel=9, mtime=0))
+
+
+class ScriptGraph:
+    """Pages -> scripts -> static / dynamic imports, resolved to files."""
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.files = graph.corpus.files
+        self.page_scripts = {}  # page -> [(path, loading)] in document order
+        for page in graph.corpus:
+            scripts = []
+            for tag in SCRIPT_TAG_RE.findall(page.html):
+                src = SRC_RE.search(tag)
+                path = src and self.resolve(page.path, src.group(1))
+                if path and path.endswith(('.js', '.mjs')):
+                    scripts.append((path, loading(tag)))
+            self.page_scripts[page.path] = scripts
+
+    def resolve(self, source, specifier):
+        path = self.graph.target_path(source, specifier)
+        return path and self.graph.resolve(path)
+
+    def original(self, path):
+        """The vendor original of a shaken bundle (vendor/x/a.<entry>.min.js
+        -> vendor/x/a.min.js); any other path unchanged. Graphs are built
+        on originals."""
+        if is_vendor(path) and path.endswith('.min.js'):
+            base, dot, _entry = path[:-len('.min.js')].rpartition('.')
+            if dot and base + '.min.js' in self.files:
+                return base + '.min.js'
+        return path
+
+    def imports(self, path):
+        """([static deps], [dynamic deps]) of a JS file, as original files."""
+        mod = module(path)
+        out = []
+        for specifiers in (mod.static_imports, mod.dynamic_imports):
+            deps = []
+            for spec in specifiers:
+                dep = self.resolve(path, spec)
+                if dep and self.original(dep) not in deps:
+                    deps.append(self.original(dep))
+            out.append(deps)
+        return out[0], out[1]
+
+    def closure(self, roots, replace=None):
+        """(eager files, lazy files) reachable from root scripts; replace maps
+        (entry, vendor original) to the bundle that entry loads instead."""
+        replace = replace or {}
+        eager, lazy = set(), set()
+        # (file, entry script whose bundles apply below it, loaded up front?)
+        stack = [(p, p, True) for p in roots]
+        while stack:
+            path, entry, is_eager = stack.pop()
+            actual = replace.get((entry, path), path)
+            target = eager if is_eager else lazy
+            if actual in target or actual in eager:
+                continue
+            target.add(actual)
+            below = entry if is_vendor(path) else path
+            static, dynamic = self.imports(path)
+            stack += [(dep, below, is_eager) for dep in static]
+            stack += [(dep, below, False) for dep in dynamic]
+        return eager, lazy - eager
+
+
+def loading(tag):
+    if 'type="module"' in tag:
+        return 'module'
+    for attr in ('async', 'defer'):
+        if re.search(r'\s' + attr + r'\b', tag):
+            return attr
+    return 'blocking'
+
+
+def plan(sgraph, entry):
+    """{original vendor path: (bundle path, text)} for one entry script."""
+    static, dynamic = sgraph.imports(entry)
+    names = module(entry).names()
+    used = {}
+    for dep in static + dynamic:
+        if is_vendor(dep) and module(dep).is_es_module:
+            used.setdefault(dep, set()).update(set(module(dep).exports) & names)
+    bundles = {}
+    # Shake every module with the names asked of it so far; repeat until
+    # those sets stop growing (importers add to what they import).
+    changed = True
+    while changed:
+        changed = False
+        for path in sorted(used):
+            def rename(source, path=path):
+                # every vendor module a bundle still imports is shaken too
+                dep = sgraph.resolve(path, source)
+                if not dep:
+                    return source
+                return source.replace(os.path.basename(dep),
+                                      os.path.basename(shaken_name(dep, entry_id(entry))))
+            text, needs = module(path).shake(used[path], rename)
+            bundles[path] = (shaken_name(path, entry_id(entry)), text)
+            for source, imported in needs.items():
+                dep = sgraph.resolve(path, source)
+                if dep and is_vendor(dep) and module(dep).is_es_module:
+                    before = used.setdefault(dep, set())
+                    if not imported <= before:
+                        before.update(imported)
+                        changed = True
+    return bundles
+
+
+def read_bytes(path):
+    with open(os.path.join(ROOT_DIR, path), 'rb') as f:
+        return f.read()
+
+
+def sizes(files, contents):
+    raw = [contents[p] if p in contents else read_bytes(p) for p in files]
+    return sum(len(d) for d in raw), sum(gzip_size(d) for d in raw)
+
+
+def kb(pair):
+    raw, gz = pair
+    return f'{raw / 1024:8.1f} KB ({gz / 1024:6.1f} gz)'
+
+
+def rewrite_entry(sgraph, entry, bundles):
+    """Entry source with its vendor import specifiers pointed at the bundles."""
+    text = module(entry).text
+    for spec in set(module(entry).static_imports + module(entry).dynamic_imports):
+        dep = sgraph.resolve(entry, spec)
+        original = dep and sgraph.original(dep)
+        if original in bundles:
+            path, _, query = spec.partition('?')
+            name = os.path.basename(bundles[original][0])
+            new = path[:len(path) - len(os.path.basename(path))] + name + ('?' + query if query else '')
+            text = text.replace(f'"{spec}"', f'"{new}"').replace(f"'{spec}'", f"'{new}'")
+    return text
+
+
+def bump_version(entries):
+    """Bump ?v=N on <script src> tags loading the given entry files."""
+    graph = get_link_graph(ROOT_DIR)
+
+    def bump(ctx, tag):
+        src = SRC_RE.search(tag)
+        path = src and graph.target_path(ctx.path, src.group(1))
+        if path not in entries or not VERSION_RE.search(src.group(1)):
+            return tag
+        return tag.replace(src.group(1), VERSION_RE.sub(
+            lambda m: f'?v={int(m.group(1)) + 1}', src.group(1)), 1)
+    changed, _notes = rewrite_pipeline.run(
+        [rewrite_pipeline.Transform('script-version', tags=('script',), tag=bump)])
+    return changed
+
+
+def main():
+    write = '--write' in sys.argv
+    graph = get_link_graph(ROOT_DIR)
+    sgraph = ScriptGraph(graph)
+
+    scripts = sorted({p for s in sgraph.page_scripts.values() for p, _ in s})
+    entries = sorted({p for p in scripts if not is_vendor(p)}
+                     | {p for p in graph.corpus.files
+                        if p.startswith('js' + os.sep) and p.endswith('.js')})
+    bundles = {entry: plan(sgraph, entry) for entry in entries}
+    contents = {path: text.encode('utf-8')
+                for b in bundles.values() for path, text in b.values()}
+
+    print('Module graph:')
+    seen, stack = set(), list(scripts)
+    while stack:
+        path = stack.pop()
+        if path in seen:
+            continue
+        seen.add(path)
+        static, dynamic = sgraph.imports(path)
+        stack += static + dynamic
+    for path in sorted(seen):
+        static, dynamic = sgraph.imports(path)
+        how = {h for s in sgraph.page_scripts.values() for p, h in s if p == path}
+        kind = ('ES module' if module(path).is_es_module or 'module' in how or path not in scripts
+                else 'classic script')
+        deps = ''.join([f'\n      import {d}' for d in static] +
+                       [f'\n      import() {d}' for d in dynamic])
+        print(f'  {path}  {len(read_bytes(path)):,} B, {kind}{deps}')
+    for entry, plan_ in bundles.items():
+        for original, (path, text) in sorted(plan_.items()):
+            before = len(read_bytes(original))
+            print(f'  shaken for {entry}: {original} {before:,} B -> {path} '
+                  f'{len(text.encode("utf-8")):,} B')
+    classic = sorted({(p, how) for s in sgraph.page_scripts.values() for p, how in s
+                      if is_vendor(p) and not module(p).is_es_module})
+    for path, how in classic:
+        users = sum(1 for s in sgraph.page_scripts.values() if (path, how) in s)
+        print(f'  not shakeable (classic script, loaded {how}): {path} on {users} page(s)')
+
+    replace = {}
+    for entry, plan_ in bundles.items():
+        for original, (path, _text) in plan_.items():
+            replace[(entry, original)] = path
+    groups = {}
+    for page, page_scripts in sorted(sgraph.page_scripts.items()):
+        roots = tuple(p for p, _ in page_scripts)
+        groups.setdefault(roots, []).append(page)
+    print('\nPer-page JS (up front / lazy), before -> after:')
+    for roots, pages in sorted(groups.items(), key=lambda g: (-len(g[0]), g[1])):
+        eager0, lazy0 = sgraph.closure(roots)
+        eager1, lazy1 = sgraph.closure(roots, replace)
+        label = pages[0] if len(pages) == 1 else f'{pages[0]} and {len(pages) - 1} more'
+        print(f'  {label}')
+        print(f'    up front {kb(sizes(eager0, contents))} -> {kb(sizes(eager1, contents))}')
+        if lazy0 or lazy1:
+            print(f'    lazy     {kb(sizes(lazy0, contents))} -> {kb(sizes(lazy1, contents))}')
+
+    if not write:
+        return
+    updated, written = set(), 0
+    for entry, plan_ in bundles.items():
+        keep = set()
+        for _original, (path, text) in plan_.items():
+            keep.add(path)
+            if path in graph.corpus.files and read_bytes(path) == contents[path]:
+                continue
+            write_atomic(os.path.join(ROOT_DIR, path), text)
+            written += 1
+        text = rewrite_entry(sgraph, entry, plan_)
+        if text != module(entry).text:
+            write_atomic(os.path.join(ROOT_DIR, entry), text)
+            updated.add(entry)
+        suffix = f'.{entry_id(entry)}.min.js'
+        for path in sorted(graph.corpus.files):
+            if is_vendor(path) and path.endswith(suffix) and path not in keep:
+                os.unlink(os.path.join(ROOT_DIR, path))
+                print(f'removed stale bundle {path}')
+    pages = bump_version(updated) if updated else []
+    print(f'\n{written} bundle(s) written, {len(updated)} entry script(s) '
+          f'repointed, cache buster bumped on {len(pages)} page(s)')
+
+
+if __name__ == '__main__':
+    main()